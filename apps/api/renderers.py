@@ -0,0 +1,26 @@
+"""
+API 渲染器
+
+MessagePackRenderer 依赖可选的 msgpack 包，未安装时 AVAILABLE 为 False，接口只提供 JSON。
+"""
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+AVAILABLE = msgpack is not None
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack 格式：Accept: application/msgpack 或 ?format=msgpack"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True)
@@ -4,7 +4,9 @@ from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 from apps.market_data.viewsets import InstrumentViewSet, KLineViewSet
-from apps.technical_analysis.viewsets import IndicatorViewSet, PatternViewSet, SupportResistanceViewSet
+from apps.technical_analysis.viewsets import (
+    IndicatorViewSet, IndicatorValueViewSet, PatternViewSet, SupportResistanceViewSet
+)
 from apps.review.viewsets import ReviewRecordViewSet, TradeLogViewSet
 from .views import CustomTokenObtainPairView
 
@@ -16,6 +18,7 @@ router.register(r'klines', KLineViewSet, basename='kline')
 
 # Technical Analysis
 router.register(r'indicators', IndicatorViewSet, basename='indicator')
+router.register(r'indicator-values', IndicatorValueViewSet, basename='indicator-value')
 router.register(r'patterns', PatternViewSet, basename='pattern')
 router.register(r'support-resistance', SupportResistanceViewSet, basename='support-resistance')
 
@@ -0,0 +1,345 @@
+"""
+K线文件批量导入
+
+把供应商提供的 CSV/Parquet 行情文件直接导入 market_kline，不逐条构建 ORM 对象：
+1. 分块读取文件（CSV 每块 chunk_rows 行，Parquet 按行组），列名按别名映射为标准列
+2. 向量化校验：标的代码按预先加载的代码表映射为 instrument_id，日期、价格、成交量按列检查，
+   不合格的行按原因计数后丢弃，同一块内重复的K线保留最后一条
+3. 写入临时表：PostgreSQL 用 COPY，SQLite 用 executemany（导入期间调整 PRAGMA）
+4. 集合操作合并到 market_kline：先更新数值有变化的已有K线，再插入不存在的K线
+   日线的 trade_time 为空，唯一约束不能用于 ON CONFLICT，按 (标的, 周期, 日期) 和空值安全的时间比较匹配
+
+每块在一个事务中合并，中途失败时已提交的块保留，重新导入同一文件不会产生重复数据。
+K线覆盖索引（coverage.py）随每块数据在同一事务中增量更新；
+导入绕过了增量合成和指标计算的状态，导入后需全量合成周期K线、重算指标。
+"""
+import io
+import logging
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from django.db import connections, transaction
+from django.utils import timezone
+from .coverage import KLineCoverageService
+from .data_fetcher import FLOAT_COLUMNS, INTEGER_COLUMNS
+from .models import Instrument, KLine
+from .partitions import ensure_kline_partitions
+from .sources import LOCAL_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# 文件列名（不区分大小写）-> 标准列名，另支持 akshare 导出的中文列名
+FILE_COLUMNS = {
+    **LOCAL_COLUMNS,
+    'symbol': 'symbol', 'code': 'symbol', 'ts_code': 'symbol', 'ticker': 'symbol',
+    'time': 'trade_time', 'trade_time': 'trade_time',
+    'vol': 'volume', 'oi': 'open_interest',
+    '代码': 'symbol', '日期': 'trade_date', '时间': 'trade_date',
+    '开盘': 'open_price', '最高': 'high_price', '最低': 'low_price', '收盘': 'close_price',
+    '成交量': 'volume', '成交额': 'amount', '持仓量': 'open_interest',
+}
+
+PRICE_COLUMNS = ['open_price', 'high_price', 'low_price', 'close_price']
+VALUE_COLUMNS = PRICE_COLUMNS + ['volume', 'amount', 'open_interest']
+STAGING_COLUMNS = ['instrument_id', 'trade_date', 'trade_time'] + VALUE_COLUMNS
+STAGING_TABLE = 'kline_staging'
+
+PRICE_LIMIT = 1e8  # numeric(12,4) 的上限
+AMOUNT_LIMIT = 1e18  # numeric(20,2) 的上限
+VOLUME_LIMIT = 1e18  # bigint 的上限（留有余量）
+
+# 文件中的代码带交易所前缀或后缀时（sh600000、600000.SH），去掉后再匹配
+EXCHANGE_AFFIX = r'^(?:sh|sz|bj)(?=\d{6}$)|\.(?:sh|sz|bj|ss)$'
+
+# 按顺序检查，每行只计入第一个不满足的原因
+REJECT_REASONS = [
+    'unknown_symbol', 'bad_date', 'missing_price', 'bad_price', 'bad_ohlc', 'bad_volume', 'duplicate',
+]
+
+SQLITE_PRAGMAS = {
+    'synchronous': 'OFF',  # 导入中断可重新导入，不需要每次提交都刷盘
+    'temp_store': 'MEMORY',
+    'cache_size': '-262144',  # 256MB
+}
+
+
+class KLineFileImporter:
+    """K线文件批量导入"""
+
+    def __init__(self, period='1d', chunk_rows=500_000, using='default', dry_run=False):
+        """
+        :param period: 文件中K线的周期，一次导入只处理一个周期
+        :param chunk_rows: CSV 每块读取的行数，也是每个合并事务的最大行数
+        :param using: 数据库别名
+        :param dry_run: 只读取和校验，不写入数据库
+        """
+        if period not in dict(KLine.PERIODS):
+            raise ValueError(f"不支持的周期: {period}")
+        self.period = period
+        self.intraday = period in KLine.INTRADAY_PERIODS
+        self.chunk_rows = chunk_rows
+        self.using = using
+        self.dry_run = dry_run
+        self.connection = connections[using]
+        self.symbols = self._load_symbols()
+        self.coverage = KLineCoverageService()
+        self.stats = {
+            'files': 0, 'rows': 0, 'staged': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0,
+            'rejected': dict.fromkeys(REJECT_REASONS, 0), 'seconds': 0.0,
+        }
+
+    def _load_symbols(self):
+        """代码 -> instrument_id，导入前一次性加载"""
+        return dict(Instrument.objects.using(self.using).values_list('symbol', 'id'))
+
+    def _instrument_id(self, code):
+        """代码对应的 instrument_id，带交易所前缀或后缀的代码去掉后再匹配，找不到返回 None"""
+        if code in self.symbols:
+            return self.symbols[code]
+        stripped = re.sub(EXCHANGE_AFFIX, '', code, flags=re.IGNORECASE)
+        return self.symbols.get(stripped, self.symbols.get(stripped.upper()))
+
+    def import_paths(self, paths, symbol=None):
+        """
+        导入文件或目录（目录下的 .csv / .parquet 文件）
+        :param symbol: 文件中没有代码列时使用的标的代码，为空时取文件名（去掉 _周期 后缀）
+        :return: 累计统计
+        """
+        files = []
+        for path in map(Path, paths):
+            if path.is_dir():
+                files.extend(sorted(file for file in path.iterdir() if file.suffix in ('.csv', '.parquet')))
+            else:
+                files.append(path)
+
+        started = time.perf_counter()
+        with self._tuned_connection():
+            for file in files:
+                self.import_file(file, symbol)
+        self.stats['seconds'] = time.perf_counter() - started
+        return self.stats
+
+    def import_file(self, file, symbol=None):
+        """导入单个文件，返回该文件的统计"""
+        file = Path(file)
+        if symbol is None:
+            symbol = file.stem.removesuffix(f'_{self.period}')
+
+        stats = {'rows': 0, 'staged': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0}
+        for chunk in self._read(file):
+            frame, rejected = self.prepare(chunk, symbol)
+            stats['rows'] += len(chunk)
+            stats['staged'] += len(frame)
+            stats['rejected'] += sum(rejected.values())
+            for reason, count in rejected.items():
+                self.stats['rejected'][reason] += count
+            if not self.dry_run and not frame.empty:
+                inserted, updated = self._merge(frame)
+                stats['inserted'] += inserted
+                stats['updated'] += updated
+                stats['unchanged'] += len(frame) - inserted - updated
+
+        self.stats['files'] += 1
+        for key in ('rows', 'staged', 'inserted', 'updated', 'unchanged'):
+            self.stats[key] += stats[key]
+        logger.info(f"导入 {file}: 读取 {stats['rows']} 行，有效 {stats['staged']} 行，"
+                    f"新增 {stats['inserted']}，更新 {stats['updated']}，丢弃 {stats['rejected']}")
+        return stats
+
+    def _read(self, file):
+        """分块读取文件，返回 DataFrame 迭代器"""
+        if file.suffix == '.parquet':
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                # 没有 pyarrow 时由 pandas 选择可用的引擎整个读取
+                yield pd.read_parquet(file)
+                return
+            for batch in pq.ParquetFile(file).iter_batches(batch_size=self.chunk_rows):
+                yield batch.to_pandas()
+        else:
+            # 代码列按字符串读取，保留前导零
+            yield from pd.read_csv(file, chunksize=self.chunk_rows, dtype={
+                column: str for column, target in FILE_COLUMNS.items() if target == 'symbol'
+            })
+
+    def prepare(self, df, symbol=None):
+        """
+        向量化映射列名、转换类型并校验
+        :param df: 文件中的一块数据
+        :param symbol: 没有代码列时使用的标的代码
+        :return: (列为 STAGING_COLUMNS 的 DataFrame, {丢弃原因: 行数})
+        """
+        df = df.rename(columns=lambda column: FILE_COLUMNS.get(str(column).strip().lower(), column))
+        df = df.loc[:, ~df.columns.duplicated()]
+        if 'trade_date' not in df.columns:
+            raise ValueError(f"缺少日期列，可用列名: {', '.join(sorted(FILE_COLUMNS))}")
+
+        # 标的代码 -> instrument_id，代码和日期大量重复，只对不同的值做映射和格式化
+        if 'symbol' in df.columns:
+            positions, codes = pd.factorize(df['symbol'].astype(str).str.strip())
+            # 缺失的代码位置为 -1，对应末尾追加的缺失值
+            resolved = np.array([self._instrument_id(code) for code in codes] + [None], dtype='float64')
+            ids = pd.Series(resolved[positions], index=df.index)
+        else:
+            ids = pd.Series(self.symbols.get(symbol), index=df.index, dtype='float64')
+
+        # 日期和时间：分钟K线的时间可以在日期列中（时间戳），也可以单独一列
+        timestamps = pd.to_datetime(df['trade_date'], errors='coerce')
+        if self.intraday and 'trade_time' in df.columns:
+            timestamps = pd.to_datetime(
+                timestamps.dt.strftime('%Y-%m-%d') + ' ' + df['trade_time'].astype(str), errors='coerce'
+            )
+
+        frame = pd.DataFrame({'instrument_id': ids}, index=df.index)
+        for column in FLOAT_COLUMNS:
+            values = pd.to_numeric(df[column], errors='coerce') if column in df.columns else np.nan
+            frame[column] = np.round(values, 2 if column == 'amount' else 4)
+        for column in INTEGER_COLUMNS:
+            values = pd.to_numeric(df[column], errors='coerce') if column in df.columns else np.nan
+            frame[column] = np.trunc(values)
+
+        prices = frame[PRICE_COLUMNS]
+        high, low = frame['high_price'], frame['low_price']
+        body = frame[['open_price', 'close_price']]
+        volume = frame['volume']
+        checks = {
+            'unknown_symbol': ids.isna(),
+            'bad_date': timestamps.isna(),
+            'missing_price': prices.isna().any(axis=1),
+            'bad_price': ((prices <= 0) | (prices >= PRICE_LIMIT)).any(axis=1) | (frame['amount'].abs() >= AMOUNT_LIMIT),
+            'bad_ohlc': (high < low) | (high < body.max(axis=1)) | (low > body.min(axis=1)),
+            'bad_volume': volume.isna() | (volume < 0) | (volume >= VOLUME_LIMIT) | (frame['open_interest'] < 0),
+        }
+        valid = pd.Series(True, index=df.index)
+        rejected = {}
+        for reason, failed in checks.items():
+            hit = failed & valid
+            rejected[reason] = int(hit.sum())
+            valid &= ~hit
+
+        frame = frame[valid]
+        timestamps = timestamps[valid]
+        positions, stamps = pd.factorize(timestamps)
+        frame['trade_date'] = np.asarray(stamps.strftime('%Y-%m-%d'), dtype=object)[positions]
+        frame['trade_time'] = np.asarray(stamps.strftime('%H:%M:%S'), dtype=object)[positions] if self.intraday else None
+
+        duplicated = frame.duplicated(['instrument_id', 'trade_date', 'trade_time'], keep='last')
+        rejected['duplicate'] = int(duplicated.sum())
+        frame = frame[~duplicated]
+
+        frame['instrument_id'] = frame['instrument_id'].astype('int64')
+        for column in INTEGER_COLUMNS:
+            frame[column] = frame[column].astype('Int64')
+        return frame[STAGING_COLUMNS].reset_index(drop=True), rejected
+
+    def _merge(self, frame):
+        """
+        把一块数据写入临时表并合并到 market_kline
+        :return: (新增行数, 更新行数)
+        """
+        first_date, last_date = frame['trade_date'].min(), frame['trade_date'].max()
+        with transaction.atomic(using=self.using), self.connection.cursor() as cursor:
+            if self.intraday:
+                ensure_kline_partitions(first_date, last_date, using=self.using)
+            self._create_staging(cursor)
+            if self.connection.vendor == 'postgresql':
+                self._copy(cursor, frame)
+                cursor.execute(f"ANALYZE {STAGING_TABLE}")
+            else:
+                placeholders = ', '.join(['%s'] * len(STAGING_COLUMNS))
+                cursor.executemany(
+                    f"INSERT INTO {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) VALUES ({placeholders})",
+                    self._rows(frame)
+                )
+
+            postgresql = self.connection.vendor == 'postgresql'
+            same = 'IS NOT DISTINCT FROM' if postgresql else 'IS'
+            different = 'IS DISTINCT FROM' if postgresql else 'IS NOT'
+            values = ', '.join(VALUE_COLUMNS)
+            # trade_date 的范围条件让 PostgreSQL 只扫描涉及的月分区
+            match = (
+                f"k.instrument_id = s.instrument_id AND k.period = %s AND k.trade_date = s.trade_date "
+                f"AND k.trade_time {same} s.trade_time AND k.trade_date BETWEEN %s AND %s"
+            )
+
+            cursor.execute(
+                f"UPDATE market_kline AS k SET {', '.join(f'{column} = s.{column}' for column in VALUE_COLUMNS)} "
+                f"FROM {STAGING_TABLE} AS s WHERE {match} "
+                f"AND ({', '.join(f'k.{column}' for column in VALUE_COLUMNS)}) {different} "
+                f"({', '.join(f's.{column}' for column in VALUE_COLUMNS)})",
+                [self.period, first_date, last_date]
+            )
+            updated = cursor.rowcount
+
+            cursor.execute(
+                f"INSERT INTO market_kline (instrument_id, period, trade_date, trade_time, {values}, created_at) "
+                f"SELECT s.instrument_id, %s, s.trade_date, s.trade_time, "
+                f"{', '.join(f's.{column}' for column in VALUE_COLUMNS)}, %s FROM {STAGING_TABLE} AS s "
+                f"WHERE NOT EXISTS (SELECT 1 FROM market_kline AS k WHERE {match})",
+                [self.period, self.connection.ops.adapt_datetimefield_value(timezone.now()),
+                 self.period, first_date, last_date]
+            )
+            inserted = cursor.rowcount
+            cursor.execute(f"DROP TABLE {STAGING_TABLE}")
+
+            spans = frame.groupby('instrument_id')['trade_date'].agg(['min', 'max'])
+            self.coverage.update(self.period, {
+                int(instrument_id): (first, last) for instrument_id, first, last in spans.itertuples()
+            })
+        return inserted, updated
+
+    def _create_staging(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        cursor.execute(f"""
+            CREATE TEMPORARY TABLE {STAGING_TABLE} (
+                instrument_id bigint NOT NULL,
+                trade_date date NOT NULL,
+                trade_time time NULL,
+                open_price numeric(12, 4) NOT NULL,
+                high_price numeric(12, 4) NOT NULL,
+                low_price numeric(12, 4) NOT NULL,
+                close_price numeric(12, 4) NOT NULL,
+                volume bigint NOT NULL,
+                amount numeric(20, 2) NULL,
+                open_interest bigint NULL
+            )
+        """)
+
+    def _copy(self, cursor, frame):
+        """PostgreSQL COPY 写入临时表，兼容 psycopg2 和 psycopg 3"""
+        data = frame.to_csv(index=False, header=False, na_rep='')
+        sql = f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            raw.copy_expert(sql, io.StringIO(data))
+        else:
+            with raw.copy(sql) as copy:
+                copy.write(data)
+
+    @staticmethod
+    def _rows(frame):
+        """按列转换为 Python 类型（缺失值为 None）后组成行，供 executemany 使用"""
+        columns = [frame[column].astype(object).where(frame[column].notna(), None).tolist() for column in STAGING_COLUMNS]
+        return list(zip(*columns))
+
+    @contextmanager
+    def _tuned_connection(self):
+        """SQLite 导入期间调整 PRAGMA，结束后恢复"""
+        saved = {}
+        if self.connection.vendor == 'sqlite' and not self.dry_run:
+            with self.connection.cursor() as cursor:
+                for name, value in SQLITE_PRAGMAS.items():
+                    cursor.execute(f"PRAGMA {name}")
+                    saved[name] = cursor.fetchone()[0]
+                    cursor.execute(f"PRAGMA {name} = {value}")
+        try:
+            yield
+        finally:
+            if saved:
+                with self.connection.cursor() as cursor:
+                    for name, value in saved.items():
+                        cursor.execute(f"PRAGMA {name} = {value}")
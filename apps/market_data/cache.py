@@ -0,0 +1,294 @@
+"""
+数据源的本地磁盘缓存
+
+CachedDataFetcher 包装 AkshareDataFetcher，按 (市场, 标的, 周期, 复权方式) 把获取到的K线保存为压缩的 NPZ 文件，
+每个文件记录已覆盖的连续日期区间。请求落在已覆盖区间内且未过期时直接读取缓存，否则只向数据源请求缺少的部分并合并：
+
+- 历史部分在 MARKET_DATA_CACHE_HISTORY_TTL 秒后过期（前复权价格会因分红送转而整体变化）
+- 最近 LIVE_EDGE_DAYS 天在 MARKET_DATA_CACHE_LIVE_TTL 秒后过期（当天的K线可能还在变化）
+
+模式（MARKET_DATA_CACHE_MODE）：
+- readwrite: 优先读取缓存，缺少或过期时请求数据源并写回
+- replay: 只读缓存，不访问网络，用于离线重放
+- off: 不使用缓存
+
+分钟K线只保留在数据库中，不经过磁盘缓存（回放模式下返回空数据）。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .data_fetcher import (
+    AkshareDataFetcher, FLOAT_COLUMNS, INTEGER_COLUMNS, KLINE_COLUMNS, empty_intraday_klines, empty_klines,
+)
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ('readwrite', 'replay', 'off')
+
+
+class CacheMiss(LookupError):
+    """回放模式下缓存中没有请求的数据"""
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else datetime.strptime(value, '%Y-%m-%d').date()
+
+
+class CachedDataFetcher:
+    """带磁盘缓存的数据源，接口与 AkshareDataFetcher 相同"""
+
+    LIVE_EDGE_DAYS = 7  # 最近N天视为仍可能变化的数据
+
+    def __init__(self, fetcher=None, cache_dir=None, mode=None, history_ttl=None, live_ttl=None, clock=time.time):
+        """
+        :param fetcher: 被缓存的数据源，默认 AkshareDataFetcher
+        :param cache_dir: 缓存目录，默认 MARKET_DATA_CACHE_DIR
+        :param mode: 'readwrite' / 'replay' / 'off'，默认 MARKET_DATA_CACHE_MODE
+        :param history_ttl: 历史数据的有效期（秒），默认 MARKET_DATA_CACHE_HISTORY_TTL
+        :param live_ttl: 最近 LIVE_EDGE_DAYS 天数据的有效期（秒），默认 MARKET_DATA_CACHE_LIVE_TTL
+        :param clock: 时钟函数（便于测试替换）
+        """
+        self.fetcher = fetcher or AkshareDataFetcher()
+        self.cache_dir = Path(cache_dir or getattr(settings, 'MARKET_DATA_CACHE_DIR', 'cache/market_data'))
+        self.mode = mode or getattr(settings, 'MARKET_DATA_CACHE_MODE', 'readwrite')
+        if self.mode not in CACHE_MODES:
+            raise ValueError(f"未知的缓存模式: {self.mode}，可选 {', '.join(CACHE_MODES)}")
+        self.history_ttl = history_ttl if history_ttl is not None else getattr(settings, 'MARKET_DATA_CACHE_HISTORY_TTL', 7 * 86400)
+        self.live_ttl = live_ttl if live_ttl is not None else getattr(settings, 'MARKET_DATA_CACHE_LIVE_TTL', 3600)
+        self._clock = clock
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def fetch_stock_daily(self, symbol, start_date, end_date, raise_errors=False):
+        """获取股票日线数据（前复权），见 AkshareDataFetcher.fetch_stock_daily"""
+        return self._fetch_daily(
+            f'stock_{symbol}_daily_qfq', self.fetcher.fetch_stock_daily, symbol, start_date, end_date, raise_errors
+        )
+
+    def fetch_futures_daily(self, symbol, start_date, end_date, raise_errors=False):
+        """获取期货日线数据，见 AkshareDataFetcher.fetch_futures_daily"""
+        return self._fetch_daily(
+            f'futures_{symbol}_daily_none', self.fetcher.fetch_futures_daily, symbol, start_date, end_date, raise_errors
+        )
+
+    def fetch_stock_minute(self, symbol, start_date, end_date, period='1m', raise_errors=False):
+        """获取股票分钟K线，不缓存"""
+        return self._fetch_minute(self.fetcher.fetch_stock_minute, symbol, start_date, end_date, period, raise_errors)
+
+    def fetch_futures_minute(self, symbol, start_date, end_date, period='1m', raise_errors=False):
+        """获取期货分钟K线，不缓存"""
+        return self._fetch_minute(self.fetcher.fetch_futures_minute, symbol, start_date, end_date, period, raise_errors)
+
+    def _fetch_minute(self, fetch, symbol, start_date, end_date, period, raise_errors):
+        if self.mode == 'replay':
+            message = f"回放模式下没有 {symbol} 的分钟数据"
+            if raise_errors:
+                raise CacheMiss(message)
+            logger.warning(message)
+            return empty_intraday_klines()
+        return fetch(symbol, start_date, end_date, period=period, raise_errors=raise_errors)
+
+    def fetch_stock_list(self):
+        """获取股票列表"""
+        return self._fetch_list('stock_list', self.fetcher.fetch_stock_list)
+
+    def fetch_futures_list(self):
+        """获取期货合约列表"""
+        return self._fetch_list('futures_list', self.fetcher.fetch_futures_list)
+
+    def fetch_trade_dates(self):
+        """获取交易日历，按历史数据的有效期缓存"""
+        return self._fetch_list('trade_dates', self.fetcher.fetch_trade_dates, self.history_ttl)
+
+    def _lock(self, key):
+        """同一个缓存文件的读写互斥（并发回补时多个线程可能请求同一标的）"""
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _fetch_daily(self, key, fetch, symbol, start_date, end_date, raise_errors):
+        if self.mode == 'off':
+            return fetch(symbol, start_date, end_date, raise_errors=raise_errors)
+
+        start, end = _as_date(start_date), _as_date(end_date)
+        with self._lock(key):
+            entry = self._load(key)
+
+            if self.mode == 'replay':
+                if entry is None or not entry['start'] <= start <= end <= entry['end']:
+                    message = f"缓存中没有 {symbol} {start} ~ {end} 的完整数据"
+                    if raise_errors:
+                        raise CacheMiss(message)
+                    logger.warning(message)
+                return self._slice(entry, start, end)
+
+            plan = self._plan(entry, start, end)
+            if plan is None:
+                return self._slice(entry, start, end)
+
+            fetch_start, fetch_end, full = plan
+            try:
+                # 获取失败时不能把空数据写入缓存，始终要求数据源抛出异常
+                data = fetch(symbol, fetch_start.strftime('%Y-%m-%d'), fetch_end.strftime('%Y-%m-%d'), raise_errors=True)
+            except Exception:
+                if raise_errors:
+                    raise
+                return empty_klines()
+
+            entry = self._merge(entry, data, fetch_start, fetch_end, full)
+            self._store(key, entry)
+            return self._slice(entry, start, end)
+
+    def _today(self):
+        return date.fromtimestamp(self._clock())
+
+    def _plan(self, entry, start, end):
+        """
+        需要向数据源请求的区间
+        :return: (开始日期, 结束日期, 是否替换整个缓存)，缓存可以直接使用时返回 None
+        """
+        now = self._clock()
+        if (entry is None or start < entry['start'] or start > entry['end'] + timedelta(days=1)
+                or now - entry['history_fetched_at'] > self.history_ttl):
+            # 没有缓存、请求区间在缓存之前或与缓存不连续、历史数据过期：重新获取整个区间，保持缓存为一个连续区间
+            if entry is None:
+                return start, end, True
+            return min(start, entry['start']), max(end, entry['end']), True
+
+        edge = self._today() - timedelta(days=self.LIVE_EDGE_DAYS)
+        edge_expired = now - entry['edge_fetched_at'] > self.live_ttl
+        if end <= entry['end'] and (end < edge or not edge_expired):
+            return None
+
+        # 只请求缓存之后缺少的部分，最近的数据过期时一并刷新
+        fetch_start = entry['end'] + timedelta(days=1)
+        if edge_expired:
+            fetch_start = min(fetch_start, max(edge, entry['start']))
+        return fetch_start, max(end, entry['end']), False
+
+    def _merge(self, entry, data, fetch_start, fetch_end, full):
+        """把新获取的区间合并到缓存中，新数据覆盖区间内的旧数据"""
+        now = self._clock()
+        dates = data['trade_date'].dt.date
+        data = data[(dates >= fetch_start) & (dates <= fetch_end)]
+        if full:
+            return {
+                'frame': data.sort_values('trade_date').reset_index(drop=True),
+                'start': fetch_start,
+                'end': fetch_end,
+                'history_fetched_at': now,
+                'edge_fetched_at': now,
+            }
+
+        frame = entry['frame']
+        kept = frame[frame['trade_date'].dt.date < fetch_start]
+        frame = pd.concat([kept, data], ignore_index=True) if len(kept) else data.reset_index(drop=True)
+        return {
+            **entry,
+            'frame': frame.sort_values('trade_date').reset_index(drop=True),
+            'end': fetch_end,
+            'edge_fetched_at': now,
+        }
+
+    @staticmethod
+    def _slice(entry, start, end):
+        if entry is None:
+            return empty_klines()
+        frame = entry['frame']
+        dates = frame['trade_date'].dt.date
+        return frame[(dates >= start) & (dates <= end)].reset_index(drop=True)
+
+    def _path(self, key, suffix):
+        return self.cache_dir / f'{key}{suffix}'
+
+    def _load(self, key):
+        """读取缓存文件，不存在或损坏时返回 None"""
+        path = self._path(key, '.npz')
+        if not path.exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                meta = json.loads(str(npz['meta']))
+                frame = pd.DataFrame({'trade_date': npz['trade_date'].astype('datetime64[ns]')})
+                for column in FLOAT_COLUMNS:
+                    frame[column] = npz[column]
+                for column in INTEGER_COLUMNS:
+                    frame[column] = pd.arrays.IntegerArray(npz[column], npz[f'{column}_mask'])
+        except Exception as e:
+            logger.warning(f"读取缓存 {path} 失败，将重新获取: {e}")
+            return None
+        return {
+            'frame': frame[KLINE_COLUMNS],
+            'start': date.fromisoformat(meta['start']),
+            'end': date.fromisoformat(meta['end']),
+            'history_fetched_at': meta['history_fetched_at'],
+            'edge_fetched_at': meta['edge_fetched_at'],
+        }
+
+    def _store(self, key, entry):
+        """写入临时文件后原子替换，避免并发读取到写了一半的文件"""
+        frame = entry['frame']
+        arrays = {
+            'meta': np.array(json.dumps({
+                'start': entry['start'].isoformat(),
+                'end': entry['end'].isoformat(),
+                'history_fetched_at': entry['history_fetched_at'],
+                'edge_fetched_at': entry['edge_fetched_at'],
+            })),
+            'trade_date': frame['trade_date'].to_numpy(dtype='datetime64[D]'),
+        }
+        for column in FLOAT_COLUMNS:
+            arrays[column] = frame[column].to_numpy(dtype=np.float64)
+        for column in INTEGER_COLUMNS:
+            values = frame[column].array
+            arrays[column] = values.to_numpy(dtype=np.int64, na_value=0)
+            arrays[f'{column}_mask'] = values.isna()
+
+        self._write(self._path(key, '.npz'), lambda f: np.savez_compressed(f, **arrays))
+
+    def _write(self, path, write):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            temp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+            with open(temp, 'wb') as f:
+                write(f)
+            os.replace(temp, path)
+        except OSError as e:
+            logger.warning(f"写入缓存 {path} 失败: {e}")
+
+    def _fetch_list(self, key, fetch, ttl=None):
+        """
+        列表数据（标的列表、交易日历）按 ttl（默认 live_ttl）缓存；数据源返回空列表（获取失败）时使用缓存中的旧列表
+        """
+        if self.mode == 'off':
+            return fetch()
+
+        path = self._path(key, '.json')
+        cached = None
+        if path.exists():
+            try:
+                cached = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取缓存 {path} 失败: {e}")
+
+        if self.mode == 'replay':
+            if cached is None:
+                logger.warning(f"缓存中没有 {key}")
+                return []
+            return cached['items']
+        if cached is not None and self._clock() - cached['fetched_at'] <= (self.live_ttl if ttl is None else ttl):
+            return cached['items']
+
+        items = fetch()
+        if not items:
+            return cached['items'] if cached is not None else items
+
+        payload = json.dumps({'fetched_at': self._clock(), 'items': items}, ensure_ascii=False, default=str)
+        self._write(path, lambda f: f.write(payload.encode('utf-8')))
+        return items
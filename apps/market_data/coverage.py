@@ -0,0 +1,285 @@
+"""
+K线覆盖索引
+
+按标的、周期记录K线的覆盖情况（models.KLineCoverage）：首尾K线、首尾之间应有和实有的交易日数、
+缺失K线的交易日区间（缺口）、成交量为 0 的交易日区间和有重复K线的日期。
+- 全量构建（rebuild）：每批标的一条按 (标的, 日期) 分组的聚合查询，对照交易日历向量化计算缺口（二分查找）
+- 增量更新（update）：写入K线后只重新统计写入区间及其两侧最近的已有K线之间的部分，区间之外沿用原记录
+  （两侧最近的已有K线由原记录的缺口推算，不需要额外查询）
+
+分钟周期按交易日统计，某个交易日没有任何分钟K线才算缺失；周线、月线不统计。
+"""
+import logging
+from datetime import date, datetime
+import numpy as np
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from .models import Instrument, KLine, KLineCoverage
+from .trading_calendar import get_trading_calendar
+
+logger = logging.getLogger(__name__)
+
+COVERAGE_PERIODS = ['1d'] + KLine.INTRADAY_PERIODS
+COVERAGE_FIELDS = [
+    'first_date', 'last_date', 'expected_sessions', 'actual_sessions', 'gaps', 'zero_volume', 'duplicate_dates',
+]
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class KLineCoverageService:
+    """K线覆盖索引的构建和增量更新"""
+
+    def __init__(self, calendar=None):
+        """
+        :param calendar: 交易日历，默认进程内共享的 trading_calendar.get_trading_calendar()
+        """
+        self.calendar = calendar or get_trading_calendar()
+
+    def rebuild(self, period='1d', instruments=None, batch_size=200):
+        """
+        全量构建覆盖索引
+        :param instruments: Instrument 或 id 列表，默认全部标的
+        :return: 更新的记录数
+        """
+        if instruments is None:
+            ids = list(Instrument.objects.values_list('id', flat=True))
+        else:
+            ids = [getattr(instrument, 'id', instrument) for instrument in instruments]
+        for i in range(0, len(ids), batch_size):
+            batch = ids[i:i + batch_size]
+            self._refresh(period, dict.fromkeys(batch), self._coverages(period, batch))
+        logger.info(f"重建 {len(ids)} 个标的的 {period} K线覆盖索引")
+        return len(ids)
+
+    def update(self, period, ranges):
+        """
+        写入K线后增量更新覆盖索引（与写入在同一事务中调用）
+        :param ranges: {instrument_id: (start_date, end_date)}，写入（含删除）K线的日期区间
+        :return: 更新的记录数，period 不统计覆盖时为 0
+        """
+        if period not in COVERAGE_PERIODS or not ranges:
+            return 0
+        coverages = self._coverages(period, list(ranges))
+        windows = {
+            instrument_id: self._window(coverages.get(instrument_id), _as_date(start), _as_date(end))
+            for instrument_id, (start, end) in ranges.items()
+        }
+        return self._refresh(period, windows, coverages)
+
+    @staticmethod
+    def _coverages(period, ids):
+        return {
+            coverage.instrument_id: coverage
+            for coverage in KLineCoverage.objects.filter(instrument_id__in=ids, period=period)
+        }
+
+    def _window(self, coverage, start, end):
+        """
+        增量统计的日期窗口：写入区间向两侧扩展到最近的已有K线，使窗口外的缺口不受影响
+        没有覆盖记录时返回 None（全量统计）
+        """
+        if coverage is None or coverage.first_date is None:
+            return None
+        first, last = coverage.first_date, coverage.last_date
+        if start <= first:
+            low = start
+        elif start > last:
+            low = last
+        else:
+            low = self._bar_before(coverage, start)
+        if end >= last:
+            high = end
+        elif end < first:
+            high = first
+        else:
+            high = self._bar_after(coverage, end)
+        return low, high
+
+    def _bar_before(self, coverage, day):
+        """day 之前最近的已有K线日期：前一个交易日，落在缺口中时为缺口之前的交易日"""
+        previous = self.calendar.previous_session(day)
+        if previous < coverage.first_date:
+            return coverage.first_date
+        for start, end, _ in coverage.gaps:
+            if start <= previous.isoformat() <= end:
+                return self.calendar.previous_session(date.fromisoformat(start))
+        return previous
+
+    def _bar_after(self, coverage, day):
+        """day 之后最近的已有K线日期"""
+        following = self.calendar.next_session(day)
+        if following > coverage.last_date:
+            return coverage.last_date
+        for start, end, _ in coverage.gaps:
+            if start <= following.isoformat() <= end:
+                return self.calendar.next_session(date.fromisoformat(end))
+        return following
+
+    def _load_days(self, period, windows):
+        """
+        按 (标的, 日期) 分组统计K线条数、不同时间数和成交量，窗口为 None 的标的统计全部日期
+        :return: {instrument_id: (日期数组 datetime64[D], 条数, 不同时间数, 成交量)}
+        """
+        # 窗口相同的标的（如同一次同步、同一块导入数据）合并为一个 IN 条件
+        groups = {}
+        for instrument_id, window in windows.items():
+            groups.setdefault(window, []).append(instrument_id)
+        conditions = []
+        for window, ids in groups.items():
+            for i in range(0, len(ids), 500):
+                condition = Q(instrument_id__in=ids[i:i + 500])
+                if window is not None:
+                    condition &= Q(trade_date__gte=window[0], trade_date__lte=window[1])
+                conditions.append(condition)
+
+        rows = []
+        for condition in conditions:
+            rows.extend(
+                KLine.objects.filter(condition, period=period).values('instrument_id', 'trade_date').annotate(
+                    bars=Count('id'), times=Count('trade_time', distinct=True), volume=Sum('volume')
+                ).order_by('instrument_id', 'trade_date').values_list(
+                    'instrument_id', 'trade_date', 'bars', 'times', 'volume'
+                )
+            )
+        if not rows:
+            return {}
+
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        days = np.array([row[1] for row in rows], dtype='datetime64[D]')
+        counts = np.array([(row[2], row[3], row[4] or 0) for row in rows], dtype=np.int64)
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        ends = np.r_[starts[1:], len(ids)]
+        return {
+            int(ids[s]): (days[s:e], counts[s:e, 0], counts[s:e, 1], counts[s:e, 2])
+            for s, e in zip(starts, ends)
+        }
+
+    def _refresh(self, period, windows, coverages):
+        """统计各标的在窗口内的覆盖情况，与窗口外的原记录合并后写入"""
+        loaded = self._load_days(period, windows)
+        # 窗口内没有K线（如区间内的K线都被删除）时无法确定首尾，改为全量统计
+        retry = [
+            instrument_id for instrument_id, window in windows.items()
+            if window is not None and instrument_id not in loaded
+        ]
+        if retry:
+            loaded.update(self._load_days(period, dict.fromkeys(retry)))
+            windows = {**windows, **dict.fromkeys(retry)}
+
+        bounds = []
+        for days, *_ in loaded.values():
+            bounds.extend([_as_date(days[0]), _as_date(days[-1])])
+        for coverage in coverages.values():
+            if coverage.first_date is not None:
+                bounds.extend([coverage.first_date, coverage.last_date])
+        sessions = np.array(
+            self.calendar.sessions_between(min(bounds), max(bounds)) if bounds else [], dtype='datetime64[D]'
+        )
+
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        for instrument_id, window in windows.items():
+            coverage = coverages.get(instrument_id)
+            if coverage is None:
+                coverage = KLineCoverage(instrument_id=instrument_id, period=period)
+                to_create.append(coverage)
+            else:
+                to_update.append(coverage)
+            coverage.updated_at = now
+            if instrument_id in loaded:
+                self._apply(coverage, sessions, window, *loaded[instrument_id])
+            else:
+                coverage.first_date = coverage.last_date = None
+                coverage.expected_sessions = coverage.actual_sessions = 0
+                coverage.gaps, coverage.zero_volume, coverage.duplicate_dates = [], [], []
+
+        KLineCoverage.objects.bulk_create(to_create, batch_size=1000)
+        KLineCoverage.objects.bulk_update(to_update, COVERAGE_FIELDS + ['updated_at'], batch_size=1000)
+        return len(windows)
+
+    def _apply(self, coverage, sessions, window, days, bars, times, volume):
+        """用窗口内的统计更新覆盖记录，窗口为 None 时整体替换"""
+        left = np.searchsorted(sessions, days, 'left')
+        right = np.searchsorted(sessions, days, 'right')
+
+        # 相邻两个K线日期之间的交易日即为缺口
+        missing = left[1:] - right[:-1]
+        gaps = [
+            [str(sessions[right[i]]), str(sessions[left[i + 1] - 1]), int(missing[i])]
+            for i in np.flatnonzero(missing > 0)
+        ]
+        # 连续的零成交量交易日合并为区间
+        positions = left[(volume == 0) & (right > left)]
+        breaks = np.flatnonzero(np.diff(positions) != 1)
+        zero_volume = [
+            [str(sessions[positions[s]]), str(sessions[positions[e]]), int(positions[e] - positions[s] + 1)]
+            for s, e in zip(np.r_[0, breaks + 1], np.r_[breaks, len(positions) - 1])
+        ] if len(positions) else []
+        # 日线及以上 trade_time 为空，同一日期多于一条即为重复
+        duplicates = [str(day) for day in days[bars > np.maximum(times, 1)]]
+
+        first, last = _as_date(days[0]), _as_date(days[-1])
+        if window is not None:
+            low, high = window
+            if coverage.first_date < low:
+                first = coverage.first_date
+            if coverage.last_date > high:
+                last = coverage.last_date
+            gaps = self._merge_ranges(sessions, self._outside(sessions, coverage.gaps, low, high) + gaps)
+            zero_volume = self._merge_ranges(
+                sessions, self._outside(sessions, coverage.zero_volume, low, high) + zero_volume
+            )
+            duplicates = sorted(
+                [day for day in coverage.duplicate_dates if not low.isoformat() <= day <= high.isoformat()]
+                + duplicates
+            )
+
+        coverage.first_date, coverage.last_date = first, last
+        coverage.expected_sessions = self._count(sessions, first, last)
+        coverage.actual_sessions = coverage.expected_sessions - sum(count for _, _, count in gaps)
+        coverage.gaps, coverage.zero_volume, coverage.duplicate_dates = gaps, zero_volume, duplicates
+
+    @staticmethod
+    def _count(sessions, start, end):
+        """[start, end] 内的交易日数"""
+        return int(
+            np.searchsorted(sessions, np.datetime64(end, 'D'), 'right')
+            - np.searchsorted(sessions, np.datetime64(start, 'D'), 'left')
+        )
+
+    def _outside(self, sessions, ranges, low, high):
+        """原记录的区间中落在窗口 [low, high] 之外的部分"""
+        low, high = low.isoformat(), high.isoformat()
+        result = []
+        for start, end, count in ranges:
+            if end < low or start > high:
+                result.append([start, end, count])
+                continue
+            if start < low:
+                piece_end = self.calendar.previous_session(date.fromisoformat(low)).isoformat()
+                result.append([start, piece_end, self._count(sessions, start, piece_end)])
+            if end > high:
+                piece_start = self.calendar.next_session(date.fromisoformat(high)).isoformat()
+                result.append([piece_start, end, self._count(sessions, piece_start, end)])
+        return result
+
+    def _merge_ranges(self, sessions, ranges):
+        """按开始日期排序，首尾相接（中间没有其他交易日）的区间合并"""
+        merged = []
+        for start, end, count in sorted(ranges):
+            if merged:
+                previous_end = np.searchsorted(sessions, np.datetime64(merged[-1][1]), 'right')
+                if np.searchsorted(sessions, np.datetime64(start), 'left') <= previous_end:
+                    merged[-1][1] = max(merged[-1][1], end)
+                    merged[-1][2] = self._count(sessions, merged[-1][0], merged[-1][1])
+                    continue
+            merged.append([start, end, count])
+        return merged
@@ -1,21 +1,157 @@
 import akshare as ak
+import numpy as np
 import pandas as pd
-from datetime import datetime, date
+import requests
+from django.conf import settings
 import logging
+import random
+import threading
 import time
+from .rate_limit import TokenBucket
 
 logger = logging.getLogger(__name__)
 
+MAX_RETRIES = 3  # 被限流时的最大重试次数
+BACKOFF_SECONDS = 1.0  # 首次重试前的等待时间，之后每次翻倍
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """进程内所有数据请求共享的令牌桶，速率由 MARKET_DATA_RATE_LIMIT（每秒请求数）配置"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucket(
+                getattr(settings, 'MARKET_DATA_RATE_LIMIT', 2),
+                getattr(settings, 'MARKET_DATA_RATE_BURST', None),
+            )
+    return _rate_limiter
+
+
+def _is_throttled(error):
+    """是否为上游限流或连接被拒绝（可以退避重试）"""
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status in (429, 503):
+        return True
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError))
+
+
+def rate_limited_call(func, *args, **kwargs):
+    """
+    受共享限流器约束地调用数据接口
+    上游限流时降低共享速率，并按指数退避重试
+    """
+    limiter = get_rate_limiter()
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= MAX_RETRIES or not _is_throttled(e):
+                raise
+            limiter.throttle()
+            delay = BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning(f"请求被限流，{delay:.1f} 秒后第 {attempt + 1} 次重试: {e}")
+            time.sleep(delay)
+            continue
+        limiter.recover()
+        return result
+
+
+# 标准化后的K线列，与 KLine 模型字段一致
+KLINE_COLUMNS = ['trade_date', 'open_price', 'high_price', 'low_price', 'close_price', 'volume', 'amount', 'open_interest']
+FLOAT_COLUMNS = ['open_price', 'high_price', 'low_price', 'close_price', 'amount']
+INTEGER_COLUMNS = ['volume', 'open_interest']
+# 分钟K线另有 trade_time 列（datetime.time，K线的结束时间）
+INTRADAY_COLUMNS = KLINE_COLUMNS + ['trade_time']
+
+# 分钟周期 -> akshare 接口的 period 参数
+INTRADAY_PERIODS = {'1m': '1', '5m': '5', '15m': '15', '30m': '30', '1h': '60'}
+
+
+def empty_klines():
+    """没有数据时返回的空K线 DataFrame"""
+    return normalize_klines(pd.DataFrame(columns=['trade_date']), {})
+
+
+def normalize_klines(df, columns):
+    """
+    向量化标准化K线数据：重命名列，一次性转换日期，按列转换类型
+    :param df: 数据源返回的 DataFrame
+    :param columns: {原列名: 标准列名}，标准列名见 KLINE_COLUMNS
+    :return: 列为 KLINE_COLUMNS 的 DataFrame：trade_date 为 datetime64，价格和成交额为 float64，
+             成交量和持仓量为可空整数 Int64（小数部分截断），数据源没有的列为缺失值
+    """
+    df = df.rename(columns=columns)
+    result = pd.DataFrame(index=df.index)
+    result['trade_date'] = pd.to_datetime(df['trade_date']).dt.normalize()
+
+    for column in FLOAT_COLUMNS:
+        if column in df.columns:
+            result[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+        else:
+            result[column] = np.nan
+
+    for column in INTEGER_COLUMNS:
+        if column in df.columns:
+            result[column] = np.trunc(pd.to_numeric(df[column], errors='coerce')).astype('Int64')
+        else:
+            result[column] = pd.array([pd.NA] * len(df), dtype='Int64')
+
+    return result[KLINE_COLUMNS].reset_index(drop=True)
+
+
+def empty_intraday_klines():
+    """没有数据时返回的空分钟K线 DataFrame"""
+    return normalize_intraday_klines(pd.DataFrame(columns=['trade_date']), {})
+
+
+def normalize_intraday_klines(df, columns):
+    """
+    标准化分钟K线数据，时间戳列拆分为 trade_date 和 trade_time
+    :param columns: {原列名: 标准列名}，时间戳列映射为 trade_date
+    :return: 列为 INTRADAY_COLUMNS 的 DataFrame，按时间排序
+    """
+    df = df.rename(columns=columns)
+    timestamps = pd.to_datetime(df['trade_date'])
+    result = normalize_klines(df, {})
+    result['trade_time'] = pd.Series(timestamps.dt.time.to_numpy(), dtype=object)
+    order = np.argsort(timestamps.to_numpy(), kind='stable')
+    return result.iloc[order][INTRADAY_COLUMNS].reset_index(drop=True)
+
+
+def _intraday_period(period):
+    if period not in INTRADAY_PERIODS:
+        raise ValueError(f"不支持的分钟周期: {period}，可选 {', '.join(INTRADAY_PERIODS)}")
+    return INTRADAY_PERIODS[period]
+
+
+def to_kline_frame(data):
+    """
+    将数据源返回的K线转换为标准化 DataFrame
+    :param data: normalize_klines 的结果，或以 KLINE_COLUMNS 为键的 dict 列表
+    """
+    if isinstance(data, pd.DataFrame):
+        return data
+    if not data:
+        return empty_klines()
+    return normalize_klines(pd.DataFrame.from_records(data), {})
+
 
 class AkshareDataFetcher:
     """akshare数据获取器"""
 
     @staticmethod
-    def fetch_stock_daily(symbol, start_date, end_date):
-        """获取股票日线数据"""
+    def fetch_stock_daily(symbol, start_date, end_date, raise_errors=False):
+        """
+        获取股票日线数据，返回标准化的K线 DataFrame（见 normalize_klines）
+        :param raise_errors: 获取失败时抛出异常而不是返回空数据（历史回补需要区分"没有数据"和"获取失败"）
+        """
         try:
-            time.sleep(0.5)  # 避免频率限制
-            df = ak.stock_zh_a_hist(
+            df = rate_limited_call(
+                ak.stock_zh_a_hist,
                 symbol=symbol,
                 period="daily",
                 start_date=start_date.replace('-', ''),
@@ -23,56 +159,103 @@ class AkshareDataFetcher:
                 adjust="qfq"  # 前复权
             )
             if df.empty:
-                return []
+                return empty_klines()
 
             # 标准化列名 - akshare返回12列
             df.columns = ['date', 'stock_code', 'open', 'close', 'high', 'low', 'volume', 'amount', 'amplitude', 'change_pct', 'change_amount', 'turnover']
 
-            return [{
-                'trade_date': row['date'] if isinstance(row['date'], date) else datetime.strptime(row['date'], '%Y-%m-%d').date(),
-                'open_price': float(row['open']),
-                'high_price': float(row['high']),
-                'low_price': float(row['low']),
-                'close_price': float(row['close']),
-                'volume': int(row['volume']),
-                'amount': float(row['amount']) if pd.notna(row['amount']) else None,
-            } for _, row in df.iterrows()]
+            return normalize_klines(df, {
+                'date': 'trade_date', 'open': 'open_price', 'high': 'high_price', 'low': 'low_price',
+                'close': 'close_price', 'volume': 'volume', 'amount': 'amount',
+            })
         except Exception as e:
             logger.error(f"获取股票 {symbol} 数据失败: {e}")
-            return []
+            if raise_errors:
+                raise
+            return empty_klines()
 
     @staticmethod
-    def fetch_futures_daily(symbol, start_date, end_date):
-        """获取期货日线数据"""
+    def fetch_futures_daily(symbol, start_date, end_date, raise_errors=False):
+        """
+        获取期货日线数据，返回标准化的K线 DataFrame（见 normalize_klines）
+        :param raise_errors: 获取失败时抛出异常而不是返回空数据
+        """
         try:
-            time.sleep(0.5)
-            df = ak.futures_main_sina(symbol=symbol, start_date=start_date, end_date=end_date)
+            df = rate_limited_call(ak.futures_main_sina, symbol=symbol, start_date=start_date, end_date=end_date)
             if df.empty:
-                return []
-
-            return [{
-                'trade_date': row['date'].date() if isinstance(row['date'], pd.Timestamp) else datetime.strptime(str(row['date']), '%Y-%m-%d').date(),
-                'open_price': float(row['open']),
-                'high_price': float(row['high']),
-                'low_price': float(row['low']),
-                'close_price': float(row['close']),
-                'volume': int(row['volume']),
-                'open_interest': int(row['hold']) if 'hold' in df.columns and pd.notna(row.get('hold')) else None,
-            } for _, row in df.iterrows()]
+                return empty_klines()
+
+            columns = [column for column in ('date', 'open', 'high', 'low', 'close', 'volume', 'hold') if column in df.columns]
+            return normalize_klines(df[columns], {
+                'date': 'trade_date', 'open': 'open_price', 'high': 'high_price', 'low': 'low_price',
+                'close': 'close_price', 'volume': 'volume', 'hold': 'open_interest',
+            })
         except Exception as e:
             logger.error(f"获取期货 {symbol} 数据失败: {e}")
-            return []
+            if raise_errors:
+                raise
+            return empty_klines()
+
+    @staticmethod
+    def fetch_stock_minute(symbol, start_date, end_date, period='1m', raise_errors=False):
+        """
+        获取股票分钟K线（不复权），返回标准化的分钟K线 DataFrame（见 normalize_intraday_klines）
+        东方财富的 1 分钟线只保留最近 5 个交易日，需要定时增量获取
+        :param period: '1m' / '5m' / '15m' / '30m' / '1h'
+        """
+        try:
+            df = rate_limited_call(
+                ak.stock_zh_a_hist_min_em,
+                symbol=symbol,
+                start_date=f'{start_date} 09:00:00',
+                end_date=f'{end_date} 15:30:00',
+                period=_intraday_period(period),
+                adjust=''
+            )
+            if df.empty:
+                return empty_intraday_klines()
+
+            columns = [column for column in ('时间', '开盘', '收盘', '最高', '最低', '成交量', '成交额') if column in df.columns]
+            return normalize_intraday_klines(df[columns], {
+                '时间': 'trade_date', '开盘': 'open_price', '收盘': 'close_price', '最高': 'high_price',
+                '最低': 'low_price', '成交量': 'volume', '成交额': 'amount',
+            })
+        except Exception as e:
+            logger.error(f"获取股票 {symbol} 分钟数据失败: {e}")
+            if raise_errors:
+                raise
+            return empty_intraday_klines()
+
+    @staticmethod
+    def fetch_futures_minute(symbol, start_date, end_date, period='1m', raise_errors=False):
+        """
+        获取期货分钟K线，返回标准化的分钟K线 DataFrame
+        新浪接口只返回最近一段时间的数据，这里按日期区间截取；夜盘K线的日期为自然日
+        """
+        try:
+            df = rate_limited_call(ak.futures_zh_minute_sina, symbol=symbol, period=_intraday_period(period))
+            if df.empty:
+                return empty_intraday_klines()
+
+            columns = [column for column in ('datetime', 'open', 'high', 'low', 'close', 'volume', 'hold') if column in df.columns]
+            data = normalize_intraday_klines(df[columns], {
+                'datetime': 'trade_date', 'open': 'open_price', 'high': 'high_price', 'low': 'low_price',
+                'close': 'close_price', 'volume': 'volume', 'hold': 'open_interest',
+            })
+            dates = data['trade_date']
+            return data[(dates >= pd.Timestamp(start_date)) & (dates <= pd.Timestamp(end_date))].reset_index(drop=True)
+        except Exception as e:
+            logger.error(f"获取期货 {symbol} 分钟数据失败: {e}")
+            if raise_errors:
+                raise
+            return empty_intraday_klines()
 
     @staticmethod
     def fetch_stock_list():
         """获取股票列表"""
         try:
-            time.sleep(0.5)
-            df = ak.stock_info_a_code_name()
-            return [{
-                'symbol': row['code'],
-                'name': row['name'],
-            } for _, row in df.iterrows()]
+            df = rate_limited_call(ak.stock_info_a_code_name)
+            return df[['code', 'name']].rename(columns={'code': 'symbol'}).to_dict('records')
         except Exception as e:
             logger.error(f"获取股票列表失败: {e}")
             return []
@@ -81,12 +264,18 @@ class AkshareDataFetcher:
     def fetch_futures_list():
         """获取期货合约列表"""
         try:
-            time.sleep(0.5)
-            df = ak.futures_display_main_sina()
-            return [{
-                'symbol': row['symbol'],
-                'name': row['name'],
-            } for _, row in df.iterrows()]
+            df = rate_limited_call(ak.futures_display_main_sina)
+            return df[['symbol', 'name']].to_dict('records')
         except Exception as e:
             logger.error(f"获取期货列表失败: {e}")
             return []
+
+    @staticmethod
+    def fetch_trade_dates():
+        """获取A股交易日历（含当年已公布的交易日），返回 YYYY-MM-DD 字符串列表"""
+        try:
+            df = rate_limited_call(ak.tool_trade_date_hist_sina)
+            return pd.to_datetime(df['trade_date']).dt.strftime('%Y-%m-%d').tolist()
+        except Exception as e:
+            logger.error(f"获取交易日历失败: {e}")
+            return []
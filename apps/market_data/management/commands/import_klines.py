@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.market_data.bulk_import import KLineFileImporter
+from apps.market_data.models import KLine
+
+
+class Command(BaseCommand):
+    help = '从 CSV/Parquet 文件批量导入K线（PostgreSQL 用 COPY，按块集合合并）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            help='文件或目录（目录下的 .csv / .parquet 文件）'
+        )
+        parser.add_argument(
+            '--period',
+            type=str,
+            default='1d',
+            choices=[period for period, _ in KLine.PERIODS],
+            help='文件中K线的周期（默认 1d）'
+        )
+        parser.add_argument(
+            '--symbol',
+            type=str,
+            help='文件中没有代码列时使用的标的代码（默认取文件名，如 000001.csv、000001_1m.csv）'
+        )
+        parser.add_argument(
+            '--chunk-rows',
+            type=int,
+            default=500_000,
+            help='每块读取和合并的行数（默认 500000）'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='只读取和校验，不写入数据库'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_rows'] <= 0:
+            raise CommandError('--chunk-rows 必须大于 0')
+
+        importer = KLineFileImporter(
+            period=options['period'], chunk_rows=options['chunk_rows'], dry_run=options['dry_run']
+        )
+        self.stdout.write(f"开始导入 {options['period']} K线（已加载 {len(importer.symbols)} 个标的代码）...")
+        try:
+            stats = importer.import_paths(options['paths'], symbol=options['symbol'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f'导入失败: {e}')
+
+        rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"导入完成: {stats['files']} 个文件，读取 {stats['rows']} 行，有效 {stats['staged']} 行，"
+            f"新增 {stats['inserted']} 条，更新 {stats['updated']} 条，未变 {stats['unchanged']} 条，"
+            f"耗时 {stats['seconds']:.1f} 秒（{rate:.0f} 行/秒）"
+        ))
+        rejected = {reason: count for reason, count in stats['rejected'].items() if count}
+        if rejected:
+            self.stdout.write(self.style.WARNING(
+                '丢弃: ' + '，'.join(f'{reason} {count}' for reason, count in rejected.items())
+            ))
+        if stats['inserted'] or stats['updated']:
+            self.stdout.write('导入的K线不会触发增量合成和指标计算，请运行 resample_klines --all --full 和 calculate_indicators --all')
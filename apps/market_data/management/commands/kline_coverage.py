@@ -0,0 +1,117 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Sum
+from apps.market_data.coverage import COVERAGE_PERIODS, KLineCoverageService
+from apps.market_data.models import Instrument, KLineCoverage
+from apps.market_data.services import MarketDataService
+
+
+class Command(BaseCommand):
+    help = '查看K线覆盖索引（缺口、重复、零成交量），重建索引或只重新获取缺口'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period',
+            type=str,
+            default='1d',
+            choices=COVERAGE_PERIODS,
+            help='K线周期（默认 1d）'
+        )
+        parser.add_argument(
+            '--symbol',
+            type=str,
+            help='只处理指定标的（默认全部活跃标的）'
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='全量重建覆盖索引'
+        )
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='只重新获取缺口区间的K线'
+        )
+        parser.add_argument(
+            '--zero-volume',
+            action='store_true',
+            help='修补时同时重新获取成交量为 0 的交易日'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='修补时也重新获取已确认数据源没有数据的区间（如停牌）'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='修补时的并发线程数（默认 MARKET_DATA_FETCH_WORKERS）'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='列出缺失交易日最多的前N个标的（默认 20）'
+        )
+
+    def handle(self, *args, **options):
+        period = options['period']
+        if options['symbol']:
+            instruments = list(Instrument.objects.filter(symbol=options['symbol']))
+            if not instruments:
+                raise CommandError(f"标的 {options['symbol']} 不存在")
+        else:
+            instruments = list(Instrument.objects.filter(is_active=True))
+
+        if options['rebuild']:
+            count = KLineCoverageService().rebuild(period, instruments)
+            self.stdout.write(self.style.SUCCESS(f'已重建 {count} 个标的的 {period} 覆盖索引'))
+
+        if options['repair']:
+            service = MarketDataService()
+            results = service.repair_gaps_batch(
+                instruments, period, workers=options['workers'], zero_volume=options['zero_volume'],
+                force=options['force']
+            )
+            inserted = sum(stats['inserted'] for _, stats, error in results if error is None)
+            failed = [instrument.symbol for instrument, _, error in results if error is not None]
+            self.stdout.write(self.style.SUCCESS(f'修补 {len(results)} 个标的，新增 {inserted} 条K线'))
+            if failed:
+                self.stdout.write(self.style.WARNING(f"失败: {', '.join(failed)}"))
+            if service.pipeline_stats:
+                self.stdout.write(str(service.pipeline_stats))
+
+        coverages = KLineCoverage.objects.filter(instrument__in=instruments, period=period)
+        totals = coverages.aggregate(expected=Sum('expected_sessions'), actual=Sum('actual_sessions'))
+        self.stdout.write(
+            f"{period} 覆盖索引: {coverages.count()} 个标的，应有 {totals['expected'] or 0} 个交易日，"
+            f"实有 {totals['actual'] or 0} 个"
+        )
+
+        worst = coverages.annotate(
+            missing=F('expected_sessions') - F('actual_sessions')
+        ).filter(missing__gt=0).select_related('instrument').order_by('-missing')[:options['limit']]
+        for coverage in worst:
+            gaps = ', '.join(f'{start}~{end}' for start, end, _ in coverage.gaps[:3])
+            more = f' 等 {len(coverage.gaps)} 个缺口' if len(coverage.gaps) > 3 else ''
+            self.stdout.write(
+                f'  {coverage.instrument.symbol}: {coverage.first_date} ~ {coverage.last_date}，'
+                f'缺 {coverage.missing_sessions}/{coverage.expected_sessions} 个交易日（{gaps}{more}）'
+            )
+
+        # JSON 字段在 SQLite 和 PostgreSQL 上的空列表查询写法不同，在 Python 中筛选
+        indexed = list(coverages.select_related('instrument').only(
+            'instrument__symbol', 'zero_volume', 'duplicate_dates'
+        ))
+        duplicated = [coverage for coverage in indexed if coverage.duplicate_dates]
+        if duplicated:
+            self.stdout.write(self.style.WARNING(
+                f"{len(duplicated)} 个标的有重复K线: "
+                + ', '.join(f'{coverage.instrument.symbol}({len(coverage.duplicate_dates)})' for coverage in duplicated[:10])
+            ))
+        zero = [coverage for coverage in indexed if coverage.zero_volume]
+        if zero:
+            self.stdout.write(
+                f"{len(zero)} 个标的有零成交量交易日: "
+                + ', '.join(f'{coverage.instrument.symbol}({len(coverage.zero_volume)})' for coverage in zero[:10])
+            )
@@ -0,0 +1,47 @@
+from datetime import date, datetime
+from django.core.management.base import BaseCommand, CommandError
+from apps.market_data.partitions import (
+    drop_kline_partitions, ensure_kline_partitions, existing_partitions, is_partitioned, partition_name,
+)
+
+
+class Command(BaseCommand):
+    help = '管理分钟K线的月分区（仅 PostgreSQL）：查看、预先创建、按月删除过期数据'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--create-months',
+            type=int,
+            metavar='N',
+            help='预先创建从本月起的 N 个月分区（写入分钟K线时也会自动创建）'
+        )
+        parser.add_argument(
+            '--drop-before',
+            type=str,
+            metavar='DATE',
+            help='删除整月都早于该日期（YYYY-MM-DD）的分区及其技术指标'
+        )
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            self.stdout.write(self.style.WARNING('当前数据库的 market_kline 未分区（仅 PostgreSQL 迁移后分区）'))
+            return
+
+        if options['create_months']:
+            first = date.today().replace(day=1)
+            months = first.year * 12 + first.month - 1 + options['create_months'] - 1
+            created = ensure_kline_partitions(first, date(months // 12, months % 12 + 1, 1))
+            self.stdout.write(self.style.SUCCESS(f'新建 {len(created)} 个分区'))
+
+        if options['drop_before']:
+            try:
+                before = datetime.strptime(options['drop_before'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError(f"日期格式错误: {options['drop_before']}，应为 YYYY-MM-DD")
+            dropped = drop_kline_partitions(before)
+            self.stdout.write(self.style.SUCCESS(f"删除 {len(dropped)} 个分区: {', '.join(dropped) or '无'}"))
+
+        months = existing_partitions()
+        self.stdout.write(f'分钟K线共 {len(months)} 个月分区')
+        for month in months:
+            self.stdout.write(f'  {partition_name(month)}')
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.market_data.models import Instrument
+from apps.market_data.resampling import DERIVED_PERIODS
+from apps.market_data.services import MarketDataService
+
+
+class Command(BaseCommand):
+    help = '由日线/1分钟线在本地合成周线、月线和分钟周期K线'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--symbol',
+            type=str,
+            help='标的代码'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='合成所有活跃标的'
+        )
+        parser.add_argument(
+            '--periods',
+            type=str,
+            help=f"合成的周期，逗号分隔（可选：{', '.join(DERIVED_PERIODS)}，默认 MARKET_DATA_RESAMPLE_PERIODS）"
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='全量合成（默认从最后一根合成K线所在的周期开始增量合成）'
+        )
+
+    def handle(self, *args, **options):
+        symbol = options['symbol']
+        if not symbol and not options['all']:
+            raise CommandError('请指定 --symbol 或 --all')
+        if symbol and options['all']:
+            raise CommandError('--symbol 和 --all 不能同时使用')
+
+        if options['periods']:
+            periods = [period.strip() for period in options['periods'].split(',') if period.strip()]
+        else:
+            periods = settings.MARKET_DATA_RESAMPLE_PERIODS
+        unknown = [period for period in periods if period not in DERIVED_PERIODS]
+        if unknown:
+            raise CommandError(f"不支持合成的周期: {', '.join(unknown)}")
+
+        if symbol:
+            instruments = list(Instrument.objects.filter(symbol=symbol))
+            if not instruments:
+                raise CommandError(f'标的 {symbol} 不存在')
+        else:
+            instruments = list(Instrument.objects.filter(is_active=True))
+
+        service = MarketDataService()
+        self.stdout.write(f'开始合成 {len(instruments)} 个标的的 {", ".join(periods)} K线...')
+        totals = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+        error_count = 0
+        for instrument in instruments:
+            try:
+                for period in periods:
+                    stats = service.resample_klines(instrument, period, full=options['full'])
+                    for key in totals:
+                        totals[key] += stats[key]
+            except Exception as e:
+                error_count += 1
+                self.stdout.write(self.style.ERROR(f'  {instrument.symbol} 合成失败: {e}'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"合成完成，新增 {totals['inserted']} 条，更新 {totals['updated']} 条，"
+            f"未变 {totals['unchanged']} 条，删除 {totals['deleted']} 条"
+        ))
+        if error_count:
+            self.stdout.write(self.style.WARNING(f'失败: {error_count}'))
@@ -1,6 +1,7 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from apps.market_data.models import KLine
 from apps.market_data.services import MarketDataService
-from apps.market_data.data_fetcher import AkshareDataFetcher
+from apps.market_data.sources import get_data_source
 from datetime import datetime, timedelta
 import logging
 
@@ -29,15 +30,42 @@ class Command(BaseCommand):
             default=30,
             help='同步最近N天的数据'
         )
+        parser.add_argument(
+            '--period',
+            type=str,
+            choices=['1d', *KLine.INTRADAY_PERIODS],
+            default='1d',
+            help='同步的K线周期（日线或分钟线，分钟线数据源通常只提供最近几个交易日）'
+        )
         parser.add_argument(
             '--sync-list',
             action='store_true',
             help='同步标的列表'
         )
+        parser.add_argument(
+            '--deactivate-missing',
+            action='store_true',
+            help='同步标的列表时，把数据源中已不存在的标的标记为不活跃'
+        )
+        parser.add_argument(
+            '--backfill',
+            type=str,
+            metavar='START_DATE',
+            help='从指定日期（YYYY-MM-DD）回补历史数据到今天；指定 --symbol 时只回补该标的，否则回补 --type 对应的全部活跃标的'
+        )
+        parser.add_argument(
+            '--source',
+            type=str,
+            help='数据源（akshare、local 或数据源类的导入路径，默认 MARKET_DATA_SOURCE）'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='批量同步和回补时的并发线程数（默认 MARKET_DATA_FETCH_WORKERS）'
+        )
 
     def handle(self, *args, **options):
-        service = MarketDataService()
-        fetcher = AkshareDataFetcher()
+        service = MarketDataService(get_data_source(options['source']) if options['source'] else None)
 
         sync_type = options['type']
         symbol = options['symbol']
@@ -46,49 +74,102 @@ class Command(BaseCommand):
 
         # 同步标的列表
         if sync_list:
-            if sync_type in ['stock', 'all']:
-                self.stdout.write('同步股票列表...')
-                stocks = fetcher.fetch_stock_list()
-                for stock in stocks[:100]:  # 限制数量避免过长
-                    try:
-                        service.import_instrument(
-                            symbol=stock['symbol'],
-                            market_type='STOCK',
-                            name=stock['name'],
-                            exchange='SSE' if stock['symbol'].startswith('6') else 'SZSE'
-                        )
-                    except Exception as e:
-                        logger.error(f"导入股票 {stock['symbol']} 失败: {e}")
-                self.stdout.write(self.style.SUCCESS(f'股票列表同步完成'))
-
-            if sync_type in ['futures', 'all']:
-                self.stdout.write('同步期货列表...')
-                futures = fetcher.fetch_futures_list()
-                for future in futures:
-                    try:
-                        service.import_instrument(
-                            symbol=future['symbol'],
-                            market_type='FUTURES',
-                            name=future['name'],
-                            exchange='CFFEX'
-                        )
-                    except Exception as e:
-                        logger.error(f"导入期货 {future['symbol']} 失败: {e}")
-                self.stdout.write(self.style.SUCCESS(f'期货列表同步完成'))
-
-        # 同步K线数据
-        if symbol:
+            for market_type, label in [('STOCK', '股票'), ('FUTURES', '期货')]:
+                if sync_type not in [market_type.lower(), 'all']:
+                    continue
+                self.stdout.write(f'同步{label}列表...')
+                stats = service.sync_instrument_list(market_type, deactivate_missing=options['deactivate_missing'])
+                self.stdout.write(self.style.SUCCESS(
+                    f"{label}列表同步完成，新增 {stats['created']} 个，更新 {stats['updated']} 个，"
+                    f"未变 {stats['unchanged']} 个，停用 {stats['deactivated']} 个"
+                ))
+
+        # 回补历史数据
+        if options['backfill']:
+            self._backfill(service, options['backfill'], symbol, sync_type, options['workers'])
+            return
+
+        # 同步K线数据：未指定标的时同步全部活跃标的（只同步标的列表时除外）
+        if not symbol and not sync_list:
+            self._sync_all(service, sync_type, days, options['period'], options['workers'])
+        elif symbol:
             from apps.market_data.models import Instrument
             try:
                 instrument = Instrument.objects.get(symbol=symbol)
-                self.stdout.write(f'同步 {symbol} 最近 {days} 天数据...')
+                self.stdout.write(f"同步 {symbol} 最近 {days} 天 {options['period']} 数据...")
 
                 end_date = datetime.now().strftime('%Y-%m-%d')
                 start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
 
-                count = service.import_kline_data(instrument.id, start_date, end_date)
-                self.stdout.write(self.style.SUCCESS(f'同步完成，共 {count} 条数据'))
+                stats = service.import_kline_data(instrument.id, start_date, end_date, options['period'])
+                self.stdout.write(self.style.SUCCESS(
+                    f"同步完成，新增 {stats['inserted']} 条，更新 {stats['updated']} 条，未变 {stats['unchanged']} 条"
+                ))
             except Instrument.DoesNotExist:
                 self.stdout.write(self.style.ERROR(f'标的 {symbol} 不存在'))
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f'同步失败: {e}'))
+
+    def _backfill(self, service, start_date, symbol, sync_type, workers):
+        from apps.market_data.models import Instrument
+        try:
+            datetime.strptime(start_date, '%Y-%m-%d')
+        except ValueError:
+            raise CommandError(f'日期格式错误: {start_date}，应为 YYYY-MM-DD')
+
+        if symbol:
+            instruments = list(Instrument.objects.filter(symbol=symbol))
+            if not instruments:
+                raise CommandError(f'标的 {symbol} 不存在')
+        else:
+            instruments = Instrument.objects.filter(is_active=True)
+            if sync_type != 'all':
+                instruments = instruments.filter(market_type='STOCK' if sync_type == 'stock' else 'FUTURES')
+            instruments = list(instruments)
+
+        end_date = datetime.now().strftime('%Y-%m-%d')
+        self.stdout.write(f'回补 {len(instruments)} 个标的 {start_date} ~ {end_date} 的历史数据...')
+
+        fail_count = 0
+        for instrument, stats, error in service.backfill_batch(instruments, start_date, end_date, workers=workers):
+            if error is not None:
+                fail_count += 1
+                self.stdout.write(self.style.ERROR(f'  {instrument.symbol} 失败: {error}'))
+            else:
+                self.stdout.write(
+                    f"  {instrument.symbol} 新增 {stats['inserted']} 条，更新 {stats['updated']} 条，未变 {stats['unchanged']} 条"
+                )
+
+        message = f'回补完成，成功 {len(instruments) - fail_count} 个，失败 {fail_count} 个'
+        if fail_count:
+            self.stdout.write(self.style.WARNING(f'{message}（重新执行将从检查点继续）'))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+        if service.pipeline_stats:
+            self.stdout.write(f'导入管道：{service.pipeline_stats}')
+
+    def _sync_all(self, service, sync_type, days, period, workers):
+        """经导入管道并发同步 --type 对应的全部活跃标的"""
+        from apps.market_data.models import Instrument
+        instruments = Instrument.objects.filter(is_active=True)
+        if sync_type != 'all':
+            instruments = instruments.filter(market_type='STOCK' if sync_type == 'stock' else 'FUTURES')
+        instruments = list(instruments)
+        self.stdout.write(f'同步 {len(instruments)} 个标的的 {period} 数据...')
+
+        totals = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        fail_count = 0
+        for instrument, stats, error in service.update_latest_data_batch(instruments, days, workers, period):
+            if error is not None:
+                fail_count += 1
+                self.stdout.write(self.style.ERROR(f'  {instrument.symbol} 失败: {error}'))
+                continue
+            for key in totals:
+                totals[key] += stats[key]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"同步完成，新增 {totals['inserted']} 条，更新 {totals['updated']} 条，未变 {totals['unchanged']} 条，"
+            f"失败 {fail_count} 个标的"
+        ))
+        if service.pipeline_stats:
+            self.stdout.write(f'导入管道：{service.pipeline_stats}')
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_data', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(default='1d', max_length=5)),
+                ('start_date', models.DateField(help_text='回补区间开始日期')),
+                ('end_date', models.DateField(help_text='回补区间结束日期')),
+                ('completed_through', models.DateField(blank=True, help_text='已完成回补的最后日期', null=True)),
+                ('status', models.CharField(choices=[('RUNNING', '进行中'), ('DONE', '已完成'), ('FAILED', '失败')], db_index=True, default='RUNNING', max_length=10)),
+                ('error', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('instrument', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='backfill_checkpoints', to='market_data.instrument')),
+            ],
+            options={
+                'db_table': 'market_backfill_checkpoint',
+                'unique_together': {('instrument', 'period')},
+            },
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:05
+
+from django.db import migrations
+
+# 与 KLine.INTRADAY_PERIODS、partitions.py 一致（迁移中不能引用应用代码）
+DAILY_PERIODS = ['1d', '1w', '1M']
+INTRADAY_PERIODS = ['1m', '5m', '15m', '30m', '1h']
+
+
+def _values(periods):
+    return ', '.join(f"'{period}'" for period in periods)
+
+
+def _next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def partition_kline_table(apps, schema_editor):
+    """
+    PostgreSQL 上把 market_kline 改为声明式分区表：
+    按 period 列表分区（market_kline_daily / market_kline_intraday），分钟周期再按 trade_date 按月范围分区。
+    分区表的主键和唯一约束必须包含分区键，主键改为 (id, period, trade_date)，id 仍由序列生成、全表唯一。
+    其他数据库不分区。
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        # 原表的唯一约束、外键和普通索引（主键除外），建好分区表后按原名重建
+        cursor.execute("""
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = 'market_kline'::regclass AND contype IN ('u', 'f')
+        """)
+        constraints = cursor.fetchall()
+        cursor.execute("""
+            SELECT pg_get_indexdef(indexrelid) FROM pg_index
+            WHERE indrelid = 'market_kline'::regclass
+              AND indexrelid NOT IN (SELECT conindid FROM pg_constraint WHERE conrelid = 'market_kline'::regclass)
+        """)
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(f"""
+            SELECT DISTINCT date_trunc('month', trade_date)::date FROM market_kline
+            WHERE period IN ({_values(INTRADAY_PERIODS)})
+        """)
+        months = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute("ALTER TABLE market_kline RENAME TO market_kline_unpartitioned")
+        cursor.execute("""
+            CREATE TABLE market_kline (LIKE market_kline_unpartitioned INCLUDING DEFAULTS)
+            PARTITION BY LIST (period)
+        """)
+        cursor.execute("CREATE SEQUENCE market_kline_pk_seq AS bigint OWNED BY market_kline.id")
+        cursor.execute("ALTER TABLE market_kline ALTER COLUMN id SET DEFAULT nextval('market_kline_pk_seq')")
+
+        cursor.execute(f"""
+            CREATE TABLE market_kline_daily PARTITION OF market_kline
+            FOR VALUES IN ({_values(DAILY_PERIODS)})
+        """)
+        cursor.execute(f"""
+            CREATE TABLE market_kline_intraday PARTITION OF market_kline
+            FOR VALUES IN ({_values(INTRADAY_PERIODS)}) PARTITION BY RANGE (trade_date)
+        """)
+        for month in months:
+            cursor.execute(f"""
+                CREATE TABLE market_kline_intraday_y{month.year}m{month.month:02d} PARTITION OF market_kline_intraday
+                FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')
+            """)
+
+        cursor.execute("INSERT INTO market_kline SELECT * FROM market_kline_unpartitioned")
+        cursor.execute("SELECT setval('market_kline_pk_seq', COALESCE((SELECT MAX(id) FROM market_kline), 0) + 1, false)")
+        cursor.execute("DROP TABLE market_kline_unpartitioned CASCADE")
+
+        cursor.execute("ALTER TABLE market_kline ADD CONSTRAINT market_kline_pkey PRIMARY KEY (id, period, trade_date)")
+        for name, definition in constraints:
+            cursor.execute(f'ALTER TABLE market_kline ADD CONSTRAINT "{name}" {definition}')
+        for definition in indexes:
+            cursor.execute(definition)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_data', '0002_backfill_checkpoint'),
+        # 引用 market_kline 的外键需先去掉数据库约束
+        ('technical_analysis', '0004_kline_db_constraint'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='kline',
+            options={},
+        ),
+        # 分区表对 ORM 透明，回滚时保留分区结构
+        migrations.RunPython(partition_kline_table, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_data', '0003_kline_partitioning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KLineCoverage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('1m', '1分钟'), ('5m', '5分钟'), ('15m', '15分钟'), ('30m', '30分钟'), ('1h', '1小时'), ('1d', '日线'), ('1w', '周线'), ('1M', '月线')], max_length=5)),
+                ('first_date', models.DateField(blank=True, help_text='第一根K线的日期', null=True)),
+                ('last_date', models.DateField(blank=True, help_text='最后一根K线的日期', null=True)),
+                ('expected_sessions', models.IntegerField(default=0, help_text='首尾K线之间的交易日数')),
+                ('actual_sessions', models.IntegerField(default=0, help_text='有K线的交易日数')),
+                ('gaps', models.JSONField(blank=True, default=list, help_text='缺失K线的交易日区间')),
+                ('zero_volume', models.JSONField(blank=True, default=list, help_text='成交量为 0 的交易日区间')),
+                ('duplicate_dates', models.JSONField(blank=True, default=list, help_text='有重复K线的日期')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('instrument', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kline_coverages', to='market_data.instrument')),
+            ],
+            options={
+                'db_table': 'market_kline_coverage',
+                'unique_together': {('instrument', 'period')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_data', '0004_kline_coverage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='klinecoverage',
+            name='verified_empty',
+            field=models.JSONField(blank=True, default=list, help_text='修补时数据源确认没有K线的交易日区间'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from datetime import date
 from decimal import Decimal
 
 
@@ -37,6 +38,10 @@ class Instrument(models.Model):
 
 
 class KLine(models.Model):
+    """
+    K线，分钟K线的 trade_time 为K线结束时间，日线及以上为空
+    在 PostgreSQL 上 market_kline 按周期分区，分钟周期再按月分区（见 partitions.py），对 ORM 透明
+    """
     PERIODS = [
         ('1m', '1分钟'),
         ('5m', '5分钟'),
@@ -47,6 +52,7 @@ class KLine(models.Model):
         ('1w', '周线'),
         ('1M', '月线'),
     ]
+    INTRADAY_PERIODS = ['1m', '5m', '15m', '30m', '1h']
 
     instrument = models.ForeignKey(Instrument, on_delete=models.CASCADE, related_name='klines')
     period = models.CharField(max_length=5, choices=PERIODS, db_index=True)
@@ -63,7 +69,7 @@ class KLine(models.Model):
 
     class Meta:
         db_table = 'market_kline'
-        ordering = ['-trade_date', '-trade_time']
+        # 不设默认排序：分钟K线数据量很大，默认排序会让每个查询都带上全表排序，需要排序的查询显式 order_by
         unique_together = [['instrument', 'period', 'trade_date', 'trade_time']]
         indexes = [
             models.Index(fields=['instrument', 'period', 'trade_date']),
@@ -71,3 +77,73 @@ class KLine(models.Model):
 
     def __str__(self):
         return f"{self.instrument.symbol} {self.period} {self.trade_date}"
+
+
+class BackfillCheckpoint(models.Model):
+    """历史数据回补进度：每个标的、周期一条，重试或重启时从上次完成的日期之后继续"""
+    STATUSES = [
+        ('RUNNING', '进行中'),
+        ('DONE', '已完成'),
+        ('FAILED', '失败'),
+    ]
+
+    instrument = models.ForeignKey(Instrument, on_delete=models.CASCADE, related_name='backfill_checkpoints')
+    period = models.CharField(max_length=5, default='1d')
+    start_date = models.DateField(help_text='回补区间开始日期')
+    end_date = models.DateField(help_text='回补区间结束日期')
+    completed_through = models.DateField(null=True, blank=True, help_text='已完成回补的最后日期')
+    status = models.CharField(max_length=10, choices=STATUSES, default='RUNNING', db_index=True)
+    error = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'market_backfill_checkpoint'
+        unique_together = [['instrument', 'period']]
+
+    def __str__(self):
+        return f"{self.instrument.symbol} {self.period} {self.start_date} ~ {self.end_date} ({self.status})"
+
+
+class KLineCoverage(models.Model):
+    """
+    K线覆盖情况：每个标的、周期一条，记录首尾K线、应有/实有交易日数和缺口，由 coverage.py 维护
+    缺口和零成交量区间为 [开始日期, 结束日期, 交易日数] 列表（日期为 YYYY-MM-DD），只统计首尾K线之间
+    verified_empty 为修补后仍然缺失（数据源没有数据，如停牌）的 [开始日期, 结束日期] 列表，以后的修补跳过这些区间
+    """
+    instrument = models.ForeignKey(Instrument, on_delete=models.CASCADE, related_name='kline_coverages')
+    period = models.CharField(max_length=5, choices=KLine.PERIODS)
+    first_date = models.DateField(null=True, blank=True, help_text='第一根K线的日期')
+    last_date = models.DateField(null=True, blank=True, help_text='最后一根K线的日期')
+    expected_sessions = models.IntegerField(default=0, help_text='首尾K线之间的交易日数')
+    actual_sessions = models.IntegerField(default=0, help_text='有K线的交易日数')
+    gaps = models.JSONField(default=list, blank=True, help_text='缺失K线的交易日区间')
+    zero_volume = models.JSONField(default=list, blank=True, help_text='成交量为 0 的交易日区间')
+    duplicate_dates = models.JSONField(default=list, blank=True, help_text='有重复K线的日期')
+    verified_empty = models.JSONField(default=list, blank=True, help_text='修补时数据源确认没有K线的交易日区间')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'market_kline_coverage'
+        unique_together = [['instrument', 'period']]
+
+    def __str__(self):
+        return f"{self.instrument.symbol} {self.period} {self.actual_sessions}/{self.expected_sessions}"
+
+    @property
+    def missing_sessions(self):
+        return self.expected_sessions - self.actual_sessions
+
+    def repair_ranges(self, zero_volume=False, force=False):
+        """
+        需要重新获取的日期区间：缺口，zero_volume 为 True 时另加零成交量区间，返回 [(date, date), ...]
+        :param force: 包括已确认数据源没有数据的区间（verified_empty）
+        """
+        ranges = self.gaps + (self.zero_volume if zero_volume else [])
+        if not force:
+            ranges = [
+                [start, end, count] for start, end, count in ranges
+                if not any(low <= start and end <= high for low, high in self.verified_empty)
+            ]
+        return sorted(
+            (date.fromisoformat(start), date.fromisoformat(end)) for start, end, _ in ranges
+        )
@@ -0,0 +1,167 @@
+"""
+K线表分区（PostgreSQL）
+
+market_kline 在 PostgreSQL 上是声明式分区表（迁移 0003_kline_partitioning）：
+- 按 period 列表分区：日线/周线/月线在 market_kline_daily，分钟周期在 market_kline_intraday
+- market_kline_intraday 再按 trade_date 按月范围分区，如 market_kline_intraday_y2024m03
+
+按日期区间的查询只扫描涉及的月分区；写入分钟K线前自动创建所需的月分区（ensure_kline_partitions），
+过期的分钟K线按整月删除分区（drop_kline_partitions），不产生大量 DELETE。
+其他数据库（如开发环境的 SQLite）不分区，这里的函数不做任何操作。
+"""
+import logging
+import re
+import threading
+from datetime import date, datetime
+from django.db import DatabaseError, connections, transaction
+from .models import KLine, KLineCoverage
+
+logger = logging.getLogger(__name__)
+
+INTRADAY_TABLE = 'market_kline_intraday'
+_PARTITION_NAME = re.compile(rf'^{INTRADAY_TABLE}_y(\d{{4}})m(\d{{2}})$')
+
+# 一次最多创建的月分区跨度（50 年），超过说明日期区间有误（如 date.min 之类的占位日期）
+MAX_PARTITION_MONTHS = 600
+
+_partitioned = {}  # 数据库别名 -> 是否为分区表
+_known_months = {}  # 数据库别名 -> 已存在的月分区
+_lock = threading.Lock()
+
+
+def _as_month(value):
+    if isinstance(value, datetime):
+        value = value.date()
+    elif not isinstance(value, date):
+        value = datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    return value.replace(day=1)
+
+
+def _next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def _months(start_date, end_date):
+    month, last = _as_month(start_date), _as_month(end_date)
+    while month <= last:
+        yield month
+        month = _next_month(month)
+
+
+def partition_name(month):
+    """月分区的表名"""
+    month = _as_month(month)
+    return f'{INTRADAY_TABLE}_y{month.year}m{month.month:02d}'
+
+
+def is_partitioned(using='default'):
+    """market_kline 的分钟K线是否按月分区（只有迁移后的 PostgreSQL 数据库）"""
+    if using not in _partitioned:
+        connection = connections[using]
+        if connection.vendor != 'postgresql':
+            _partitioned[using] = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+                    [INTRADAY_TABLE]
+                )
+                _partitioned[using] = cursor.fetchone()[0]
+    return _partitioned[using]
+
+
+def existing_partitions(using='default'):
+    """已存在的月分区，返回各分区月份第一天的有序列表"""
+    if not is_partitioned(using):
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [INTRADAY_TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    matches = [_PARTITION_NAME.match(name) for name in names]
+    return sorted(date(int(match[1]), int(match[2]), 1) for match in matches if match)
+
+
+def ensure_kline_partitions(start_date, end_date, using='default'):
+    """
+    创建 [start_date, end_date] 涉及的分钟K线月分区（已存在的跳过）
+    已知存在的月份缓存在进程内，重复调用不访问数据库
+    :return: 新建的分区表名列表
+    :raises ValueError: 区间跨度超过 MAX_PARTITION_MONTHS 个月，或年份不是四位数（分区名无法识别）
+    """
+    if not is_partitioned(using):
+        return []
+
+    first, last = _as_month(start_date), _as_month(end_date)
+    span = (last.year - first.year) * 12 + last.month - first.month + 1
+    if first.year < 1000 or span > MAX_PARTITION_MONTHS:
+        raise ValueError(f"K线分区区间异常: {first} ~ {last}（{span} 个月）")
+
+    months = list(_months(first, last))
+    with _lock:
+        known = _known_months.setdefault(using, set())
+        if known.issuperset(months):
+            return []
+        known.update(existing_partitions(using))
+        missing = [month for month in months if month not in known]
+
+        created = []
+        connection = connections[using]
+        for month in missing:
+            name = partition_name(month)
+            try:
+                # 放在保存点中：其他进程同时创建同一分区时，失败不影响外层事务
+                with transaction.atomic(using=using), connection.cursor() as cursor:
+                    cursor.execute(
+                        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {INTRADAY_TABLE} "
+                        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+                    )
+                created.append(name)
+                logger.info(f"创建K线分区 {name}")
+            except DatabaseError as e:
+                if month not in existing_partitions(using):
+                    raise
+                logger.info(f"K线分区 {name} 已由其他进程创建: {e}")
+            known.add(month)
+        return created
+
+
+def drop_kline_partitions(before, using='default'):
+    """
+    删除整月都早于 before 的分钟K线分区，连同这些K线的技术指标
+    :return: 删除的分区表名列表
+    """
+    if not is_partitioned(using):
+        return []
+
+    before = before if isinstance(before, date) else datetime.strptime(str(before), '%Y-%m-%d').date()
+    months = [month for month in existing_partitions(using) if _next_month(month) <= before]
+    if not months:
+        return []
+
+    from apps.technical_analysis.models import Indicator, IndicatorValue
+    cutoff = _next_month(months[-1])
+    dropped = []
+    with _lock, transaction.atomic(using=using):
+        # 指标表对K线没有数据库外键，删除分区前先删除对应的指标
+        IndicatorValue.objects.using(using).filter(
+            period__in=KLine.INTRADAY_PERIODS, trade_date__lt=cutoff
+        ).delete()
+        Indicator.objects.using(using).filter(
+            kline__period__in=KLine.INTRADAY_PERIODS, kline__trade_date__lt=cutoff
+        ).delete()
+        with connections[using].cursor() as cursor:
+            for month in months:
+                name = partition_name(month)
+                cursor.execute(f"DROP TABLE {name}")
+                dropped.append(name)
+                logger.info(f"删除K线分区 {name}")
+        # 首根K线在删除的分区中的覆盖记录已失效，删除后由下次写入全量重建
+        KLineCoverage.objects.using(using).filter(
+            period__in=KLine.INTRADAY_PERIODS, first_date__lt=cutoff
+        ).delete()
+        _known_months.get(using, set()).difference_update(months)
+    return dropped
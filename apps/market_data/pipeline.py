@@ -0,0 +1,353 @@
+"""
+流式导入管道
+
+获取（多个线程） → 标准化（1 个线程） → 写入（调用线程）三个阶段由有界队列连接：
+- 获取线程并发请求数据源（速率由共享限流器控制）；下游队列已满时阻塞，写入跟不上时自然降低请求速度（背压）
+- 标准化线程把数据源返回的 DataFrame 转换为 KLine 对象
+- 写入阶段在调用线程中执行（Django 的数据库连接按线程隔离），把多个标的的K线合并为一个事务批量 upsert
+
+网络请求与数据库写入重叠进行。各阶段处理的条数、行数、耗时和背压等待时间记录在 PipelineStats 中。
+"""
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import transaction
+from .data_fetcher import to_kline_frame
+
+logger = logging.getLogger(__name__)
+
+_END = object()  # 获取阶段全部结束的标记
+
+
+def _as_text(day):
+    return day if isinstance(day, str) else day.strftime('%Y-%m-%d')
+
+
+class IngestJob:
+    """单个标的的导入任务：按顺序获取并写入若干日期区间"""
+
+    def __init__(self, instrument, ranges, period='1d', on_chunk=None, on_finish=None, context=None):
+        """
+        :param instrument: Instrument
+        :param ranges: [(start_date, end_date), ...]，按日期顺序，某个区间失败时后面的区间不再写入
+        :param period: K线周期
+        :param on_chunk: on_chunk(job, start_date, end_date)，在写入该区间的同一事务中调用（如推进回补检查点）
+        :param on_finish: on_finish(job)，任务的所有区间写入或失败后调用
+        :param context: 调用方附带的数据（如回补检查点）
+        """
+        self.instrument = instrument
+        self.ranges = list(ranges)
+        self.period = period
+        self.on_chunk = on_chunk
+        self.on_finish = on_finish
+        self.context = context
+        self.stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+        self.rows = 0  # 数据源返回的行数
+        self.error = None
+        self._pending = 0  # 已进入写入批次、尚未提交的区间数
+        self._ended = False
+
+
+class StageStats:
+    """单个阶段的计数器（线程安全）"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.rows = 0
+        self.errors = 0
+        self.busy = 0.  # 处理耗时（秒，多个线程累加）
+        self.blocked = 0.  # 下游队列已满时的等待时间（秒）
+        self._lock = threading.Lock()
+
+    def record(self, items=0, rows=0, busy=0., blocked=0., errors=0):
+        with self._lock:
+            self.items += items
+            self.rows += rows
+            self.busy += busy
+            self.blocked += blocked
+            self.errors += errors
+
+    def as_dict(self, elapsed):
+        return {
+            'items': self.items,
+            'rows': self.rows,
+            'errors': self.errors,
+            'busy_seconds': round(self.busy, 3),
+            'blocked_seconds': round(self.blocked, 3),
+            'rows_per_second': round(self.rows / elapsed, 1) if elapsed else 0.,
+        }
+
+
+class PipelineStats:
+    """管道各阶段的计数器"""
+
+    def __init__(self):
+        self.fetch = StageStats('fetch')
+        self.normalize = StageStats('normalize')
+        self.write = StageStats('write')
+        self.batches = 0  # 写入的事务数
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def as_dict(self):
+        elapsed = self.elapsed
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'batches': self.batches,
+            **{stage.name: stage.as_dict(elapsed) for stage in (self.fetch, self.normalize, self.write)},
+        }
+
+    def __str__(self):
+        elapsed = self.elapsed or 1e-9
+        return (
+            f"耗时 {self.elapsed:.1f} 秒；获取 {self.fetch.items} 个区间 {self.fetch.rows} 行"
+            f"（失败 {self.fetch.errors}，等待下游 {self.fetch.blocked:.1f} 秒）；"
+            f"标准化 {self.normalize.rows} 行；写入 {self.write.rows} 行 / {self.batches} 个事务"
+            f"（{self.write.rows / elapsed:.0f} 行/秒，写入耗时 {self.write.busy:.1f} 秒）"
+        )
+
+
+class IngestPipeline:
+    """流式导入管道"""
+
+    def __init__(self, service, workers=None, queue_size=None, batch_rows=None, flush_interval=0.2):
+        """
+        :param service: MarketDataService，提供 fetch_kline_data / build_klines / save_kline_batch
+        :param workers: 获取线程数，默认 MARKET_DATA_FETCH_WORKERS
+        :param queue_size: 阶段之间的队列长度（区间数），默认 MARKET_DATA_PIPELINE_QUEUE_SIZE
+        :param batch_rows: 每个写入事务合并的最大行数，默认 MARKET_DATA_WRITE_BATCH_ROWS
+        :param flush_interval: 没有新数据时等待多久（秒）就提交已合并的批次
+        """
+        self.service = service
+        self.workers = workers or getattr(settings, 'MARKET_DATA_FETCH_WORKERS', 8)
+        self.queue_size = queue_size or getattr(settings, 'MARKET_DATA_PIPELINE_QUEUE_SIZE', 64)
+        self.batch_rows = batch_rows or getattr(settings, 'MARKET_DATA_WRITE_BATCH_ROWS', 20000)
+        self.flush_interval = flush_interval
+        self.stats = PipelineStats()
+
+    def run(self, jobs):
+        """
+        执行全部导入任务（阻塞到完成）
+        :param jobs: IngestJob 列表
+        :return: 按完成顺序排列的 IngestJob 列表，结果在 job.stats / job.error 中
+        """
+        self.stats = PipelineStats()
+        jobs = list(jobs)
+        pending_jobs = queue.Queue()
+        for job in jobs:
+            pending_jobs.put(job)
+        fetched = queue.Queue(maxsize=self.queue_size)
+        normalized = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        fetcher_count = max(1, min(self.workers, len(jobs)))
+        remaining = [fetcher_count]
+        remaining_lock = threading.Lock()
+        threads = [
+            threading.Thread(
+                target=self._fetch_worker, args=(pending_jobs, fetched, stop, remaining, remaining_lock),
+                name=f'ingest-fetch-{i}', daemon=True
+            )
+            for i in range(fetcher_count)
+        ]
+        threads.append(threading.Thread(
+            target=self._normalize_worker, args=(fetched, normalized, stop), name='ingest-normalize', daemon=True
+        ))
+        for thread in threads:
+            thread.start()
+
+        try:
+            finished = self._write(normalized)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            self.stats.finished = time.monotonic()
+        return finished
+
+    def _put(self, target, item, stage, stop):
+        """放入下游队列，队列已满时阻塞（背压），记录等待时间"""
+        started = time.monotonic()
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stage.record(blocked=time.monotonic() - started)
+
+    @staticmethod
+    def _get(source, stop):
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fetch_worker(self, pending_jobs, fetched, stop, remaining, remaining_lock):
+        """获取线程：按顺序获取每个任务的各个区间，出错时停止该任务"""
+        stage = self.stats.fetch
+        try:
+            while not stop.is_set():
+                try:
+                    job = pending_jobs.get_nowait()
+                except queue.Empty:
+                    break
+                for start_date, end_date in job.ranges:
+                    started = time.monotonic()
+                    try:
+                        data = self.service.fetch_kline_data(
+                            job.instrument, _as_text(start_date), _as_text(end_date),
+                            raise_errors=True, period=job.period
+                        )
+                    except Exception as e:
+                        stage.record(items=1, busy=time.monotonic() - started, errors=1)
+                        logger.error(f"获取 {job.instrument.symbol} {start_date} ~ {end_date} 数据失败: {e}")
+                        self._put(fetched, (job, None, None, e), stage, stop)
+                        break
+                    job.rows += len(data)
+                    stage.record(items=1, rows=len(data), busy=time.monotonic() - started)
+                    self._put(fetched, (job, start_date, end_date, data), stage, stop)
+                # 任务结束标记
+                self._put(fetched, (job, None, None, None), stage, stop)
+        finally:
+            with remaining_lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._put(fetched, _END, stage, stop)
+
+    def _normalize_worker(self, fetched, normalized, stop):
+        """标准化线程：DataFrame -> KLine 对象"""
+        stage = self.stats.normalize
+        while True:
+            item = self._get(fetched, stop)
+            if item is _END:
+                self._put(normalized, _END, stage, stop)
+                return
+            job, start_date, end_date, payload = item
+            if start_date is not None:
+                started = time.monotonic()
+                try:
+                    payload = self.service.build_klines(job.instrument, job.period, to_kline_frame(payload))
+                    stage.record(items=1, rows=len(payload), busy=time.monotonic() - started)
+                except Exception as e:
+                    stage.record(items=1, busy=time.monotonic() - started, errors=1)
+                    logger.error(f"标准化 {job.instrument.symbol} {start_date} ~ {end_date} 数据失败: {e}")
+                    item = (job, None, None, e)
+                else:
+                    item = (job, start_date, end_date, payload)
+            self._put(normalized, item, stage, stop)
+
+    def _write(self, normalized):
+        """
+        写入阶段（调用线程）：合并多个标的的区间，达到 batch_rows 行或暂时没有新数据时提交一个事务
+        任务的全部区间提交后才算完成
+        """
+        batch = []
+        batch_rows = 0
+        finished = []
+        done = False
+        while not done:
+            try:
+                item = normalized.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            if item is _END:
+                done = True
+            elif item is not None:
+                job, start_date, end_date, payload = item
+                if start_date is not None:
+                    # 前面的区间失败后，后面的区间不再写入（保持检查点连续）
+                    if job.error is None:
+                        batch.append(item)
+                        batch_rows += len(payload)
+                        job._pending += 1
+                elif payload is not None:
+                    job.error = job.error or payload
+                else:
+                    job._ended = True
+                    if not job._pending:
+                        self._finish(job, finished)
+
+            if batch and (item is None or done or batch_rows >= self.batch_rows):
+                self._flush(batch, finished)
+                batch = []
+                batch_rows = 0
+        return finished
+
+    def _finish(self, job, finished):
+        if job.on_finish:
+            job.on_finish(job)
+        finished.append(job)
+
+    def _flush(self, batch, finished):
+        """提交一个写入批次；合并写入失败时逐个区间重试，只有出错的任务失败"""
+        stage = self.stats.write
+        started = time.monotonic()
+        rows = sum(len(klines) for _, _, _, klines in batch)
+        try:
+            with transaction.atomic():
+                results = self._save(batch)
+            committed = [(item, stats, None) for item, stats in zip(batch, results)]
+            self.stats.batches += 1
+        except Exception as e:
+            if len(batch) == 1:
+                committed = [(batch[0], None, e)]
+            else:
+                logger.warning(f"合并写入 {len(batch)} 个区间失败，逐个重试: {e}")
+                committed = []
+                for item in batch:
+                    job = item[0]
+                    if job.error is not None:
+                        committed.append((item, None, None))
+                        continue
+                    try:
+                        with transaction.atomic():
+                            stats = self._save([item])[0]
+                        committed.append((item, stats, None))
+                        self.stats.batches += 1
+                    except Exception as item_error:
+                        committed.append((item, None, item_error))
+                        # 同一任务后面的区间不再写入
+                        job.error = item_error
+
+        errors = 0
+        for (job, start_date, end_date, _), stats, error in committed:
+            if error is not None:
+                errors += 1
+                logger.error(f"写入 {job.instrument.symbol} {start_date} ~ {end_date} 数据失败: {error}")
+                job.error = job.error or error
+            elif stats is not None:
+                for key in job.stats:
+                    job.stats[key] += stats[key]
+            job._pending -= 1
+            if job._ended and not job._pending:
+                self._finish(job, finished)
+        stage.record(items=len(batch), rows=rows, busy=time.monotonic() - started, errors=errors)
+
+    def _save(self, batch):
+        """按周期分组写入，并在同一事务中调用各区间的 on_chunk"""
+        results = [None] * len(batch)
+        periods = {}
+        for index, (job, _, _, _) in enumerate(batch):
+            periods.setdefault(job.period, []).append(index)
+        for period, indexes in periods.items():
+            saved = self.service.save_kline_batch(
+                [(batch[i][0].instrument, batch[i][3], batch[i][1], batch[i][2]) for i in indexes], period
+            )
+            for index, stats in zip(indexes, saved):
+                results[index] = stats
+        for job, start_date, end_date, _ in batch:
+            if job.on_chunk:
+                job.on_chunk(job, start_date, end_date)
+        return results
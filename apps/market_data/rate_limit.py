@@ -0,0 +1,65 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限流器
+    令牌以 rate 个/秒的速度补充，最多积累 capacity 个；每次请求消耗一个令牌，没有令牌时阻塞等待。
+
+    上游限流时调用 throttle() 把速率减半（不低于 min_rate），
+    之后每次成功调用 recover() 逐步恢复到配置的速率（加性增、乘性减）。
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=None, clock=time.monotonic, sleep=time.sleep):
+        """
+        :param rate: 每秒允许的请求数
+        :param capacity: 令牌桶容量（允许的突发请求数），默认与 rate 相同且至少为 1
+        :param min_rate: 限流退避时的最低速率，默认为 rate 的 1/16
+        :param clock: 时钟函数（便于测试替换）
+        :param sleep: 等待函数（便于测试替换）
+        """
+        if rate <= 0:
+            raise ValueError('rate 必须大于 0')
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = float(min_rate) if min_rate else self.max_rate / 16
+        self.capacity = float(capacity) if capacity else max(1., self.max_rate)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """获取一个令牌，必要时阻塞等待；返回等待的秒数"""
+        waited = 0.
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+    def throttle(self):
+        """上游限流：速率减半，并清空已积累的令牌"""
+        with self._lock:
+            self._refill(self._clock())
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.)
+
+    def recover(self):
+        """请求成功：速率按配置值的 1/10 逐步恢复"""
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._refill(self._clock())
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
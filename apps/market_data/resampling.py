@@ -0,0 +1,178 @@
+"""
+K线周期合成
+
+由基础周期的K线在本地合成更大的周期，不再单独向数据源请求：
+- 周线、月线由日线合成，K线日期为该周/月在交易日历中的最后一个交易日（节假日提前收盘的周也能正确标记）
+- 5m/15m/30m/1h 由 1m 合成，按交易时段的开盘时间对齐，K线时间为区间结束时间（与分钟线的标记方式一致），
+  期货夜盘跨过零点的K线接在前一天的夜盘之后对齐
+
+开盘价取第一根，收盘价和持仓量取最后一根，最高/最低取极值，成交量和成交额求和，全部为向量化的 groupby 聚合。
+"""
+from datetime import time
+import numpy as np
+import pandas as pd
+from .data_fetcher import FLOAT_COLUMNS, INTEGER_COLUMNS, KLINE_COLUMNS
+
+# 合成周期 -> (基础周期, 分钟数或日历单位)
+DERIVED_PERIODS = {
+    '5m': ('1m', 5),
+    '15m': ('1m', 15),
+    '30m': ('1m', 30),
+    '1h': ('1m', 60),
+    '1w': ('1d', 'W'),
+    '1M': ('1d', 'M'),
+}
+
+# 各交易时段的 (开盘时间, 收盘时间)：分钟K线按所在时段的开盘时间对齐，区间结束时间不晚于收盘时间
+# 收盘时间早于开盘时间的时段跨过零点（期货夜盘按最晚收盘的品种取 02:30），
+# 不晚于其收盘时间的分钟K线（日期为自然日）属于前一天开始的夜盘
+SESSIONS = {
+    'STOCK': [(time(9, 30), time(11, 30)), (time(13, 0), time(15, 0))],
+    'FUTURES': [(time(9, 0), time(11, 30)), (time(13, 30), time(15, 0)), (time(21, 0), time(2, 30))],
+}
+
+AGGREGATIONS = {
+    'open_price': 'first',
+    'high_price': 'max',
+    'low_price': 'min',
+    'close_price': 'last',
+    'volume': 'sum',
+    'amount': 'sum',
+    'open_interest': 'last',
+}
+
+
+def base_period(period):
+    """合成周期的基础周期"""
+    if period not in DERIVED_PERIODS:
+        raise ValueError(f"不支持合成的周期: {period}，可选 {', '.join(DERIVED_PERIODS)}")
+    return DERIVED_PERIODS[period][0]
+
+
+def bucket_start(period, trade_date):
+    """
+    trade_date 所在合成K线的第一天，增量合成时从这一天开始重新聚合
+    分钟周期按天重新聚合，返回 trade_date 本身
+    """
+    unit = DERIVED_PERIODS[period][1]
+    if unit == 'W':
+        return trade_date - pd.Timedelta(days=trade_date.weekday())
+    if unit == 'M':
+        return trade_date.replace(day=1)
+    return trade_date
+
+
+def base_start(period, start_date):
+    """
+    重新聚合 start_date 起的合成K线需要读取的第一天基础K线
+    分钟周期多读取前一天：start_date 零点之后的夜盘K线与前一天 21:00 之后的K线属于同一时段
+    """
+    if DERIVED_PERIODS[period][0] == '1m':
+        return start_date - pd.Timedelta(days=1)
+    return start_date
+
+
+def _aggregate(frame, keys):
+    grouped = frame.groupby(keys, sort=True)
+    result = grouped.agg(AGGREGATIONS)
+    # 全部缺失时求和结果为缺失值而不是 0
+    for column in ('volume', 'amount'):
+        result[column] = grouped[column].sum(min_count=1)
+    return result.reset_index()
+
+
+def _with_types(result):
+    for column in FLOAT_COLUMNS:
+        result[column] = result[column].astype('float64')
+    for column in INTEGER_COLUMNS:
+        result[column] = result[column].astype('Int64')
+    return result
+
+
+def resample_daily(frame, period, calendar):
+    """
+    日线合成周线或月线
+    :param frame: 标准化的K线 DataFrame（见 data_fetcher.normalize_klines），按日期排序
+    :param period: '1w' 或 '1M'
+    :param calendar: 交易日历，用于确定每周/月的最后一个交易日
+    :return: 列为 KLINE_COLUMNS 的 DataFrame，trade_date 为每周/月的最后一个交易日
+    """
+    if frame.empty:
+        return frame[KLINE_COLUMNS].copy()
+
+    days = frame['trade_date'].to_numpy(dtype='datetime64[D]')
+    if DERIVED_PERIODS[period][1] == 'W':
+        # 1970-01-01 是周四，换算为周一为 0
+        weekday = (days.astype(np.int64) + 3) % 7
+        bucket_end = days + (6 - weekday).astype('timedelta64[D]')
+    else:
+        bucket_end = (days.astype('datetime64[M]') + 1).astype('datetime64[D]') - np.timedelta64(1, 'D')
+
+    labels = calendar.last_sessions(bucket_end)
+    # 数据晚于日历中该周/月最后一个交易日时（日历缺失），以实际日期为准
+    labels = np.maximum(labels, days)
+    grouped = frame.assign(bucket=bucket_end, label=labels)
+    result = _aggregate(grouped, 'bucket')
+    result['trade_date'] = pd.to_datetime(grouped.groupby('bucket', sort=True)['label'].max().to_numpy())
+    return _with_types(result[KLINE_COLUMNS])
+
+
+def resample_intraday(frame, period, market_type='STOCK'):
+    """
+    1 分钟线合成更大的分钟周期
+    夜盘跨过零点时（见 SESSIONS），零点之后的K线接在前一天的夜盘之后对齐，
+    跨过零点的区间按结束时间标记为次日（与分钟线的自然日标记一致）
+    :param frame: 标准化的K线 DataFrame，另有 trade_time 列（datetime.time，分钟线的结束时间），按日期、时间排序
+    :param period: '5m' / '15m' / '30m' / '1h'
+    :param market_type: 决定交易时段（见 SESSIONS）
+    :return: 列为 KLINE_COLUMNS + ['trade_time'] 的 DataFrame
+    """
+    columns = KLINE_COLUMNS + ['trade_time']
+    if frame.empty:
+        return frame.reindex(columns=columns)
+
+    minutes = DERIVED_PERIODS[period][1]
+    # 开盘、收盘时间换算为分钟数，跨过零点的收盘时间接续当天（如 02:30 记为 26:30）
+    anchors, closes, wrap_close = [], [], None
+    for open_time, close_time in SESSIONS[market_type]:
+        anchors.append(open_time.hour * 60 + open_time.minute)
+        closes.append(close_time.hour * 60 + close_time.minute)
+        if close_time < open_time:
+            wrap_close = closes[-1]
+            closes[-1] += 1440
+    anchors, closes = np.array(anchors), np.array(closes)
+
+    # 不同的时间只有几百个，每个只换算一次
+    codes, unique_times = pd.factorize(frame['trade_time'])
+    of_day = np.array([value.hour * 60 + value.minute for value in unique_times], dtype=np.int64)[codes]
+    sessions = frame['trade_date'].to_numpy(dtype='datetime64[D]')
+
+    if wrap_close is not None:
+        # 零点之后的夜盘K线归入前一天，分钟数接续前一天（如 00:30 记为 24:30）
+        wrapped = of_day <= wrap_close
+        of_day = of_day + wrapped * 1440
+        sessions = sessions - wrapped.astype(np.int64).astype('timedelta64[D]')
+
+    # 所在时段：不晚于该分钟的最后一个开盘时间，开盘那一分钟（集合竞价）归入第一个区间
+    index = np.searchsorted(anchors, of_day, 'right') - 1
+    anchor = np.where(index >= 0, anchors[np.maximum(index, 0)], 0)
+    steps = np.maximum(1, -(-(of_day - anchor) // minutes))
+    # 收盘前不足一个周期的区间以收盘时间结束，不产生休市时间的K线（如 1h 的 11:01-11:30 标记为 11:30）
+    bucket = np.minimum(anchor + steps * minutes, np.maximum(closes[np.maximum(index, 0)], of_day))
+
+    grouped = frame.assign(session=sessions, bucket=bucket)
+    result = _aggregate(grouped, ['session', 'bucket'])
+    buckets = result['bucket'].to_numpy(dtype=np.int64)
+    result['trade_date'] = pd.to_datetime(
+        result['session'].to_numpy(dtype='datetime64[D]') + (buckets // 1440).astype('timedelta64[D]')
+    )
+    codes, unique_buckets = pd.factorize(buckets % 1440)
+    result['trade_time'] = np.array([time(value // 60, value % 60) for value in unique_buckets], dtype=object)[codes]
+    return _with_types(result[columns])
+
+
+def resample(frame, period, calendar, market_type='STOCK'):
+    """按周期选择合成方法"""
+    if base_period(period) == '1d':
+        return resample_daily(frame, period, calendar)
+    return resample_intraday(frame, period, market_type)
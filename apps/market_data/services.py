@@ -1,17 +1,42 @@
+from django.conf import settings
 from django.db import transaction
-from datetime import datetime, timedelta
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from datetime import date, datetime, timedelta
 import logging
-from .models import Instrument, KLine
-from .data_fetcher import AkshareDataFetcher
+import pandas as pd
+from .models import BackfillCheckpoint, Instrument, KLine, KLineCoverage
+from . import resampling
+from .coverage import KLineCoverageService
+from .data_fetcher import FLOAT_COLUMNS, INTEGER_COLUMNS, to_kline_frame
+from .partitions import ensure_kline_partitions
+from .pipeline import IngestJob, IngestPipeline
+from .sources import get_data_source
+from .trading_calendar import get_trading_calendar
 
 logger = logging.getLogger(__name__)
 
+# upsert 时比较的K线数值字段
+KLINE_VALUE_FIELDS = [
+    KLine._meta.get_field(name)
+    for name in ['open_price', 'high_price', 'low_price', 'close_price', 'volume', 'amount', 'open_interest']
+]
+
+EMPTY_STATS = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+
 
 class MarketDataService:
     """市场数据服务"""
 
-    def __init__(self):
-        self.fetcher = AkshareDataFetcher()
+    def __init__(self, fetcher=None, calendar=None):
+        """
+        :param fetcher: 数据源（接口见 sources.DataSource），默认按 MARKET_DATA_SOURCE 配置创建
+        :param calendar: 交易日历，默认进程内共享的 trading_calendar.get_trading_calendar()
+        """
+        self.fetcher = fetcher or get_data_source()
+        self.calendar = calendar or get_trading_calendar()
+        self.coverage = KLineCoverageService(self.calendar)
+        self.pipeline_stats = None  # 最近一次批量导入的管道计数器（见 pipeline.PipelineStats）
 
     def import_instrument(self, symbol, market_type, **kwargs):
         """导入标的信息"""
@@ -33,42 +58,265 @@ class MarketDataService:
             logger.error(f"导入标的 {symbol} 失败: {e}")
             raise
 
+    @staticmethod
+    def _default_exchange(market_type, symbol):
+        """数据源未提供交易所时的默认值：6 开头的股票为上交所，其余股票为深交所"""
+        if market_type == 'STOCK':
+            return 'SSE' if symbol.startswith('6') else 'SZSE'
+        return 'CFFEX'
+
     @transaction.atomic
-    def import_kline_data(self, instrument_id, start_date, end_date, period='1d'):
-        """导入K线数据"""
-        try:
-            instrument = Instrument.objects.get(id=instrument_id)
+    def bulk_sync_instruments(self, market_type, items, deactivate_missing=False):
+        """
+        批量同步标的列表：一次读取已有标的，与数据源列表比较后批量插入和更新
+        :param market_type: 'STOCK' 或 'FUTURES'
+        :param items: [{'symbol': ..., 'name': ..., 'exchange': 可选}, ...]
+        :param deactivate_missing: 是否把该市场中数据源已不存在的标的标记为不活跃
+        :return: {'created': 新增数, 'updated': 更新数, 'unchanged': 未变数, 'deactivated': 停用数}
+        """
+        stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'deactivated': 0}
+        existing = {
+            instrument.symbol: instrument
+            for instrument in Instrument.objects.only('id', 'symbol', 'name', 'market_type', 'exchange', 'is_active')
+        }
 
-            # 获取数据
-            if instrument.market_type == 'STOCK':
-                data = self.fetcher.fetch_stock_daily(instrument.symbol, start_date, end_date)
+        now = timezone.now()
+        to_create = {}
+        to_update = []
+        for item in items:
+            symbol = str(item['symbol'])
+            values = {
+                'name': item.get('name') or symbol,
+                'market_type': market_type,
+                'exchange': item.get('exchange') or self._default_exchange(market_type, symbol),
+                'is_active': True,
+            }
+            instrument = existing.get(symbol)
+            if instrument is None:
+                to_create[symbol] = Instrument(symbol=symbol, **values)
+            elif any(getattr(instrument, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(instrument, field, value)
+                # bulk_update 不会自动刷新 auto_now 字段
+                instrument.updated_at = now
+                to_update.append(instrument)
             else:
-                data = self.fetcher.fetch_futures_daily(instrument.symbol, start_date, end_date)
+                stats['unchanged'] += 1
+
+        Instrument.objects.bulk_create(to_create.values(), batch_size=1000)
+        Instrument.objects.bulk_update(
+            to_update, ['name', 'market_type', 'exchange', 'is_active', 'updated_at'], batch_size=1000
+        )
+        stats['created'] = len(to_create)
+        stats['updated'] = len(to_update)
+
+        # 数据源返回空列表通常是获取失败，此时不停用任何标的
+        if deactivate_missing and items:
+            fetched = {str(item['symbol']) for item in items}
+            missing = [
+                instrument.id for instrument in existing.values()
+                if instrument.market_type == market_type and instrument.is_active and instrument.symbol not in fetched
+            ]
+            for i in range(0, len(missing), 1000):
+                Instrument.objects.filter(id__in=missing[i:i + 1000]).update(is_active=False, updated_at=now)
+            stats['deactivated'] = len(missing)
 
-            if not data:
-                logger.warning(f"未获取到 {instrument.symbol} 的数据")
-                return 0
+        logger.info(
+            f"同步{market_type}标的列表：新增 {stats['created']} 个，更新 {stats['updated']} 个，"
+            f"未变 {stats['unchanged']} 个，停用 {stats['deactivated']} 个"
+        )
+        return stats
 
-            # 删除已存在的数据
-            KLine.objects.filter(
+    def sync_instrument_list(self, market_type, deactivate_missing=False):
+        """
+        从数据源获取并批量同步标的列表
+        :param market_type: 'STOCK' 或 'FUTURES'
+        :return: 同 bulk_sync_instruments
+        """
+        if market_type == 'STOCK':
+            items = self.fetcher.fetch_stock_list()
+        else:
+            items = self.fetcher.fetch_futures_list()
+        return self.bulk_sync_instruments(market_type, items, deactivate_missing)
+
+    def fetch_kline_data(self, instrument, start_date, end_date, raise_errors=False, period='1d'):
+        """
+        从数据源获取K线（不访问数据库，可在线程中并发调用）
+        :param raise_errors: 获取失败时抛出异常（数据源默认记录日志并返回空数据）
+        :param period: '1d' 或分钟周期（KLine.INTRADAY_PERIODS）；周线、月线由日线合成，不从数据源获取
+        :return: 标准化的K线 DataFrame（见 data_fetcher.normalize_klines），分钟K线另有 trade_time 列
+        """
+        kwargs = {'raise_errors': True} if raise_errors else {}
+        stock = instrument.market_type == 'STOCK'
+        if period in KLine.INTRADAY_PERIODS:
+            fetch = self.fetcher.fetch_stock_minute if stock else self.fetcher.fetch_futures_minute
+            data = fetch(instrument.symbol, start_date, end_date, period=period, **kwargs)
+        elif period == '1d':
+            fetch = self.fetcher.fetch_stock_daily if stock else self.fetcher.fetch_futures_daily
+            data = fetch(instrument.symbol, start_date, end_date, **kwargs)
+        else:
+            raise ValueError(f"{period} K线由日线合成（见 resample_klines），不能从数据源获取")
+        return to_kline_frame(data)
+
+    @staticmethod
+    def build_klines(instrument, period, frame):
+        """
+        由标准化的K线 DataFrame 构建 KLine 对象
+        按列一次性转换为 Python 值，缺失值转换为 None；分钟K线另有 trade_time 列
+        """
+        columns = [
+            frame['trade_date'].dt.date.tolist(),
+            frame['trade_time'].tolist() if 'trade_time' in frame.columns else [None] * len(frame),
+            *(frame[column].to_numpy(dtype=object, na_value=None).tolist()
+              for column in ['open_price', 'high_price', 'low_price', 'close_price', 'volume', 'amount', 'open_interest'])
+        ]
+        return [
+            KLine(
                 instrument=instrument,
                 period=period,
-                trade_date__gte=start_date,
-                trade_date__lte=end_date
-            ).delete()
-
-            # 批量创建
-            klines = [
-                KLine(
-                    instrument=instrument,
-                    period=period,
-                    **item
-                ) for item in data
-            ]
-            KLine.objects.bulk_create(klines, batch_size=1000)
+                trade_date=trade_date,
+                trade_time=trade_time,
+                open_price=open_price,
+                high_price=high_price,
+                low_price=low_price,
+                close_price=close_price,
+                volume=volume,
+                amount=amount,
+                open_interest=open_interest,
+            )
+            for trade_date, trade_time, open_price, high_price, low_price, close_price, volume, amount, open_interest
+            in zip(*columns)
+        ]
+
+    @staticmethod
+    def _kline_changed(old, new):
+        """
+        K线数值是否有变化
+        Decimal 字段按字段精度比较：差值不超过半个最小单位视为相同
+        （写入时的舍入方式因数据库而异，不能直接比较舍入后的值）
+        """
+        for field in KLINE_VALUE_FIELDS:
+            old_value = getattr(old, field.attname)
+            new_value = getattr(new, field.attname)
+            if old_value is None or new_value is None:
+                if old_value is not new_value:
+                    return True
+            elif field.get_internal_type() == 'DecimalField':
+                if abs(float(old_value) - float(new_value)) > 0.5 * 10 ** -field.decimal_places:
+                    return True
+            elif old_value != new_value:
+                return True
+        return False
 
-            logger.info(f"导入 {instrument.symbol} K线数据 {len(klines)} 条")
-            return len(klines)
+    def save_kline_data(self, instrument, data, start_date, end_date, period='1d', prune=False):
+        """
+        按 (instrument, period, trade_date, trade_time) upsert K线：
+        新K线插入，数值有变化的K线原地更新（保留主键和关联的指标），未变的K线不写入
+        :param data: 标准化的K线 DataFrame
+        :param prune: 是否删除日期区间内数据源未返回的K线
+        :return: {'inserted': 新增条数, 'updated': 更新条数, 'unchanged': 未变条数, 'deleted': 删除条数}
+        """
+        klines = self.build_klines(instrument, period, data)
+        return self.save_kline_batch([(instrument, klines, start_date, end_date)], period, prune)[0]
+
+    @transaction.atomic
+    def save_kline_batch(self, items, period='1d', prune=False):
+        """
+        在一个事务中 upsert 多个标的（或同一标的多个区间）的K线：
+        一次查询读取各区间内已有的K线，所有新K线一次批量插入，有变化的一次批量更新
+        :param items: [(标的, KLine 列表（见 build_klines）, start_date, end_date), ...]
+        :param prune: 是否删除各区间内数据源未返回的K线
+        :return: 与 items 一一对应的条数统计列表
+        """
+        results = [dict(EMPTY_STATS) for _ in items]
+        ranges = {}
+        for i, (instrument, klines, start_date, end_date) in enumerate(items):
+            if klines:
+                trade_dates = [kline.trade_date.isoformat() for kline in klines]
+                ranges[i] = (min(str(start_date), min(trade_dates)), max(str(end_date), max(trade_dates)))
+        if not ranges:
+            return results
+
+        if period in KLine.INTRADAY_PERIODS:
+            ensure_kline_partitions(
+                min(first for first, _ in ranges.values()), max(last for _, last in ranges.values())
+            )
+
+        existing = {}
+        indexes = list(ranges)
+        for i in range(0, len(indexes), 100):
+            condition = Q()
+            for index in indexes[i:i + 100]:
+                first_date, last_date = ranges[index]
+                condition |= Q(instrument_id=items[index][0].id, trade_date__gte=first_date, trade_date__lte=last_date)
+            existing.update(
+                ((kline.instrument_id, kline.trade_date, kline.trade_time), kline)
+                for kline in KLine.objects.filter(condition, period=period).only(
+                    'id', 'instrument_id', 'trade_date', 'trade_time', *[field.name for field in KLINE_VALUE_FIELDS]
+                )
+            )
+
+        to_create = []
+        to_update = []
+        for index in indexes:
+            instrument, klines, _, _ = items[index]
+            stats = results[index]
+            for kline in klines:
+                old = existing.pop((instrument.id, kline.trade_date, kline.trade_time), None)
+                if old is None:
+                    to_create.append(kline)
+                    stats['inserted'] += 1
+                elif not self._kline_changed(old, kline):
+                    stats['unchanged'] += 1
+                else:
+                    kline.pk = old.pk
+                    to_update.append(kline)
+                    stats['updated'] += 1
+
+        KLine.objects.bulk_create(to_create, batch_size=1000)
+        KLine.objects.bulk_update(to_update, [field.name for field in KLINE_VALUE_FIELDS], batch_size=1000)
+
+        if prune:
+            stale = []
+            for index in indexes:
+                instrument, _, start_date, end_date = items[index]
+                pks = [
+                    kline.pk for kline in existing.values()
+                    if kline.instrument_id == instrument.id
+                    and str(start_date) <= kline.trade_date.isoformat() <= str(end_date)
+                ]
+                results[index]['deleted'] = len(pks)
+                stale.extend(pks)
+            for i in range(0, len(stale), 1000):
+                KLine.objects.filter(pk__in=stale[i:i + 1000]).delete()
+
+        # 覆盖索引与K线在同一事务中更新
+        touched = {}
+        for index in indexes:
+            instrument_id = items[index][0].id
+            first_date, last_date = ranges[index]
+            if instrument_id in touched:
+                first_date = min(first_date, touched[instrument_id][0])
+                last_date = max(last_date, touched[instrument_id][1])
+            touched[instrument_id] = (first_date, last_date)
+        self.coverage.update(period, touched)
+
+        for index in indexes:
+            stats = results[index]
+            logger.info(
+                f"导入 {items[index][0].symbol} K线数据：新增 {stats['inserted']} 条，"
+                f"更新 {stats['updated']} 条，未变 {stats['unchanged']} 条"
+            )
+        return results
+
+    def import_kline_data(self, instrument_id, start_date, end_date, period='1d'):
+        """
+        导入K线数据
+        :return: {'inserted', 'updated', 'unchanged', 'deleted'} 条数统计
+        """
+        try:
+            instrument = Instrument.objects.get(id=instrument_id)
+            return self._import_klines(instrument, start_date, end_date, period)
         except Instrument.DoesNotExist:
             logger.error(f"标的 ID {instrument_id} 不存在")
             raise
@@ -76,30 +324,342 @@ class MarketDataService:
             logger.error(f"导入K线数据失败: {e}")
             raise
 
-    def update_latest_data(self, instrument_id, days=30):
-        """更新最新数据"""
-        try:
-            instrument = Instrument.objects.get(id=instrument_id)
+    def _import_klines(self, instrument, start_date, end_date, period='1d'):
+        """获取并保存已加载标的的K线，返回条数统计"""
+        data = self.fetch_kline_data(instrument, start_date, end_date, period=period)
+        if data.empty:
+            logger.warning(f"未获取到 {instrument.symbol} 的数据")
+            return dict(EMPTY_STATS)
+        return self.save_kline_data(instrument, data, start_date, end_date, period)
 
-            # 获取最后一条数据的日期
-            last_kline = KLine.objects.filter(
-                instrument=instrument,
-                period='1d'
-            ).order_by('-trade_date').first()
+    @staticmethod
+    def _last_trade_dates(instruments, period='1d'):
+        """
+        一次聚合查询各标的最后一条K线的日期（标的很多时按 1000 个一批）
+        :return: {标的ID: 最后交易日}，没有K线的标的不在结果中
+        """
+        ids = [instrument.id for instrument in instruments]
+        last_dates = {}
+        for i in range(0, len(ids), 1000):
+            last_dates.update(
+                KLine.objects.filter(instrument_id__in=ids[i:i + 1000], period=period)
+                .values('instrument_id')
+                .annotate(last_date=Max('trade_date'))
+                .values_list('instrument_id', 'last_date')
+            )
+        return last_dates
 
-            if last_kline:
-                start_date = (last_kline.trade_date + timedelta(days=1)).strftime('%Y-%m-%d')
-            else:
-                start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    def _latest_range(self, last_date, days, period='1d'):
+        """
+        增量更新的日期区间：从最后一条K线之后的第一个交易日到最近一个交易日（含今天）
+        分钟K线从最后一条K线所在的交易日开始（当天可能只获取了一部分）
+        :param last_date: 最后一条K线的日期，没有K线时为 None（获取最近 days 天）
+        :return: (start_date, end_date)，数据已是最新（两者之间没有交易日，如周末、节假日）时返回 None
+        """
+        today = date.today()
+        if last_date and period in KLine.INTRADAY_PERIODS:
+            start_date = last_date
+        elif last_date:
+            start_date = self.calendar.next_session(last_date)
+        else:
+            start_date = self.calendar.next_session(today - timedelta(days=days + 1))
 
-            end_date = datetime.now().strftime('%Y-%m-%d')
+        end_date = self.calendar.last_session(today)
+        if start_date > end_date:
+            return None
+        return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
 
-            # 如果开始日期大于结束日期，说明数据已是最新
-            if start_date > end_date:
+    def update_latest_data(self, instrument_id, days=30, period='1d'):
+        """
+        更新最新数据
+        :param period: '1d' 或分钟周期
+        :return: {'inserted', 'updated', 'unchanged', 'deleted'} 条数统计
+        """
+        try:
+            instrument = Instrument.objects.get(id=instrument_id)
+
+            last_date = self._last_trade_dates([instrument], period).get(instrument.id)
+            date_range = self._latest_range(last_date, days, period)
+            if date_range is None:
                 logger.info(f"{instrument.symbol} 数据已是最新，无需更新")
-                return 0
+                return dict(EMPTY_STATS)
 
-            return self.import_kline_data(instrument_id, start_date, end_date)
+            return self._import_klines(instrument, *date_range, period)
         except Exception as e:
             logger.error(f"更新最新数据失败: {e}")
             raise
+
+    def update_latest_data_batch(self, instruments, days=30, workers=None, period='1d'):
+        """
+        并发更新多个标的的最新数据
+        经流式导入管道（见 pipeline.py）：多个线程并发请求数据源（请求速率由共享限流器控制），
+        调用线程把多个标的的K线合并为批量事务写入，网络请求与数据库写入重叠进行
+        :param instruments: Instrument 列表
+        :param days: 没有历史数据时获取最近N天
+        :param workers: 并发线程数，默认 MARKET_DATA_FETCH_WORKERS
+        :param period: '1d' 或分钟周期
+        :return: 按完成顺序排列的 (标的, 条数统计, 异常) 列表，成功时异常为 None；管道计数器见 self.pipeline_stats
+        """
+        results = []
+        jobs = []
+        last_dates = self._last_trade_dates(instruments, period)
+        for instrument in instruments:
+            date_range = self._latest_range(last_dates.get(instrument.id), days, period)
+            if date_range is None:
+                logger.info(f"{instrument.symbol} 数据已是最新，无需更新")
+                results.append((instrument, dict(EMPTY_STATS), None))
+            else:
+                jobs.append(IngestJob(instrument, [date_range], period))
+
+        for job in self._run_pipeline(jobs, workers):
+            if job.error is not None:
+                logger.error(f"更新 {job.instrument.symbol} 最新数据失败: {job.error}")
+                results.append((job.instrument, dict(EMPTY_STATS), job.error))
+            else:
+                if not job.rows:
+                    logger.warning(f"未获取到 {job.instrument.symbol} 的数据")
+                results.append((job.instrument, job.stats, None))
+        return results
+
+    def _run_pipeline(self, jobs, workers=None):
+        """经流式导入管道执行导入任务，计数器保存在 self.pipeline_stats"""
+        pipeline = IngestPipeline(self, workers)
+        finished = pipeline.run(jobs) if jobs else []
+        self.pipeline_stats = pipeline.stats
+        if jobs:
+            logger.info(f"导入管道：{pipeline.stats}")
+        return finished
+
+    @staticmethod
+    def _as_date(value):
+        return value if isinstance(value, date) else datetime.strptime(value, '%Y-%m-%d').date()
+
+    def _start_backfill(self, instrument, start_date, end_date, chunk_days=None, period='1d'):
+        """
+        读取或创建回补检查点
+        检查点已连续完成到请求区间开始日期之前的最后一个交易日时，从已完成日期的下一天继续，否则从请求的开始日期重新回补
+        :return: (检查点, 待获取的日期区间列表，每个区间的首尾都是交易日)
+        """
+        start_date, end_date = self._as_date(start_date), self._as_date(end_date)
+        chunk_days = chunk_days or getattr(settings, 'MARKET_DATA_BACKFILL_CHUNK_DAYS', 3650)
+
+        checkpoint, created = BackfillCheckpoint.objects.get_or_create(
+            instrument=instrument,
+            period=period,
+            defaults={'start_date': start_date, 'end_date': end_date}
+        )
+        completed = checkpoint.completed_through
+        if (not created and completed is not None
+                and checkpoint.start_date <= start_date <= self.calendar.next_session(completed)):
+            resume_date = completed + timedelta(days=1)
+        else:
+            checkpoint.start_date = start_date
+            checkpoint.completed_through = None
+            resume_date = start_date
+
+        checkpoint.end_date = end_date
+        checkpoint.status = 'RUNNING'
+        checkpoint.error = ''
+        checkpoint.save()
+
+        chunks = self.calendar.session_chunks(resume_date, end_date, chunk_days)
+        if resume_date > start_date:
+            logger.info(f"{instrument.symbol} 已回补到 {completed}，从 {resume_date} 继续")
+        return checkpoint, chunks
+
+    @staticmethod
+    def _advance_checkpoint(job, chunk_start, chunk_end):
+        """区间写入后推进检查点（与该区间的K线在同一事务中提交）"""
+        checkpoint = job.context
+        checkpoint.completed_through = chunk_end
+        checkpoint.save(update_fields=['completed_through', 'updated_at'])
+
+    @staticmethod
+    def _finish_backfill(job):
+        """回补结束后记录检查点状态，失败时下次从已完成的日期继续"""
+        checkpoint = job.context
+        checkpoint.status = 'FAILED' if job.error else 'DONE'
+        checkpoint.error = str(job.error) if job.error else ''
+        checkpoint.save(update_fields=['status', 'error', 'updated_at'])
+
+    def backfill(self, instrument, start_date, end_date, chunk_days=None):
+        """
+        回补单个标的的历史日线
+        按大区间获取（数据源一次即可返回多年日线），每写入一个区间推进一次检查点，失败后重新调用时从检查点继续
+        :param start_date: 开始日期（YYYY-MM-DD 或 date）
+        :param end_date: 结束日期（YYYY-MM-DD 或 date）
+        :param chunk_days: 每次请求的最大天数，默认 MARKET_DATA_BACKFILL_CHUNK_DAYS
+        :return: {'inserted', 'updated', 'unchanged', 'deleted'} 条数统计
+        """
+        _, stats, error = self.backfill_batch([instrument], start_date, end_date, workers=1, chunk_days=chunk_days)[0]
+        if error is not None:
+            raise error
+        return stats
+
+    def backfill_batch(self, instruments, start_date, end_date, workers=None, chunk_days=None):
+        """
+        并发回补多个标的的历史日线
+        经流式导入管道：多个线程并发请求数据源（请求速率由共享限流器控制），调用线程合并写入，
+        每个区间与检查点的推进在同一事务中提交
+        :param instruments: Instrument 列表
+        :param workers: 并发线程数，默认 MARKET_DATA_FETCH_WORKERS
+        :return: 按完成顺序排列的 (标的, 条数统计, 异常) 列表，成功时异常为 None；管道计数器见 self.pipeline_stats
+        """
+        jobs = []
+        for instrument in instruments:
+            checkpoint, chunks = self._start_backfill(instrument, start_date, end_date, chunk_days)
+            jobs.append(IngestJob(
+                instrument, chunks, checkpoint.period,
+                on_chunk=self._advance_checkpoint, on_finish=self._finish_backfill, context=checkpoint
+            ))
+
+        results = []
+        for job in self._run_pipeline(jobs, workers):
+            if job.error is not None:
+                logger.error(f"回补 {job.instrument.symbol} 历史数据失败: {job.error}")
+                results.append((job.instrument, dict(EMPTY_STATS), job.error))
+            else:
+                results.append((job.instrument, job.stats, None))
+        return results
+
+    def repair_gaps_batch(self, instruments, period='1d', workers=None, zero_volume=False, force=False):
+        """
+        按K线覆盖索引（见 coverage.py）只重新获取缺失的交易日区间，经流式导入管道写入，代替大范围重新导入
+        没有覆盖记录的标的先全量构建；修补后仍然缺失的区间（停牌等数据源本来就没有K线）记入 verified_empty，
+        以后的修补不再重复获取
+        :param instruments: Instrument 列表
+        :param zero_volume: 同时重新获取成交量为 0 的交易日
+        :param force: 也重新获取已确认数据源没有数据的区间
+        :return: 按完成顺序排列的 (标的, 条数统计, 异常) 列表，没有缺口的标的不在其中
+        """
+        instruments = list(instruments)
+        indexed = set(KLineCoverage.objects.filter(
+            instrument__in=instruments, period=period
+        ).values_list('instrument_id', flat=True))
+        missing = [instrument for instrument in instruments if instrument.id not in indexed]
+        if missing:
+            self.coverage.rebuild(period, missing)
+
+        coverages = {
+            coverage.instrument_id: coverage
+            for coverage in KLineCoverage.objects.filter(instrument__in=instruments, period=period)
+        }
+        jobs = []
+        for instrument in instruments:
+            coverage = coverages.get(instrument.id)
+            ranges = coverage.repair_ranges(zero_volume, force) if coverage else []
+            if ranges:
+                jobs.append(IngestJob(instrument, ranges, period))
+        logger.info(f"{len(jobs)} 个标的的 {period} K线有缺口，共 {sum(len(job.ranges) for job in jobs)} 个区间")
+
+        results = []
+        repaired = []
+        for job in self._run_pipeline(jobs, workers):
+            if job.error is not None:
+                logger.error(f"修补 {job.instrument.symbol} K线缺口失败: {job.error}")
+                results.append((job.instrument, dict(EMPTY_STATS), job.error))
+            else:
+                results.append((job.instrument, job.stats, None))
+                repaired.append(job)
+        self._mark_verified_empty(period, repaired, zero_volume)
+        return results
+
+    @staticmethod
+    def _mark_verified_empty(period, jobs, zero_volume=False):
+        """
+        修补成功后，请求区间内仍然缺失的部分记入 verified_empty
+        已不再缺失的旧记录同时删除，列表只保留当前缺口
+        """
+        coverages = {
+            coverage.instrument_id: coverage
+            for coverage in KLineCoverage.objects.filter(
+                instrument_id__in=[job.instrument.id for job in jobs], period=period
+            )
+        }
+        to_update = []
+        for job in jobs:
+            coverage = coverages.get(job.instrument.id)
+            if coverage is None:
+                continue
+            remaining = coverage.gaps + (coverage.zero_volume if zero_volume else [])
+            requested = [(start.isoformat(), end.isoformat()) for start, end in job.ranges]
+            confirmed = [
+                [max(start, low), min(end, high)]
+                for start, end, _ in remaining for low, high in requested
+                if start <= high and low <= end
+            ]
+            current = coverage.gaps + coverage.zero_volume
+            verified = sorted(
+                [low, high] for low, high in {
+                    (low, high) for low, high in coverage.verified_empty + confirmed
+                    if any(start <= high and low <= end for start, end, _ in current)
+                }
+            )
+            if verified != coverage.verified_empty:
+                coverage.verified_empty = verified
+                to_update.append(coverage)
+        KLineCoverage.objects.bulk_update(to_update, ['verified_empty'], batch_size=1000)
+        if to_update:
+            logger.info(f"{len(to_update)} 个标的的 {period} K线缺口确认数据源没有数据，以后修补时跳过")
+
+    @staticmethod
+    def load_klines(instrument, period, start_date=None):
+        """
+        读取数据库中的K线为标准化 DataFrame（另有 trade_time 列），按日期、时间排序
+        :param start_date: 只读取该日期及之后的K线
+        """
+        queryset = KLine.objects.filter(instrument=instrument, period=period)
+        if start_date:
+            queryset = queryset.filter(trade_date__gte=start_date)
+        fields = [field.name for field in KLINE_VALUE_FIELDS]
+        rows = queryset.order_by('trade_date', 'trade_time').values_list('trade_date', 'trade_time', *fields)
+
+        frame = pd.DataFrame.from_records(list(rows), columns=['trade_date', 'trade_time', *fields])
+        frame['trade_date'] = pd.to_datetime(frame['trade_date'])
+        for column in FLOAT_COLUMNS:
+            frame[column] = frame[column].astype('float64')
+        for column in INTEGER_COLUMNS:
+            frame[column] = frame[column].astype('Int64')
+        return frame
+
+    def resample_klines(self, instrument, period, full=False):
+        """
+        由基础周期的K线合成 period 周期的K线并 upsert（周线/月线来自日线，分钟周期来自 1m）
+        增量模式从已有合成K线中最后一根所在的周/月/日开始重新聚合；基础K线被修改（如复权调整）后应全量合成
+        :param full: 全量合成，删除不再对应基础K线的合成K线
+        :return: {'inserted', 'updated', 'unchanged', 'deleted'} 条数统计
+        """
+        start_date = None
+        if not full:
+            last = KLine.objects.filter(instrument=instrument, period=period).order_by('-trade_date').values_list(
+                'trade_date', flat=True
+            ).first()
+            if last:
+                start_date = resampling.bucket_start(period, last)
+
+        base = self.load_klines(
+            instrument, resampling.base_period(period),
+            resampling.base_start(period, start_date) if start_date else None
+        )
+        if base.empty:
+            return dict(EMPTY_STATS)
+
+        result = resampling.resample(base, period, self.calendar, instrument.market_type)
+        if start_date:
+            # 多读取的基础K线只用于补全跨零点的夜盘，之前的合成K线不重新写入
+            result = result[result['trade_date'] >= pd.Timestamp(start_date)]
+            if result.empty:
+                return dict(EMPTY_STATS)
+        # 删除区间内不再产生的合成K线（如节假日调整后周线日期变化）
+        first_date = start_date
+        if not first_date:
+            # 全量合成的区间从最早的基础K线（或更早残留的合成K线）开始，不使用 date.min 之类的占位日期，
+            # 否则分钟周期会按该区间创建上万个月分区
+            first_date = resampling.bucket_start(period, base['trade_date'].min().date())
+            oldest = KLine.objects.filter(instrument=instrument, period=period).aggregate(
+                oldest=Min('trade_date')
+            )['oldest']
+            if oldest:
+                first_date = min(first_date, oldest)
+        last_date = result['trade_date'].max().date()
+        return self.save_kline_data(instrument, result, first_date, last_date, period, prune=True)
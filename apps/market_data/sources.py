@@ -0,0 +1,351 @@
+"""
+数据源
+
+MarketDataService 通过 get_data_source() 按配置获取数据源：
+- MARKET_DATA_SOURCE: 已注册的名称（'akshare'、'local'）或数据源类的导入路径
+- MARKET_DATA_SOURCE_OPTIONS: 传给数据源构造函数的参数
+
+数据源继承 DataSource 并实现以下方法（fetch_trade_dates 可选）：
+- fetch_stock_daily / fetch_futures_daily(symbol, start_date, end_date, raise_errors=False)：
+  返回标准化的K线 DataFrame（见 data_fetcher.normalize_klines），失败时 raise_errors 为 True 则抛出异常，否则返回空数据
+- fetch_stock_minute / fetch_futures_minute(symbol, start_date, end_date, period='1m', raise_errors=False)：
+  返回标准化的分钟K线 DataFrame（见 data_fetcher.normalize_intraday_klines），另有 trade_time 列
+- fetch_stock_list / fetch_futures_list()：返回 [{'symbol': ..., 'name': ...}, ...]，失败时返回空列表
+- fetch_trade_dates()：返回交易日（YYYY-MM-DD）列表，没有交易日历时返回空列表（按工作日处理）
+"""
+import logging
+import random
+import time
+import zlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .cache import CachedDataFetcher
+from . import resampling
+from .data_fetcher import (
+    AkshareDataFetcher, INTRADAY_COLUMNS, INTRADAY_PERIODS, empty_intraday_klines, empty_klines,
+    normalize_intraday_klines, normalize_klines, rate_limited_call,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DataSource(ABC):
+    """数据源接口：缺少任一抽象方法的数据源在创建时即报错，而不是同步到一半才失败"""
+
+    # 是否在前面加磁盘缓存（远程数据源才需要）
+    cacheable = False
+
+    @abstractmethod
+    def fetch_stock_daily(self, symbol, start_date, end_date, raise_errors=False):
+        """股票日线"""
+
+    @abstractmethod
+    def fetch_futures_daily(self, symbol, start_date, end_date, raise_errors=False):
+        """期货日线"""
+
+    @abstractmethod
+    def fetch_stock_minute(self, symbol, start_date, end_date, period='1m', raise_errors=False):
+        """股票分钟K线"""
+
+    @abstractmethod
+    def fetch_futures_minute(self, symbol, start_date, end_date, period='1m', raise_errors=False):
+        """期货分钟K线"""
+
+    @abstractmethod
+    def fetch_stock_list(self):
+        """股票列表"""
+
+    @abstractmethod
+    def fetch_futures_list(self):
+        """期货合约列表"""
+
+    def fetch_trade_dates(self):
+        """交易日列表，默认没有交易日历（按工作日处理）"""
+        return []
+
+
+class AkshareDataSource(AkshareDataFetcher, DataSource):
+    """akshare 数据源"""
+    cacheable = True
+
+
+# 本地文件可用的列名 -> 标准列名
+LOCAL_COLUMNS = {
+    'date': 'trade_date', 'trade_date': 'trade_date', 'datetime': 'trade_date',
+    'open': 'open_price', 'open_price': 'open_price',
+    'high': 'high_price', 'high_price': 'high_price',
+    'low': 'low_price', 'low_price': 'low_price',
+    'close': 'close_price', 'close_price': 'close_price',
+    'volume': 'volume', 'amount': 'amount',
+    'hold': 'open_interest', 'open_interest': 'open_interest',
+}
+
+SYNTHETIC_EPOCH = '2000-01-03'  # 合成K线的起始日期，相同标的任意区间的数据都从这一天开始生成，保证多次请求一致
+
+# 合成分钟K线的交易时段（开始、结束的 时, 分），K线按结束时间标记
+SYNTHETIC_SESSIONS = {
+    'stock': [((9, 30), (11, 30)), ((13, 0), (15, 0))],
+    'futures': [((9, 0), (10, 15)), ((10, 30), (11, 30)), ((13, 30), (15, 0)), ((21, 0), (23, 0))],
+}
+
+
+def _session_minutes(market):
+    """合成分钟K线每天的时间（从零点起的分钟数）"""
+    return np.concatenate([
+        np.arange(start_h * 60 + start_m + 1, end_h * 60 + end_m + 1)
+        for (start_h, start_m), (end_h, end_m) in SYNTHETIC_SESSIONS[market]
+    ])
+
+
+class LocalDataFetcher(DataSource):
+    """
+    本地数据源，用于隔离环境下的压力测试
+    指定 path 时读取目录中的 CSV/Parquet 文件：{path}/{stock|futures}/{symbol}.csv（或 .parquet，也可以直接放在 {path} 下），
+    列名为 date/open/high/low/close/volume/amount/hold 或标准列名；分钟K线的文件为 {symbol}_{period}.csv，时间列为 datetime；
+    未指定 path 时按标的代码生成确定性的合成K线（几何随机游走，工作日），分钟K线在当天日线的开盘价和收盘价之间随机游走。
+    可以注入延迟和随机错误来模拟远程数据源。
+    """
+
+    def __init__(self, path=None, stocks=5000, futures=80, latency=0., error_rate=0., seed=0, rate_limited=False):
+        """
+        :param path: 数据目录，为空时生成合成数据
+        :param stocks: 合成模式下的股票数量
+        :param futures: 合成模式下的期货合约数量
+        :param latency: 每次请求的平均延迟（秒），实际延迟在 0.5～1.5 倍之间随机
+        :param error_rate: 每次请求失败（抛出 ConnectionError）的概率
+        :param seed: 合成数据和错误注入的随机种子
+        :param rate_limited: 是否经过共享限流器（与 akshare 数据源相同的限流和重试）
+        """
+        self.path = Path(path) if path else None
+        self.stocks = stocks
+        self.futures = futures
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.rate_limited = rate_limited
+        self._random = random.Random(seed)
+
+    def _call(self, func, *args):
+        """模拟远程调用：延迟、错误注入、限流"""
+        def request():
+            if self.latency:
+                time.sleep(self.latency * self._random.uniform(0.5, 1.5))
+            if self.error_rate and self._random.random() < self.error_rate:
+                raise ConnectionError('本地数据源注入的错误')
+            return func(*args)
+
+        return rate_limited_call(request) if self.rate_limited else request()
+
+    def fetch_stock_daily(self, symbol, start_date, end_date, raise_errors=False):
+        return self._fetch_daily('stock', symbol, start_date, end_date, raise_errors)
+
+    def fetch_futures_daily(self, symbol, start_date, end_date, raise_errors=False):
+        return self._fetch_daily('futures', symbol, start_date, end_date, raise_errors)
+
+    def _fetch_daily(self, market, symbol, start_date, end_date, raise_errors):
+        try:
+            load = self._read_file if self.path else self._synthetic
+            df = self._call(load, market, symbol, pd.Timestamp(start_date), pd.Timestamp(end_date))
+        except Exception as e:
+            logger.error(f"获取本地数据 {symbol} 失败: {e}")
+            if raise_errors:
+                raise
+            return empty_klines()
+        return df
+
+    def fetch_stock_minute(self, symbol, start_date, end_date, period='1m', raise_errors=False):
+        return self._fetch_minute('stock', symbol, start_date, end_date, period, raise_errors)
+
+    def fetch_futures_minute(self, symbol, start_date, end_date, period='1m', raise_errors=False):
+        return self._fetch_minute('futures', symbol, start_date, end_date, period, raise_errors)
+
+    def _fetch_minute(self, market, symbol, start_date, end_date, period, raise_errors):
+        try:
+            if period not in INTRADAY_PERIODS:
+                raise ValueError(f"不支持的分钟周期: {period}，可选 {', '.join(INTRADAY_PERIODS)}")
+            load = self._read_minute_file if self.path else self._synthetic_minutes
+            df = self._call(load, market, symbol, pd.Timestamp(start_date), pd.Timestamp(end_date), period)
+        except Exception as e:
+            logger.error(f"获取本地分钟数据 {symbol} 失败: {e}")
+            if raise_errors:
+                raise
+            return empty_intraday_klines()
+        return df
+
+    def _file(self, market, symbol):
+        for directory in (self.path / market, self.path):
+            for suffix in ('.parquet', '.csv'):
+                file = directory / f'{symbol}{suffix}'
+                if file.exists():
+                    return file
+        return None
+
+    def _read_file(self, market, symbol, start, end):
+        file = self._file(market, symbol)
+        if file is None:
+            return empty_klines()
+        df = pd.read_parquet(file) if file.suffix == '.parquet' else pd.read_csv(file)
+        df = normalize_klines(df, {column: LOCAL_COLUMNS[column] for column in df.columns if column in LOCAL_COLUMNS})
+        return df[(df['trade_date'] >= start) & (df['trade_date'] <= end)].reset_index(drop=True)
+
+    def _read_minute_file(self, market, symbol, start, end, period):
+        file = self._file(market, f'{symbol}_{period}')
+        if file is None:
+            return empty_intraday_klines()
+        df = pd.read_parquet(file) if file.suffix == '.parquet' else pd.read_csv(file)
+        df = normalize_intraday_klines(df, {column: LOCAL_COLUMNS[column] for column in df.columns if column in LOCAL_COLUMNS})
+        return df[(df['trade_date'] >= start) & (df['trade_date'] <= end)].reset_index(drop=True)
+
+    def _synthetic_minutes(self, market, symbol, start, end, period):
+        """
+        合成分钟K线：每天的价格从日线开盘价随机游走到收盘价（布朗桥），成交量按随机权重分配日成交量
+        每天的随机序列只取决于种子、标的代码和日期，任意区间的数据一致
+        """
+        daily = self._synthetic(market, symbol, start, end)
+        if daily.empty:
+            return empty_intraday_klines()
+
+        key = zlib.crc32(f'{market}:{symbol}'.encode())
+        minutes = _session_minutes(market)
+        bars = len(minutes)
+        days = daily['trade_date'].to_numpy(dtype='datetime64[D]')
+        noise = np.empty((len(days), bars, 3))
+        weights = np.empty((len(days), bars))
+        for i, day in enumerate(days.astype(np.int64)):
+            rng = np.random.default_rng([self.seed, key, 3, int(day)])
+            noise[i] = rng.standard_normal((bars, 3))
+            weights[i] = rng.random(bars)
+
+        # 对数价格：开盘到收盘的直线加上首尾为 0 的随机游走
+        walk = np.cumsum(0.0015 * noise[:, :, 0], axis=1)
+        steps = np.arange(1, bars + 1) / bars
+        walk -= walk[:, -1:] * steps
+        open_day = daily['open_price'].to_numpy()[:, None]
+        close_day = daily['close_price'].to_numpy()[:, None]
+        close = np.exp(np.log(open_day) + np.log(close_day / open_day) * steps + walk)
+        open_ = np.concatenate([open_day, close[:, :-1]], axis=1)
+        high = np.maximum(open_, close) * (1 + np.abs(0.0005 * noise[:, :, 1]))
+        low = np.minimum(open_, close) * (1 - np.abs(0.0005 * noise[:, :, 2]))
+        volume = (daily['volume'].to_numpy(dtype=np.float64)[:, None] * weights / weights.sum(axis=1, keepdims=True))
+        volume = volume.astype(np.int64)
+
+        timestamps = (days[:, None].astype('datetime64[m]') + minutes[None, :].astype('timedelta64[m]')).ravel()
+        df = pd.DataFrame({
+            'datetime': timestamps,
+            'open': np.round(open_, 2).ravel(),
+            'high': np.round(high, 2).ravel(),
+            'low': np.round(low, 2).ravel(),
+            'close': np.round(close, 2).ravel(),
+            'volume': volume.ravel(),
+            'amount': np.round(volume * close, 2).ravel(),
+        })
+        if market == 'futures':
+            df['hold'] = np.repeat(daily['open_interest'].to_numpy(dtype=np.int64), bars)
+        df = normalize_intraday_klines(df, LOCAL_COLUMNS)
+        if period != '1m':
+            df = resampling.resample_intraday(df, period, 'STOCK' if market == 'stock' else 'FUTURES')
+        return df[INTRADAY_COLUMNS]
+
+    def _synthetic(self, market, symbol, start, end):
+        days = np.arange(np.datetime64(SYNTHETIC_EPOCH), np.datetime64(end.date()) + 1)
+        dates = days[np.is_busday(days)]
+        if not len(dates) or start > pd.Timestamp(dates[-1]):
+            return empty_klines()
+
+        # 每个标的的随机序列只取决于种子和标的代码；按行生成，不同长度的序列前缀相同
+        key = zlib.crc32(f'{market}:{symbol}'.encode())
+        bars = len(dates)
+        base = np.random.default_rng([self.seed, key, 0]).uniform(5, 200)
+        noise = np.random.default_rng([self.seed, key, 1]).standard_normal((bars, 4))
+        sizes = np.random.default_rng([self.seed, key, 2]).random((bars, 2))
+
+        close = base * np.exp(np.cumsum(0.0002 + 0.02 * noise[:, 0]))
+        open_ = close * (1 + 0.005 * noise[:, 1])
+        high = np.maximum(open_, close) * (1 + np.abs(0.008 * noise[:, 2]))
+        low = np.minimum(open_, close) * (1 - np.abs(0.008 * noise[:, 3]))
+        volume = (100_000 + sizes[:, 0] * 9_900_000).astype(np.int64)
+
+        df = pd.DataFrame({
+            'date': dates,
+            'open': np.round(open_, 2),
+            'high': np.round(high, 2),
+            'low': np.round(low, 2),
+            'close': np.round(close, 2),
+            'volume': volume,
+            'amount': np.round(volume * close, 2),
+        })
+        if market == 'futures':
+            df['hold'] = (10_000 + sizes[:, 1] * 490_000).astype(np.int64)
+        df = df[df['date'] >= np.datetime64(start.date())]
+        return normalize_klines(df, LOCAL_COLUMNS)
+
+    def fetch_stock_list(self):
+        return self._fetch_list('stock')
+
+    def fetch_futures_list(self):
+        return self._fetch_list('futures')
+
+    def _fetch_list(self, market):
+        try:
+            if self.path:
+                return self._call(self._list_files, market)
+            return self._call(self._synthetic_list, market)
+        except Exception as e:
+            logger.error(f"获取本地标的列表失败: {e}")
+            return []
+
+    def _list_files(self, market):
+        directory = self.path / market
+        if not directory.is_dir():
+            return []
+        symbols = sorted({file.stem for file in directory.iterdir() if file.suffix in ('.csv', '.parquet')})
+        return [{'symbol': symbol, 'name': symbol} for symbol in symbols]
+
+    def _synthetic_list(self, market):
+        if market == 'stock':
+            # 一半为上交所（6 开头），一半为深交所
+            half = self.stocks // 2
+            symbols = [f'{600000 + i}' for i in range(half)] + [f'{i + 1:06d}' for i in range(self.stocks - half)]
+            return [{'symbol': symbol, 'name': f'合成股票{symbol}'} for symbol in symbols]
+        return [{'symbol': f'SYN{i}0', 'name': f'合成期货{i}'} for i in range(self.futures)]
+
+
+DATA_SOURCES = {
+    'akshare': AkshareDataSource,
+    'local': LocalDataFetcher,
+}
+
+
+def register_data_source(name, source_class):
+    """注册数据源，之后可以在 MARKET_DATA_SOURCE 中按名称使用"""
+    DATA_SOURCES[name] = source_class
+    return source_class
+
+
+def get_data_source(name=None, **options):
+    """
+    按配置创建数据源
+    :param name: 数据源名称或类的导入路径，默认 MARKET_DATA_SOURCE
+    :param options: 构造参数，默认 MARKET_DATA_SOURCE_OPTIONS
+    :return: 数据源实例；远程数据源（cacheable）外面包一层磁盘缓存
+    """
+    if name is None:
+        name = getattr(settings, 'MARKET_DATA_SOURCE', 'akshare')
+        options = {**getattr(settings, 'MARKET_DATA_SOURCE_OPTIONS', {}), **options}
+
+    if name in DATA_SOURCES:
+        source_class = DATA_SOURCES[name]
+    else:
+        try:
+            source_class = import_string(name)
+        except ImportError:
+            raise ValueError(f"未知的数据源: {name}，可选 {', '.join(DATA_SOURCES)} 或数据源类的导入路径")
+
+    source = source_class(**options)
+    if getattr(source_class, 'cacheable', False):
+        return CachedDataFetcher(source)
+    return source
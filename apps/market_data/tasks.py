@@ -1,38 +1,83 @@
 from celery import shared_task
-from datetime import datetime, timedelta
+from django.conf import settings
 import logging
-from .models import Instrument
+from .models import Instrument, KLine
+from .resampling import base_period
 from .services import MarketDataService
 
 logger = logging.getLogger(__name__)
 
 
+def _pipeline_stats(service):
+    """最近一次批量导入的管道计数器（各阶段条数、行数、耗时），没有执行时为 None"""
+    return service.pipeline_stats.as_dict() if service.pipeline_stats else None
+
+
 @shared_task(bind=True, max_retries=3)
-def sync_daily_data(self):
-    """同步每日数据（定时任务）"""
+def sync_daily_data(self, workers=None):
+    """同步每日数据（定时任务），并发获取各标的数据，请求速率由共享限流器控制"""
     logger.info("开始同步每日数据")
     service = MarketDataService()
+    periods = [period for period in settings.MARKET_DATA_RESAMPLE_PERIODS if base_period(period) == '1d']
 
-    instruments = Instrument.objects.filter(is_active=True)
+    instruments = list(Instrument.objects.filter(is_active=True))
     success_count = 0
     fail_count = 0
 
-    for instrument in instruments:
-        try:
-            count = service.update_latest_data(instrument.id, days=1)
-            logger.info(f"同步 {instrument.symbol} 成功，更新 {count} 条数据")
-            success_count += 1
+    from apps.technical_analysis.tasks import calculate_indicators_task
+
+    for instrument, stats, error in service.update_latest_data_batch(instruments, days=1, workers=workers):
+        if error is not None:
+            logger.error(f"同步 {instrument.symbol} 失败: {error}")
+            fail_count += 1
+            continue
+
+        logger.info(f"同步 {instrument.symbol} 成功，新增 {stats['inserted']} 条，更新 {stats['updated']} 条")
+        success_count += 1
 
-            # 触发技术指标计算
-            from apps.technical_analysis.tasks import calculate_indicators_task
+        # 触发技术指标计算和周期合成：只有新增K线时增量计算，已有K线被修改（如复权调整）时全量重算
+        if stats['updated'] or stats['deleted']:
             calculate_indicators_task.delay(instrument.id)
+            resample_klines_task.delay(instrument.id, periods, full=True)
+        elif stats['inserted']:
+            calculate_indicators_task.delay(instrument.id, incremental=True)
+            resample_klines_task.delay(instrument.id, periods)
 
-        except Exception as e:
-            logger.error(f"同步 {instrument.symbol} 失败: {e}")
+    logger.info(f"每日数据同步完成，成功: {success_count}, 失败: {fail_count}")
+    return {'success': success_count, 'fail': fail_count, 'pipeline': _pipeline_stats(service)}
+
+
+@shared_task(bind=True, max_retries=3)
+def sync_intraday_data(self, market_type=None, days=5, workers=None):
+    """
+    同步分钟数据（定时任务）：获取 1 分钟K线，从每个标的最后一根分钟K线所在的交易日开始，
+    有新K线时触发 5m/15m/30m/1h 的增量合成
+    :param days: 没有分钟K线的标的获取最近N天（数据源通常只保留最近几个交易日的 1 分钟线）
+    """
+    logger.info("开始同步分钟数据")
+    service = MarketDataService()
+    periods = [period for period in settings.MARKET_DATA_RESAMPLE_PERIODS if base_period(period) == '1m']
+
+    instruments = Instrument.objects.filter(is_active=True)
+    if market_type:
+        instruments = instruments.filter(market_type=market_type)
+
+    success_count = 0
+    fail_count = 0
+    inserted = 0
+    for instrument, stats, error in service.update_latest_data_batch(
+        list(instruments), days=days, workers=workers, period='1m'
+    ):
+        if error is not None:
             fail_count += 1
+            continue
+        success_count += 1
+        inserted += stats['inserted']
+        if periods and (stats['inserted'] or stats['updated']):
+            resample_klines_task.delay(instrument.id, periods)
 
-    logger.info(f"每日数据同步完成，成功: {success_count}, 失败: {fail_count}")
-    return {'success': success_count, 'fail': fail_count}
+    logger.info(f"分钟数据同步完成，成功: {success_count}, 失败: {fail_count}, 新增 {inserted} 条")
+    return {'success': success_count, 'fail': fail_count, 'inserted': inserted, 'pipeline': _pipeline_stats(service)}
 
 
 @shared_task(bind=True, max_retries=3)
@@ -40,9 +85,9 @@ def sync_instrument_data(self, instrument_id, days=1):
     """同步单个标的数据"""
     try:
         service = MarketDataService()
-        count = service.update_latest_data(instrument_id, days=days)
-        logger.info(f"同步标的 {instrument_id} 成功，更新 {count} 条数据")
-        return {'instrument_id': instrument_id, 'count': count}
+        stats = service.update_latest_data(instrument_id, days=days)
+        logger.info(f"同步标的 {instrument_id} 成功，新增 {stats['inserted']} 条，更新 {stats['updated']} 条")
+        return {'instrument_id': instrument_id, **stats}
     except Exception as e:
         logger.error(f"同步标的 {instrument_id} 失败: {e}")
         raise self.retry(exc=e, countdown=60)
@@ -50,29 +95,106 @@ def sync_instrument_data(self, instrument_id, days=1):
 
 @shared_task(bind=True, max_retries=3)
 def import_historical_data(self, symbol, start_date, end_date):
-    """导入历史数据"""
+    """导入历史数据（按大区间获取，重试时从检查点继续）"""
     try:
         service = MarketDataService()
         instrument = Instrument.objects.get(symbol=symbol)
-
-        # 分批次导入，每次30天
-        start = datetime.strptime(start_date, '%Y-%m-%d')
-        end = datetime.strptime(end_date, '%Y-%m-%d')
-        total_count = 0
-
-        while start < end:
-            batch_end = min(start + timedelta(days=30), end)
-            count = service.import_kline_data(
-                instrument.id,
-                start.strftime('%Y-%m-%d'),
-                batch_end.strftime('%Y-%m-%d')
-            )
-            total_count += count
-            logger.info(f"导入 {symbol} {start.date()} 到 {batch_end.date()} 数据 {count} 条")
-            start = batch_end + timedelta(days=1)
-
-        logger.info(f"导入 {symbol} 历史数据完成，共 {total_count} 条")
-        return {'symbol': symbol, 'count': total_count}
+        totals = service.backfill(instrument, start_date, end_date)
+        logger.info(f"导入 {symbol} 历史数据完成，新增 {totals['inserted']} 条，更新 {totals['updated']} 条")
+        return {'symbol': symbol, **totals}
     except Exception as e:
         logger.error(f"导入 {symbol} 历史数据失败: {e}")
         raise self.retry(exc=e, countdown=300)
+
+
+@shared_task(bind=True)
+def backfill_all_data(self, start_date, end_date, market_type=None, workers=None):
+    """
+    回补所有活跃标的的历史数据，并发获取，请求速率由共享限流器控制
+    各标的的进度记录在检查点中，失败的标的可以重新执行本任务继续回补
+    """
+    logger.info(f"开始回补历史数据: {start_date} ~ {end_date}")
+    service = MarketDataService()
+
+    instruments = Instrument.objects.filter(is_active=True)
+    if market_type:
+        instruments = instruments.filter(market_type=market_type)
+
+    success_count = 0
+    failed = []
+    inserted = 0
+    for instrument, stats, error in service.backfill_batch(list(instruments), start_date, end_date, workers=workers):
+        if error is not None:
+            failed.append(instrument.symbol)
+            continue
+        success_count += 1
+        inserted += stats['inserted']
+
+    logger.info(f"历史数据回补完成，成功: {success_count}, 失败: {len(failed)}, 新增 {inserted} 条")
+    return {
+        'success': success_count, 'fail': len(failed), 'failed_symbols': failed, 'inserted': inserted,
+        'pipeline': _pipeline_stats(service),
+    }
+
+
+@shared_task(bind=True)
+def repair_kline_gaps(self, period='1d', market_type=None, workers=None, zero_volume=False, force=False):
+    """
+    按K线覆盖索引只重新获取缺失的交易日（定时任务），代替大范围重新导入
+    补到K线的标的全量重算指标、重新合成周期K线
+    :param zero_volume: 同时重新获取成交量为 0 的交易日
+    :param force: 也重新获取已确认数据源没有数据的区间（停牌等）
+    """
+    logger.info(f"开始修补 {period} K线缺口")
+    service = MarketDataService()
+    base = '1d' if period not in KLine.INTRADAY_PERIODS else '1m'
+    periods = [derived for derived in settings.MARKET_DATA_RESAMPLE_PERIODS if base_period(derived) == base]
+
+    instruments = Instrument.objects.filter(is_active=True)
+    if market_type:
+        instruments = instruments.filter(market_type=market_type)
+
+    from apps.technical_analysis.tasks import calculate_indicators_task
+
+    repaired = 0
+    failed = []
+    inserted = 0
+    for instrument, stats, error in service.repair_gaps_batch(
+        list(instruments), period, workers=workers, zero_volume=zero_volume, force=force
+    ):
+        if error is not None:
+            failed.append(instrument.symbol)
+            continue
+        if stats['inserted'] or stats['updated']:
+            repaired += 1
+            inserted += stats['inserted']
+            if period == '1d':
+                calculate_indicators_task.delay(instrument.id)
+            if period == base and periods:
+                resample_klines_task.delay(instrument.id, periods, full=True)
+
+    logger.info(f"K线缺口修补完成，补齐 {repaired} 个标的，新增 {inserted} 条，失败: {len(failed)}")
+    return {
+        'repaired': repaired, 'inserted': inserted, 'fail': len(failed), 'failed_symbols': failed,
+        'pipeline': _pipeline_stats(service),
+    }
+
+
+@shared_task(bind=True, max_retries=3)
+def resample_klines_task(self, instrument_id, periods=None, full=False):
+    """
+    由日线/1分钟线合成周线、月线和分钟周期K线
+    :param periods: 合成的周期，默认 MARKET_DATA_RESAMPLE_PERIODS
+    :param full: 全量合成（基础K线被修改后使用），默认从最后一根合成K线所在的周期开始增量合成
+    """
+    try:
+        service = MarketDataService()
+        instrument = Instrument.objects.get(id=instrument_id)
+        results = {}
+        for period in periods or settings.MARKET_DATA_RESAMPLE_PERIODS:
+            results[period] = service.resample_klines(instrument, period, full=full)
+        logger.info(f"合成 {instrument.symbol} K线完成: {results}")
+        return {'instrument_id': instrument_id, 'periods': results}
+    except Exception as e:
+        logger.error(f"合成标的 {instrument_id} K线失败: {e}")
+        raise self.retry(exc=e, countdown=60)
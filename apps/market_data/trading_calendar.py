@@ -0,0 +1,166 @@
+"""
+交易日历
+
+上交所、深交所和各期货交易所的休市安排相同（期货夜盘归属下一交易日），共用一份交易日历。
+交易日列表来自数据源的 fetch_trade_dates()（akshare 数据源经磁盘缓存），日历范围之外以及取不到交易日历时按工作日处理。
+交易日保存为有序的 datetime64[D] 数组，查询都是二分查找。
+"""
+import bisect
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_REFRESH_SECONDS = 86400  # 进程内交易日历的刷新间隔
+CALENDAR_RETRY_SECONDS = 3600  # 获取失败时的重试间隔
+
+_ONE_DAY = np.timedelta64(1, 'D')
+
+
+def _to_day(value):
+    """date / datetime / 'YYYY-MM-DD' / datetime64 转换为 datetime64[D]"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return np.datetime64(value, 'D')
+
+
+def _to_date(day):
+    return day.astype(date)
+
+
+class TradingCalendar:
+    """交易日历"""
+
+    def __init__(self, sessions=None):
+        """
+        :param sessions: 交易日列表（date 或 YYYY-MM-DD），为空时全部按工作日处理
+        """
+        self.sessions = np.unique(np.array([_to_day(day) for day in sessions or []], dtype='datetime64[D]'))
+        if len(self.sessions):
+            self.first_known = self.sessions[0]
+            self.last_known = self.sessions[-1]
+        else:
+            self.first_known = self.last_known = None
+
+    def _session_days(self, start, end):
+        """[start, end] 内的交易日（datetime64[D] 数组）"""
+        if start > end:
+            return np.array([], dtype='datetime64[D]')
+        if self.first_known is None:
+            days = np.arange(start, end + _ONE_DAY)
+            return days[np.is_busday(days)]
+
+        parts = []
+        if start < self.first_known:
+            days = np.arange(start, min(end, self.first_known - _ONE_DAY) + _ONE_DAY)
+            parts.append(days[np.is_busday(days)])
+        left = np.searchsorted(self.sessions, start, 'left')
+        right = np.searchsorted(self.sessions, end, 'right')
+        parts.append(self.sessions[left:right])
+        if end > self.last_known:
+            days = np.arange(max(start, self.last_known + _ONE_DAY), end + _ONE_DAY)
+            parts.append(days[np.is_busday(days)])
+        return np.concatenate(parts)
+
+    def is_session(self, day):
+        """是否为交易日"""
+        day = _to_day(day)
+        return len(self._session_days(day, day)) == 1
+
+    def sessions_between(self, start, end):
+        """[start, end] 内的全部交易日（含两端），返回 date 列表"""
+        return [_to_date(day) for day in self._session_days(_to_day(start), _to_day(end))]
+
+    def next_session(self, day):
+        """day 之后（不含 day）的第一个交易日"""
+        day = _to_day(day)
+        # 连续休市不会超过一个月，找不到时继续往后找
+        while True:
+            days = self._session_days(day + _ONE_DAY, day + 31 * _ONE_DAY)
+            if len(days):
+                return _to_date(days[0])
+            day += 31 * _ONE_DAY
+
+    def previous_session(self, day):
+        """day 之前（不含 day）的最后一个交易日"""
+        day = _to_day(day)
+        while True:
+            days = self._session_days(day - 31 * _ONE_DAY, day - _ONE_DAY)
+            if len(days):
+                return _to_date(days[-1])
+            day -= 31 * _ONE_DAY
+
+    def last_session(self, day=None):
+        """不晚于 day（默认今天）的最后一个交易日"""
+        return self.previous_session(_to_day(day or date.today()) + _ONE_DAY)
+
+    def last_sessions(self, days):
+        """
+        向量化的 last_session：每个日期不晚于它的最后一个交易日
+        :param days: datetime64[D] 数组
+        :return: datetime64[D] 数组
+        """
+        days = np.asarray(days, dtype='datetime64[D]')
+        result = np.busday_offset(days, 0, roll='backward')
+        if self.first_known is None:
+            return result
+        known = (days >= self.first_known) & (days <= self.last_known)
+        result[known] = self.sessions[np.searchsorted(self.sessions, days[known], 'right') - 1]
+        # 日历之后的日期按工作日处理，但不早于日历中的最后一个交易日
+        after = days > self.last_known
+        result[after] = np.maximum(result[after], self.last_known)
+        return result
+
+    def missing_sessions(self, dates, start, end):
+        """
+        [start, end] 内不在 dates 中的交易日（用于检测K线缺口）
+        :param dates: 已有的日期（date 列表或 datetime64 数组）
+        :return: date 列表
+        """
+        sessions = self._session_days(_to_day(start), _to_day(end))
+        observed = np.asarray(dates, dtype='datetime64[D]')
+        return [_to_date(day) for day in sessions[~np.isin(sessions, observed)]]
+
+    def session_chunks(self, start, end, chunk_days):
+        """
+        把 [start, end] 内的交易日切分为跨度不超过 chunk_days 个自然日的区间，没有交易日的部分被跳过
+        :return: [(第一个交易日, 最后一个交易日), ...]
+        """
+        sessions = self.sessions_between(start, end)
+        chunks = []
+        i = 0
+        while i < len(sessions):
+            j = bisect.bisect_right(sessions, sessions[i] + timedelta(days=chunk_days - 1), i)
+            chunks.append((sessions[i], sessions[j - 1]))
+            i = j
+        return chunks
+
+
+_calendar = None
+_calendar_expires = 0.
+_calendar_lock = threading.Lock()
+
+
+def get_trading_calendar():
+    """进程内共享的交易日历，从 MARKET_DATA_SOURCE 配置的数据源加载，每天刷新一次"""
+    global _calendar, _calendar_expires
+    with _calendar_lock:
+        if _calendar is None or time.monotonic() > _calendar_expires:
+            from .sources import get_data_source
+            try:
+                dates = get_data_source().fetch_trade_dates()
+            except Exception as e:
+                logger.error(f"获取交易日历失败: {e}")
+                dates = []
+
+            if dates:
+                _calendar = TradingCalendar(dates)
+                _calendar_expires = time.monotonic() + CALENDAR_REFRESH_SECONDS
+            else:
+                logger.warning("未获取到交易日历，按工作日处理")
+                _calendar = _calendar or TradingCalendar()
+                _calendar_expires = time.monotonic() + CALENDAR_RETRY_SECONDS
+    return _calendar
@@ -1,10 +1,27 @@
+from datetime import date
+from django.conf import settings
+from django.db.models import CharField, FloatField
+from django.db.models.functions import Cast
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from apps.api import renderers
 from .models import Instrument, KLine
 from .serializers import InstrumentSerializer, KLineSerializer
 
+# 序列接口的数组名 -> 查询表达式：价格在数据库中转换为浮点数，日期、时间转换为字符串，不在 Python 中逐个转换
+SERIES_COLUMNS = {
+    'dates': Cast('trade_date', CharField()),
+    'o': Cast('open_price', FloatField()),
+    'h': Cast('high_price', FloatField()),
+    'l': Cast('low_price', FloatField()),
+    'c': Cast('close_price', FloatField()),
+    'v': 'volume',
+}
+SERIES_RENDERERS = [JSONRenderer] + ([renderers.MessagePackRenderer] if renderers.AVAILABLE else [])
+
 
 class InstrumentViewSet(viewsets.ModelViewSet):
     queryset = Instrument.objects.all()
@@ -25,6 +42,86 @@ class KLineViewSet(viewsets.ModelViewSet):
     ordering_fields = ['trade_date', 'trade_time', 'created_at']
     ordering = ['-trade_date', '-trade_time']
 
+    @action(
+        detail=False, methods=['get'], url_path='series',
+        renderer_classes=SERIES_RENDERERS, filter_backends=[], pagination_class=None,
+    )
+    def series(self, request):
+        """
+        图表用的列式K线序列：一次返回标的、周期、日期区间内的全部K线，各字段为等长数组（按时间升序）
+        不经过序列化器、不分页，价格为数值；分钟周期另有 times 数组
+        参数：instrument（标的ID）或 symbol，period（默认 1d），start_date / end_date（YYYY-MM-DD），
+        limit（区间内最近N根，不超过 MARKET_DATA_SERIES_MAX_BARS），
+        indicators（逗号分隔的指标列，如 ma5,macd,rsi，按K线对齐放在 indicators 中，未计算为 null）
+        区间内更早的K线因数量限制未返回时 truncated 为 true
+        安装 msgpack 后可用 Accept: application/msgpack 或 ?format=msgpack 获取 MessagePack
+        """
+        from apps.technical_analysis.models import IndicatorValue
+
+        params = request.query_params
+        period = params.get('period', '1d')
+        if period not in dict(KLine.PERIODS):
+            return Response({'error': f'不支持的周期: {period}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        instrument_id = params.get('instrument')
+        if params.get('symbol'):
+            instrument_id = Instrument.objects.filter(symbol=params['symbol']).values_list('id', flat=True).first()
+            if instrument_id is None:
+                return Response({'error': f"标的 {params['symbol']} 不存在"}, status=status.HTTP_404_NOT_FOUND)
+        if not instrument_id:
+            return Response({'error': '请指定 instrument 或 symbol'}, status=status.HTTP_400_BAD_REQUEST)
+
+        indicators = [name.strip().lower() for name in params.get('indicators', '').split(',') if name.strip()]
+        unknown = [name for name in indicators if name not in IndicatorValue.value_fields()]
+        if unknown:
+            return Response({'error': f"不支持的指标列: {', '.join(unknown)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        max_bars = getattr(settings, 'MARKET_DATA_SERIES_MAX_BARS', 50000)
+        try:
+            instrument_id = int(instrument_id)
+            start_date = date.fromisoformat(params['start_date']) if params.get('start_date') else None
+            end_date = date.fromisoformat(params['end_date']) if params.get('end_date') else None
+            limit = max(min(int(params.get('limit', max_bars)), max_bars), 0)
+        except ValueError as e:
+            return Response({'error': f'参数错误: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = KLine.objects.filter(instrument_id=instrument_id, period=period)
+        if start_date:
+            queryset = queryset.filter(trade_date__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(trade_date__lte=end_date)
+
+        columns = {'dates': SERIES_COLUMNS['dates']}
+        if period in KLine.INTRADAY_PERIODS:
+            columns['times'] = Cast('trade_time', CharField())
+        columns.update(SERIES_COLUMNS)
+        names = list(columns)
+        expressions = {name: expression for name, expression in columns.items() if not isinstance(expression, str)}
+        # 指标列来自指标宽表（LEFT JOIN），没有指标的K线为 null
+        fields = [f'series_{name}' if name in expressions else columns[name] for name in names]
+        fields += [f'indicator_value__{name}' for name in indicators]
+        # 多取一根判断区间是否被截断
+        rows = list(
+            queryset.order_by('-trade_date', '-trade_time').annotate(**{
+                f'series_{name}': expression for name, expression in expressions.items()
+            }).values_list(*fields)[:limit + 1]
+        )
+        truncated = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+        arrays = [list(values) for values in zip(*rows)] if rows else [[] for _ in fields]
+
+        data = {
+            'instrument': instrument_id,
+            'period': period,
+            'count': len(rows),
+            'truncated': truncated,
+            **dict(zip(names, arrays)),
+        }
+        if indicators:
+            data['indicators'] = dict(zip(indicators, arrays[len(names):]))
+        return Response(data)
+
     @action(detail=False, methods=['post'], url_path='batch-import')
     def batch_import(self, request):
         """批量导入K线数据"""
@@ -3,7 +3,7 @@ from decimal import Decimal
 from datetime import date
 from apps.review.models import ReviewRecord, TradeLog
 from apps.market_data.models import Instrument, KLine
-from apps.technical_analysis.models import Pattern, SupportResistance, Indicator
+from apps.technical_analysis.models import Pattern, SupportResistance, IndicatorValue
 
 
 class ReviewService:
@@ -78,14 +78,11 @@ class ReviewService:
         ).first()
 
         if kline:
-            indicator = Indicator.objects.filter(
-                kline=kline,
-                indicator_type='MA'
-            ).first()
-
-            if indicator and indicator.indicator_data:
-                ma20 = indicator.indicator_data.get('MA20')
-                ma60 = indicator.indicator_data.get('MA60')
+            indicator = IndicatorValue.objects.filter(kline=kline).first()
+
+            if indicator:
+                ma20 = indicator.ma20
+                ma60 = indicator.ma60
 
                 if ma20 and ma60:
                     close_price = float(kline.close_price)
@@ -0,0 +1,289 @@
+"""
+技术分析热点路径的基准测试
+
+使用确定性的合成K线数据，对每个指标、每个形态识别方法以及服务层端到端调用（含数据库写入）计时，
+由 benchmark_technical_analysis 命令调用，结果为可JSON序列化的 dict，便于不同版本之间对比。
+"""
+import platform
+import statistics
+import time
+from datetime import date
+import numpy as np
+import pandas as pd
+from django.db import connection, transaction
+from apps.market_data.models import Instrument, KLine
+from .indicators import IndicatorCalculator, stored_indicator_types
+from .models import IndicatorValue, IndicatorState
+from .panel import PanelIndicatorCalculator
+from .pattern_recognition import PatternRecognizer
+from .services import TechnicalAnalysisService
+
+
+# 数据规模：名称 -> (标的数, 每个标的的K线数)
+SIZES = {
+    '250': (1, 250),
+    '5k': (1, 5000),
+    '20k': (1, 20000),
+    '1kx3k': (1000, 3000),
+}
+
+PATTERN_METHODS = ['detect_trend', 'detect_support_resistance', 'detect_double_top_bottom', 'detect_head_shoulder']
+
+BENCHMARK_SYMBOL_PREFIX = 'BENCH'
+
+
+def synthetic_ohlcv(bars, instruments=1, seed=0, end=None):
+    """
+    生成确定性的合成日K线（几何随机游走），相同参数每次结果相同
+    :param bars: 每个标的的K线数
+    :param instruments: 标的数
+    :param seed: 随机种子
+    :param end: 最后一根K线的日期，默认今天
+    :return: 长表 DataFrame，列为 instrument, date, open, high, low, close, volume，按标的、日期排序
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=end or date.today(), periods=bars)
+
+    base = rng.uniform(5, 200, instruments)
+    close = base * np.exp(np.cumsum(rng.normal(0.0002, 0.02, (bars, instruments)), axis=0))
+    open_ = close * (1 + rng.normal(0, 0.005, (bars, instruments)))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, (bars, instruments))))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, (bars, instruments))))
+    volume = rng.integers(100_000, 10_000_000, (bars, instruments))
+
+    # 与数据库 Decimal 字段一致，价格保留两位小数
+    return pd.DataFrame({
+        'instrument': np.repeat(np.arange(instruments), bars),
+        'date': np.tile(dates.values, instruments),
+        'open': np.round(open_.T.reshape(-1), 2),
+        'high': np.round(high.T.reshape(-1), 2),
+        'low': np.round(low.T.reshape(-1), 2),
+        'close': np.round(close.T.reshape(-1), 2),
+        'volume': volume.T.reshape(-1),
+    })
+
+
+def environment():
+    """运行环境信息，写入结果的 meta 部分"""
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'database': connection.vendor,
+        'machine': platform.machine(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def measure(func, repeat, setup=None):
+    """
+    重复执行并计时（setup 不计入耗时）
+    :return: 每次耗时（秒）的列表
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _result(name, size, timings):
+    instruments, bars = SIZES[size]
+    return {
+        'name': name,
+        'size': size,
+        'instruments': instruments,
+        'bars': bars,
+        'repeat': len(timings),
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+    }
+
+
+def _single_frame(df):
+    """单个标的的长表转换为 IndicatorCalculator 使用的按日期索引的 DataFrame"""
+    return df.drop(columns='instrument').set_index('date')
+
+
+def run_compute(size, repeat=3, seed=0):
+    """
+    纯计算基准：每个指标、全部指标序列、状态导出以及形态识别
+    单标的规模使用 IndicatorCalculator，多标的规模使用 PanelIndicatorCalculator
+    """
+    instruments, bars = SIZES[size]
+    df = synthetic_ohlcv(bars, instruments, seed)
+    results = []
+
+    if instruments == 1:
+        frame = _single_frame(df)
+
+        def calculator():
+            return IndicatorCalculator(frame)
+    else:
+        def calculator():
+            return PanelIndicatorCalculator(df)
+
+    # 每次使用新的计算器，不复用中间量缓存
+    for name in stored_indicator_types():
+        results.append(_result(
+            f'indicator.{name}', size,
+            measure(lambda: calculator().calculate_series(name), repeat)
+        ))
+
+    def all_series():
+        calc = calculator()
+        series = calc.calculate_all_series(stored_indicator_types())
+        if instruments == 1:
+            calc.to_records(series, start=TechnicalAnalysisService.MIN_DATA_POINTS - 1)
+            calc.export_state()
+        else:
+            calc.to_records_by_instrument(series, start=TechnicalAnalysisService.MIN_DATA_POINTS - 1)
+            calc.export_states()
+
+    results.append(_result('indicator.all_series', size, measure(all_series, repeat)))
+
+    frames = [frame] if instruments == 1 else [
+        _single_frame(group) for _, group in df.groupby('instrument', sort=False)
+    ]
+    for method in PATTERN_METHODS:
+        results.append(_result(
+            f'pattern.{method}', size,
+            measure(lambda: [getattr(PatternRecognizer(f), method)() for f in frames], repeat)
+        ))
+
+    return results
+
+
+def _create_klines(df):
+    """写入合成K线，返回 {标的序号: 标的ID}"""
+    instrument_ids = {}
+    for number in df['instrument'].unique():
+        instrument = Instrument.objects.create(
+            symbol=f'{BENCHMARK_SYMBOL_PREFIX}{number:05d}',
+            name=f'基准测试{number}',
+            market_type='STOCK',
+            exchange='SZSE',
+        )
+        instrument_ids[int(number)] = instrument.id
+
+    KLine.objects.bulk_create([
+        KLine(
+            instrument_id=instrument_ids[row.instrument],
+            period='1d',
+            trade_date=row.date.date(),
+            open_price=row.open,
+            high_price=row.high,
+            low_price=row.low,
+            close_price=row.close,
+            volume=row.volume,
+        )
+        for row in df.itertuples(index=False)
+    ], batch_size=5000)
+    return instrument_ids
+
+
+def _reset_indicators(instrument_ids):
+    IndicatorValue.objects.filter(instrument_id__in=instrument_ids).delete()
+    IndicatorState.objects.filter(instrument_id__in=instrument_ids).delete()
+
+
+def run_database(size, repeat=3, seed=0):
+    """
+    服务层端到端基准（读取K线、计算、写入指标宽表/形态/支撑阻力位）
+    在事务中执行并在结束时回滚，不会在数据库中留下数据
+    """
+    instruments, bars = SIZES[size]
+    df = synthetic_ohlcv(bars, instruments, seed)
+    service = TechnicalAnalysisService
+    results = []
+
+    with transaction.atomic():
+        start = time.perf_counter()
+        ids = list(_create_klines(df).values())
+        results.append(_result('db.kline_bulk_create', size, [time.perf_counter() - start]))
+
+        if instruments == 1:
+            instrument_id = ids[0]
+
+            def calculate():
+                service.calculate_and_save_indicators(instrument_id)
+
+            results.append(_result(
+                'service.calculate_and_save_indicators.cold', size,
+                measure(calculate, repeat, setup=lambda: _reset_indicators(ids))
+            ))
+            results.append(_result(
+                'service.calculate_and_save_indicators.unchanged', size, measure(calculate, repeat)
+            ))
+
+            # 增量更新：把状态回退到 20 根K线之前
+            rows = list(KLine.objects.filter(instrument_id=instrument_id, period='1d')
+                        .order_by('trade_date').values(*service.KLINE_FIELDS))
+            prefix_state = IndicatorCalculator(service._indicator_dataframe(rows[:-20])).export_state()
+
+            def rewind():
+                for name in stored_indicator_types():
+                    IndicatorState.objects.filter(instrument_id=instrument_id, period='1d', indicator_type=name).update(
+                        last_kline_id=rows[-21]['id'], state=prefix_state.get(name, {})
+                    )
+
+            results.append(_result(
+                'service.update_indicators', size,
+                measure(lambda: service.update_indicators(instrument_id), repeat, setup=rewind)
+            ))
+            results.append(_result(
+                'service.detect_and_save_patterns', size,
+                measure(lambda: service.detect_and_save_patterns(instrument_id), repeat)
+            ))
+            results.append(_result(
+                'service.update_support_resistance', size,
+                measure(lambda: service.update_support_resistance(instrument_id), repeat)
+            ))
+        else:
+            def calculate_panel():
+                for i in range(0, len(ids), service.PANEL_SIZE):
+                    service.calculate_indicators_panel(ids[i:i + service.PANEL_SIZE])
+
+            results.append(_result(
+                'service.calculate_indicators_panel.cold', size,
+                measure(calculate_panel, repeat, setup=lambda: _reset_indicators(ids))
+            ))
+            results.append(_result(
+                'service.calculate_indicators_panel.unchanged', size, measure(calculate_panel, repeat)
+            ))
+
+        transaction.set_rollback(True)
+
+    for result in results:
+        result['database'] = connection.vendor
+    return results
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    与基准结果对比（按中位数）
+    :param results: 本次结果列表
+    :param baseline: 之前保存的完整结果（含 results）
+    :param threshold: 变化比例超过该值时，变慢记为 'regressed'，变快记为 'improved'，否则为 'unchanged'
+    :return: [(名称, 规模, 基准中位数, 本次中位数, 变化比例, 状态), ...]，按变化比例从大到小排列
+    """
+    previous = {(item['name'], item['size']): item for item in baseline.get('results', [])}
+    changes = []
+    for item in results:
+        old = previous.get((item['name'], item['size']))
+        if not old or not old['median']:
+            continue
+        ratio = item['median'] / old['median'] - 1
+        if ratio > threshold:
+            status = 'regressed'
+        elif ratio < -threshold:
+            status = 'improved'
+        else:
+            status = 'unchanged'
+        changes.append((item['name'], item['size'], old['median'], item['median'], ratio, status))
+    changes.sort(key=lambda change: change[4], reverse=True)
+    return changes
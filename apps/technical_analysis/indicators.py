@@ -1,5 +1,141 @@
 import pandas as pd
 import numpy as np
+from . import kernels
+
+
+class Indicator:
+    """
+    指标定义：所需的K线字段、默认参数、序列计算函数，以及可选的存储列和增量状态钩子
+    - func(calculator, **params)：返回 {列名: (序列, 最少K线数)}，
+      通过 calculator.rolling / calculator.ewm 等获取共享的中间量
+    - columns：{列名: IndicatorValue 字段名}，为 None 时只在内存中计算，不持久化
+    - export(calculator, **params)：返回最后一根K线处的递推状态树，叶子为按列排列的数组
+      （单标的时长度为1；面板计算时每列对应一个标的），(值, 权重) 元组为 EWM 状态
+    - resume(calculator, state, start, **params)：从状态继续计算 start 之后的K线，
+      返回 ({列名: (序列, 最少K线数)}, 新状态)
+    没有状态钩子的指标（窗口类）增量计算时在已计算的尾部K线上重新计算
+    """
+
+    def __init__(self, name, func, inputs, params, columns=None, export=None, resume=None):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = params
+        self.columns = columns
+        self.export = export
+        self.resume = resume
+
+
+# 已注册的指标，按注册顺序排列
+INDICATORS = {}
+
+
+def register_indicator(name, inputs=('close',), columns=None, export=None, resume=None, **params):
+    """
+    注册指标的装饰器，注册后即可被 calculate_series / calculate_all_series 计算
+    :param name: 指标类型（小写）
+    :param inputs: 依赖的K线字段
+    :param columns: 结果列到 IndicatorValue 字段的映射，声明后才会持久化到宽表
+    :param export: 导出递推状态的钩子，与 resume 成对声明后才按状态增量计算
+    :param resume: 从递推状态继续计算的钩子
+    :param params: 默认参数
+    """
+    if (export is None) != (resume is None):
+        raise ValueError(f"指标 {name} 的 export 和 resume 必须同时声明")
+
+    def decorator(func):
+        INDICATORS[name] = Indicator(name, func, inputs, params, columns, export, resume)
+        return func
+    return decorator
+
+
+def stored_indicator_types():
+    """声明了存储列、结果持久化到 IndicatorValue 宽表的指标类型，按注册顺序排列"""
+    return [name for name, indicator in INDICATORS.items() if indicator.columns]
+
+
+def normalize_indicator_types(indicator_types=None):
+    """
+    规范化要计算的指标类型（不区分大小写，按注册顺序返回），None 或空表示全部已注册的指标
+    :raises ValueError: 包含未知的指标类型
+    """
+    if not indicator_types:
+        return list(INDICATORS)
+    wanted = {indicator_type.lower() for indicator_type in indicator_types}
+    unknown = wanted - set(INDICATORS)
+    if unknown:
+        raise ValueError(f"未知的指标类型: {', '.join(sorted(unknown))}")
+    return [indicator_type for indicator_type in INDICATORS if indicator_type in wanted]
+
+
+def _ewm_alpha(span=None, com=None):
+    """按 pandas 的方式换算 ewm 的平滑系数"""
+    if span is not None:
+        com = (span - 1) / 2.0
+    return 1. / (1. + com)
+
+
+def _ewm_continue(values, state, alpha):
+    """
+    从已保存的状态继续计算 ewm(adjust=False)
+    逐步复现 pandas 的递推（含缺失值处理），保证与全量计算结果一致
+    :param values: 新的输入值
+    :param state: [上一个输出值, 权重]，初始状态为 [None, 1.0]
+    :return: (输出序列, 新状态)
+    """
+    weighted, old_wt = state
+    weighted = np.nan if weighted is None else weighted
+    result = np.empty(len(values))
+
+    for i, cur in enumerate(values):
+        is_observation = cur == cur
+        if weighted == weighted:
+            old_wt *= 1. - alpha
+            if is_observation:
+                if weighted != cur:
+                    weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+                old_wt = 1.
+        elif is_observation:
+            weighted = cur
+        result[i] = weighted
+
+    return result, [_float_or_none(weighted), old_wt]
+
+
+def _ewm_weight(values, alpha):
+    """
+    ewm(adjust=False) 在最后一个位置的权重：出现过观测值后，末尾每个缺失值衰减一次
+    与 _ewm_continue 的逐步计算一致
+    :param values: Series 或 DataFrame（按列分别计算）
+    :return: 按列排列的权重数组
+    """
+    observed = np.asarray(values.notna(), dtype=bool).reshape(len(values), -1)
+    has_observation = observed.any(axis=0)
+    last_observed = len(observed) - 1 - np.argmax(observed[::-1], axis=0)
+    trailing = np.where(has_observation, len(observed) - 1 - last_observed, 0)
+
+    weight = np.ones(observed.shape[1])
+    for step in range(int(trailing.max(initial=0))):
+        weight = np.where(trailing > step, weight * (1. - alpha), weight)
+    return weight
+
+
+def _float_or_none(value):
+    """NaN 转换为 None，便于JSON序列化"""
+    return None if value != value else float(value)
+
+
+def _last(values):
+    """最后一行的值，按列排列的数组"""
+    return np.asarray(values.iloc[-1:], dtype=float).reshape(-1)
+
+
+def _ewm_state(calc, source, **params):
+    """
+    ewm(adjust=False) 最后一行的状态 (值, 权重)，与 _ewm_continue 的状态一致
+    与序列计算使用相同的 span/com 参数（pandas 会把 alpha 换算回 com，直接传 alpha 结果会有末位差异）
+    """
+    return _last(calc.ewm(source, **params)), _ewm_weight(calc.source(source), _ewm_alpha(**params))
 
 
 class IndicatorCalculator:
@@ -10,98 +146,423 @@ class IndicatorCalculator:
         """
         self.df = df.copy()
         self.df = self.df.sort_index()  # 确保按日期排序
+        self.min_lengths = {}  # 序列列名 -> 该列有效所需的最少K线数
+        self._cache = {}  # 中间量缓存，见 intermediate()
 
-    def calculate_ma(self, periods=[5, 10, 20, 60]):
-        """计算移动平均线"""
-        result = {}
-        for period in periods:
-            if len(self.df) >= period:
-                result[f'ma{period}'] = float(self.df['close'].rolling(window=period).mean().iloc[-1])
-        return result
+    # ---- 共享中间量：同一序列上每个中间量只计算一次 ----
 
-    def calculate_ema(self, periods=[12, 26]):
-        """计算指数移动平均"""
-        result = {}
-        for period in periods:
-            if len(self.df) >= period:
-                result[f'ema{period}'] = float(self.df['close'].ewm(span=period, adjust=False).mean().iloc[-1])
-        return result
+    def intermediate(self, key, compute):
+        """
+        按 key 缓存中间量，compute 只在第一次请求时调用
+        :param key: 可哈希的元组，如 ('rolling', 'close', 20, 'mean')
+        """
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
 
-    def calculate_macd(self, fast=12, slow=26, signal=9):
-        """计算MACD"""
-        if len(self.df) < slow:
-            return {}
+    def source(self, key):
+        """取输入序列：字符串为K线字段，元组为已计算的中间量"""
+        if isinstance(key, str):
+            return self.df[key]
+        return self._cache[key]
+
+    def rolling(self, source, window, how='mean'):
+        """滚动窗口统计（mean / std / min / max 等），使用 kernels 中的 O(n) 内核"""
+        def compute():
+            values = self.source(source)
+            result = kernels.ROLLING_KERNELS[how](values.to_numpy(dtype=float), window)
+            if isinstance(values, pd.DataFrame):
+                return pd.DataFrame(result, index=values.index, columns=values.columns)
+            return pd.Series(result, index=values.index, name=values.name)
+        return self.intermediate(('rolling', source, window, how), compute)
+
+    def extrema(self, source, order, kind='max'):
+        """局部极值的位置（见 kernels.local_extrema），按参数缓存"""
+        return self.intermediate(
+            ('extrema', source, order, kind),
+            lambda: kernels.local_extrema(self.source(source).to_numpy(dtype=float), order, kind)
+        )
+
+    def ewm(self, source, **params):
+        """指数加权均值 ewm(adjust=False)，params 为 span 或 com"""
+        return self.intermediate(
+            ('ewm', source) + tuple(sorted(params.items())),
+            lambda: self.source(source).ewm(adjust=False, **params).mean()
+        )
 
-        ema_fast = self.df['close'].ewm(span=fast, adjust=False).mean()
-        ema_slow = self.df['close'].ewm(span=slow, adjust=False).mean()
-        macd_line = ema_fast - ema_slow
-        signal_line = macd_line.ewm(span=signal, adjust=False).mean()
-        histogram = macd_line - signal_line
+    def macd_line(self, fast, slow):
+        """MACD 快慢线之差，中间量 key 为 ('macd_line', fast, slow)"""
+        return self.intermediate(
+            ('macd_line', fast, slow),
+            lambda: self.ewm('close', span=fast) - self.ewm('close', span=slow)
+        )
+
+    def price_changes(self):
+        """收盘价涨跌幅拆分为上涨和下跌部分，中间量 key 为 ('gain',)、('loss',)"""
+        delta = self.intermediate(('delta',), lambda: self.df['close'].diff())
+        gain = self.intermediate(('gain',), lambda: delta.where(delta > 0, 0))
+        loss = self.intermediate(('loss',), lambda: -delta.where(delta < 0, 0))
+        return gain, loss
+
+    def rsv(self, n):
+        """KDJ 的未成熟随机值，中间量 key 为 ('rsv', n)"""
+        def compute():
+            low_list = self.rolling('low', n, 'min')
+            high_list = self.rolling('high', n, 'max')
+            return (self.df['close'] - low_list) / (high_list - low_list) * 100
+        return self.intermediate(('rsv', n), compute)
+
+    def kdj_k(self, n, m1):
+        """KDJ 的 K 值，中间量 key 为 ('kdj_k', n, m1)"""
+        self.rsv(n)
+        return self.intermediate(('kdj_k', n, m1), lambda: self.ewm(('rsv', n), com=m1-1))
+
+    # ---- 指标计算 ----
+
+    def calculate_series(self, name, **params):
+        """
+        计算已注册指标的完整序列
+        :param name: 指标类型（小写）
+        :param params: 覆盖注册时的默认参数
+        :return: DataFrame，索引与 self.df 对齐
+        """
+        indicator = INDICATORS[name]
+        fields = set(self.df.columns.get_level_values(0))
+        missing = [field for field in indicator.inputs if field not in fields]
+        if missing:
+            raise ValueError(f"指标 {name} 缺少K线字段: {', '.join(missing)}")
+        return self._series_frame(indicator.func(self, **{**indicator.params, **params}))
 
+    def _last_values(self, frame):
+        """取序列最后一根K线的值（数据不足的列省略）"""
         return {
-            'macd': float(macd_line.iloc[-1]),
-            'signal': float(signal_line.iloc[-1]),
-            'histogram': float(histogram.iloc[-1])
+            col: float(frame[col].iloc[-1])
+            for col in frame.columns
+            if len(self.df) >= self.min_lengths[col]
         }
 
-    def calculate_rsi(self, period=14):
-        """计算RSI"""
-        if len(self.df) < period + 1:
-            return {}
+    def calculate_ma(self, **params):
+        """计算移动平均线"""
+        return self._last_values(self.calculate_ma_series(**params))
 
-        delta = self.df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+    def calculate_ema(self, **params):
+        """计算指数移动平均"""
+        return self._last_values(self.calculate_ema_series(**params))
 
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
+    def calculate_macd(self, **params):
+        """计算MACD"""
+        return self._last_values(self.calculate_macd_series(**params))
 
-        return {'rsi': float(rsi.iloc[-1])}
+    def calculate_rsi(self, **params):
+        """计算RSI"""
+        return self._last_values(self.calculate_rsi_series(**params))
 
-    def calculate_kdj(self, n=9, m1=3, m2=3):
+    def calculate_kdj(self, **params):
         """计算KDJ"""
-        if len(self.df) < n:
-            return {}
+        return self._last_values(self.calculate_kdj_series(**params))
 
-        low_list = self.df['low'].rolling(window=n).min()
-        high_list = self.df['high'].rolling(window=n).max()
+    def calculate_bollinger_bands(self, **params):
+        """计算布林带"""
+        return self._last_values(self.calculate_bollinger_bands_series(**params))
 
-        rsv = (self.df['close'] - low_list) / (high_list - low_list) * 100
+    def calculate_all(self, indicator_types=None):
+        """
+        计算所有指标（最后一根K线的值）
+        :param indicator_types: 只计算指定的指标类型（如 ['RSI', 'MACD']），默认全部已注册的指标
+        """
+        series = self.calculate_all_series(indicator_types)
+        return {name: self._last_values(frame) for name, frame in series.items()}
 
-        k = rsv.ewm(com=m1-1, adjust=False).mean()
-        d = k.ewm(com=m2-1, adjust=False).mean()
-        j = 3 * k - 2 * d
+    # ---- 序列模式：一次向量化计算出与K线对齐的完整指标序列 ----
 
-        return {
-            'k': float(k.iloc[-1]),
-            'd': float(d.iloc[-1]),
-            'j': float(j.iloc[-1])
-        }
+    def _series_frame(self, columns):
+        """
+        组装序列结果，并记录每列所需的最少K线数
+        :param columns: {列名: (序列, 最少K线数)}
+        """
+        frame = pd.DataFrame(index=self.df.index)
+        for name, (values, min_length) in columns.items():
+            frame[name] = values
+            self.min_lengths[name] = min_length
+        return frame
 
-    def calculate_bollinger_bands(self, period=20, std=2):
-        """计算布林带"""
-        if len(self.df) < period:
-            return {}
+    def calculate_ma_series(self, **params):
+        """计算移动平均线完整序列"""
+        return self.calculate_series('ma', **params)
 
-        ma = self.df['close'].rolling(window=period).mean()
-        std_dev = self.df['close'].rolling(window=period).std()
+    def calculate_ema_series(self, **params):
+        """计算指数移动平均完整序列"""
+        return self.calculate_series('ema', **params)
 
-        upper = ma + (std_dev * std)
-        lower = ma - (std_dev * std)
+    def calculate_macd_series(self, **params):
+        """计算MACD完整序列"""
+        return self.calculate_series('macd', **params)
 
-        return {
-            'upper': float(upper.iloc[-1]),
-            'middle': float(ma.iloc[-1]),
-            'lower': float(lower.iloc[-1])
-        }
+    def calculate_rsi_series(self, **params):
+        """计算RSI完整序列"""
+        return self.calculate_series('rsi', **params)
 
-    def calculate_all(self):
-        """计算所有指标"""
-        return {
-            'ma': self.calculate_ma(),
-            'ema': self.calculate_ema(),
-            'macd': self.calculate_macd(),
-            'rsi': self.calculate_rsi(),
-            'kdj': self.calculate_kdj(),
-            'boll': self.calculate_bollinger_bands()
+    def calculate_kdj_series(self, **params):
+        """计算KDJ完整序列"""
+        return self.calculate_series('kdj', **params)
+
+    def calculate_bollinger_bands_series(self, **params):
+        """计算布林带完整序列"""
+        return self.calculate_series('boll', **params)
+
+    def calculate_all_series(self, indicator_types=None):
+        """
+        一次向量化计算所有指标的完整序列，指标之间共享的中间量只计算一次
+        :param indicator_types: 只计算指定的指标类型，默认全部已注册的指标
+        :return: {指标: DataFrame}，索引与 self.df 对齐
+        """
+        return {name: self.calculate_series(name) for name in normalize_indicator_types(indicator_types)}
+
+    def to_records(self, series, start=0):
+        """
+        将完整序列拆分为逐根K线的指标数据
+        第 i 条记录与对 df.iloc[:i+1] 调用 calculate_all 的结果一致（数据不足的列/指标被省略）
+        :param series: calculate_all_series 的返回值
+        :param start: 起始位置
+        :return: list，按位置排列的 {指标: 指标数据}
+        """
+        columns = {
+            name: (list(frame.columns), frame.to_numpy(dtype=float),
+                   [self.min_lengths[col] for col in frame.columns])
+            for name, frame in series.items()
         }
+
+        records = []
+        for i in range(start, len(self.df)):
+            record = {}
+            for name, (cols, values, min_lengths) in columns.items():
+                record[name] = {
+                    col: float(values[i, j])
+                    for j, col in enumerate(cols)
+                    if i + 1 >= min_lengths[j]
+                }
+            records.append(record)
+        return records
+
+    # ---- 增量模式：从保存的递推状态继续，只计算新增K线 ----
+
+    def align(self, values, start):
+        """新增部分的结果对齐到完整索引，已计算部分留空（供 resume 钩子使用）"""
+        full = np.full(len(self.df), np.nan)
+        full[start:] = values
+        return pd.Series(full, index=self.df.index)
+
+    def _state_arrays(self, indicator_types=None):
+        """
+        向量化计算最后一行的递推状态：{指标: export 钩子返回的状态树}，没有状态钩子的指标省略
+        """
+        arrays = {}
+        for name in normalize_indicator_types(indicator_types):
+            indicator = INDICATORS[name]
+            if indicator.export is not None:
+                arrays[name] = indicator.export(self, **indicator.params)
+        return arrays
+
+    @staticmethod
+    def _pick_state(arrays, column):
+        """从 _state_arrays 的结果中取出某一列的状态，转换为可JSON序列化的 dict"""
+        def pick(node):
+            if isinstance(node, dict):
+                return {key: pick(value) for key, value in node.items()}
+            if isinstance(node, tuple):
+                value, weight = node
+                return [_float_or_none(value[column]), float(weight[column])]
+            return _float_or_none(node[column])
+        return pick(arrays)
+
+    def export_state(self, indicator_types=None):
+        """
+        导出最后一根K线处各指标的递推状态，供 calculate_incremental 继续计算
+        :param indicator_types: 只导出指定的指标类型，默认全部已注册的指标
+        :return: 可JSON序列化的 dict，{指标: 状态}
+        """
+        return self._pick_state(self._state_arrays(indicator_types), 0)
+
+    def calculate_incremental(self, state, start, indicator_types=None):
+        """
+        从保存的状态继续计算新增K线的指标
+        self.df 由已计算过的尾部K线（至少覆盖最长窗口）和新增K线组成：
+        有状态钩子的指标（EMA、MACD、KDJ 的 K/D、RSI 均值）从状态继续，其他指标在尾部上重新计算
+        :param state: export_state / 上一次 calculate_incremental 返回的状态，需包含所计算的有状态指标
+        :param start: 第一根新增K线在 self.df 中的位置
+        :param indicator_types: 只计算指定的指标类型，默认全部已注册的指标
+        :return: (与 calculate_all_series 结构相同的序列, 新状态)
+        """
+        series = {}
+        new_state = {}
+        for name in normalize_indicator_types(indicator_types):
+            indicator = INDICATORS[name]
+            if indicator.resume is None:
+                series[name] = self.calculate_series(name)
+                continue
+            columns, new_state[name] = indicator.resume(self, state[name], start, **indicator.params)
+            series[name] = self._series_frame(columns)
+        return series, new_state
+
+
+# ---- 内置指标 ----
+
+@register_indicator('ma', columns={'ma5': 'ma5', 'ma10': 'ma10', 'ma20': 'ma20', 'ma60': 'ma60'},
+                    periods=[5, 10, 20, 60])
+def _ma(calc, periods):
+    """移动平均线"""
+    return {f'ma{period}': (calc.rolling('close', period), period) for period in periods}
+
+
+def _ema_export(calc, periods):
+    """EMA 的递推状态"""
+    return {f'ema{period}': _ewm_state(calc, 'close', span=period) for period in periods}
+
+
+def _ema_resume(calc, state, start, periods):
+    """从状态继续计算 EMA"""
+    close = calc.df['close'].to_numpy(dtype=float)[start:]
+    columns = {}
+    new_state = {}
+    for period in periods:
+        name = f'ema{period}'
+        values, new_state[name] = _ewm_continue(close, state[name], _ewm_alpha(span=period))
+        columns[name] = (calc.align(values, start), period)
+    return columns, new_state
+
+
+@register_indicator('ema', columns={'ema12': 'ema12', 'ema26': 'ema26'},
+                    export=_ema_export, resume=_ema_resume, periods=[12, 26])
+def _ema(calc, periods):
+    """指数移动平均"""
+    return {f'ema{period}': (calc.ewm('close', span=period), period) for period in periods}
+
+
+def _macd_export(calc, fast, slow, signal):
+    """MACD 快慢线和信号线的递推状态"""
+    calc.macd_line(fast, slow)
+    return {
+        'ema_fast': _ewm_state(calc, 'close', span=fast),
+        'ema_slow': _ewm_state(calc, 'close', span=slow),
+        'signal': _ewm_state(calc, ('macd_line', fast, slow), span=signal),
+    }
+
+
+def _macd_resume(calc, state, start, fast, slow, signal):
+    """从状态继续计算 MACD"""
+    close = calc.df['close'].to_numpy(dtype=float)[start:]
+    ema_fast, fast_state = _ewm_continue(close, state['ema_fast'], _ewm_alpha(span=fast))
+    ema_slow, slow_state = _ewm_continue(close, state['ema_slow'], _ewm_alpha(span=slow))
+    macd_line = ema_fast - ema_slow
+    signal_line, signal_state = _ewm_continue(macd_line, state['signal'], _ewm_alpha(span=signal))
+    columns = {
+        'macd': (calc.align(macd_line, start), slow),
+        'signal': (calc.align(signal_line, start), slow),
+        'histogram': (calc.align(macd_line - signal_line, start), slow),
+    }
+    return columns, {'ema_fast': fast_state, 'ema_slow': slow_state, 'signal': signal_state}
+
+
+@register_indicator('macd', columns={'macd': 'macd', 'signal': 'macd_signal', 'histogram': 'macd_histogram'},
+                    export=_macd_export, resume=_macd_resume, fast=12, slow=26, signal=9)
+def _macd(calc, fast, slow, signal):
+    """MACD：复用 EMA 的快慢线"""
+    macd_line = calc.macd_line(fast, slow)
+    signal_line = calc.ewm(('macd_line', fast, slow), span=signal)
+    return {
+        'macd': (macd_line, slow),
+        'signal': (signal_line, slow),
+        'histogram': (macd_line - signal_line, slow),
+    }
+
+
+def _rsi_export(calc, period):
+    """RSI 的窗口涨跌均值"""
+    calc.price_changes()
+    return {
+        'avg_gain': _last(calc.rolling(('gain',), period)),
+        'avg_loss': _last(calc.rolling(('loss',), period)),
+    }
+
+
+def _rsi_resume(calc, state, start, period):
+    """从状态继续计算 RSI：滑动窗口均值按 新增值 - 移出值 递推"""
+    close = calc.df['close'].to_numpy(dtype=float)
+    delta = np.diff(close, prepend=np.nan)
+    gain = np.where(delta > 0, delta, 0.)
+    loss = np.where(delta < 0, -delta, 0.)
+    avg_gain = state['avg_gain']
+    avg_loss = state['avg_loss']
+    avg_gains = np.empty(len(close) - start)
+    avg_losses = np.empty(len(close) - start)
+    for offset, i in enumerate(range(start, len(close))):
+        window = slice(i - period + 1, i + 1)
+        avg_gain += (gain[i] - gain[i - period]) / period
+        avg_loss += (loss[i] - loss[i - period]) / period
+        # 窗口内无涨跌时归零，避免递推的浮点残差
+        if not gain[window].any():
+            avg_gain = 0.
+        if not loss[window].any():
+            avg_loss = 0.
+        avg_gains[offset] = avg_gain
+        avg_losses[offset] = avg_loss
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - (100 / (1 + avg_gains / avg_losses))
+    return {'rsi': (calc.align(rsi, start), period + 1)}, {'avg_gain': float(avg_gain), 'avg_loss': float(avg_loss)}
+
+
+@register_indicator('rsi', columns={'rsi': 'rsi'}, export=_rsi_export, resume=_rsi_resume, period=14)
+def _rsi(calc, period):
+    """RSI"""
+    calc.price_changes()
+    gain = calc.rolling(('gain',), period)
+    loss = calc.rolling(('loss',), period)
+
+    rs = gain / loss
+    rsi = 100 - (100 / (1 + rs))
+    return {'rsi': (rsi, period + 1)}
+
+
+def _kdj_export(calc, n, m1, m2):
+    """KDJ 的 K/D 递推状态"""
+    calc.kdj_k(n, m1)
+    return {
+        'k': _ewm_state(calc, ('rsv', n), com=m1-1),
+        'd': _ewm_state(calc, ('kdj_k', n, m1), com=m2-1),
+    }
+
+
+def _kdj_resume(calc, state, start, n, m1, m2):
+    """从状态继续计算 KDJ"""
+    rsv = calc.rsv(n).to_numpy(dtype=float)
+    k, k_state = _ewm_continue(rsv[start:], state['k'], _ewm_alpha(com=m1-1))
+    d, d_state = _ewm_continue(k, state['d'], _ewm_alpha(com=m2-1))
+    j = 3 * k - 2 * d
+    columns = {'k': (calc.align(k, start), n), 'd': (calc.align(d, start), n), 'j': (calc.align(j, start), n)}
+    return columns, {'k': k_state, 'd': d_state}
+
+
+@register_indicator('kdj', inputs=('high', 'low', 'close'), columns={'k': 'kdj_k', 'd': 'kdj_d', 'j': 'kdj_j'},
+                    export=_kdj_export, resume=_kdj_resume, n=9, m1=3, m2=3)
+def _kdj(calc, n, m1, m2):
+    """KDJ"""
+    k = calc.kdj_k(n, m1)
+    d = calc.ewm(('kdj_k', n, m1), com=m2-1)
+    j = 3 * k - 2 * d
+    return {'k': (k, n), 'd': (d, n), 'j': (j, n)}
+
+
+@register_indicator('boll', columns={'upper': 'boll_upper', 'middle': 'boll_middle', 'lower': 'boll_lower'},
+                    period=20, std=2)
+def _bollinger_bands(calc, period, std):
+    """布林带：中轨复用同周期的 MA"""
+    ma = calc.rolling('close', period)
+    std_dev = calc.rolling('close', period, 'std')
+
+    upper = ma + (std_dev * std)
+    lower = ma - (std_dev * std)
+    return {
+        'upper': (upper, period),
+        'middle': (ma, period),
+        'lower': (lower, period),
+    }
@@ -0,0 +1,212 @@
+"""
+滑动窗口计算内核
+
+直接处理 float64 ndarray：一维为单个序列，二维按列（每列一个序列）沿第 0 轴滑动，
+不经过 DataFrame，供指标计算和极值检测共用。
+
+窗口语义与 pandas rolling(window) 的默认行为一致：前 window-1 个位置以及窗口内含缺失值时结果为 NaN。
+所有内核都按长度为 window 的分块做前缀/后缀累积（van Herk / Gil-Werman），复杂度 O(n)，与窗口大小无关：
+任何一个窗口最多跨两个相邻分块，等于前一块的后缀与后一块的前缀合并。
+"""
+import numpy as np
+
+
+def _as_2d(values):
+    """转换为 (行, 列) 的 float64 数组，返回 (数组, 是否为一维输入)"""
+    array = np.asarray(values, dtype=np.float64)
+    if array.ndim == 1:
+        return array.reshape(-1, 1), True
+    return array, False
+
+
+def _restore(result, one_dim):
+    return result[:, 0] if one_dim else result
+
+
+def _left_aligned(kernel):
+    """
+    把每列开头的缺失值移到末尾再计算，计算后移回
+    这样分块始终从每列第一个有效值开始，面板中右对齐补齐的列与单独计算的结果逐位一致
+    """
+    def wrapper(values, window, *args):
+        array, one_dim = _as_2d(values)
+        rows = len(array)
+        if rows == 0:
+            return _restore(np.full(array.shape, np.nan), one_dim)
+
+        observed = ~np.isnan(array)
+        lead = np.where(observed.any(axis=0), np.argmax(observed, axis=0), 0)
+        if not lead.any():
+            return _restore(kernel(array, window, *args), one_dim)
+
+        columns = np.arange(array.shape[1])
+        index = (np.arange(rows)[:, None] + lead[None, :]) % rows
+        result = np.empty(array.shape)
+        result[index, columns] = kernel(array[index, columns], window, *args)
+        return _restore(result, one_dim)
+
+    wrapper.__name__ = kernel.__name__
+    wrapper.__doc__ = kernel.__doc__
+    return wrapper
+
+
+def _blocks(array, window, fill):
+    """按窗口大小分块，末尾用 fill 补齐，返回 (块数, window, 列) 的视图"""
+    rows, columns = array.shape
+    count = -(-rows // window)
+    padded = np.full((count * window, columns), fill)
+    padded[:rows] = array
+    return padded.reshape(count, window, columns)
+
+
+def _prefix_suffix(array, window, ufunc, fill):
+    """分块内的前缀累积 g 和后缀累积 h，形状与输入相同"""
+    rows, columns = array.shape
+    blocks = _blocks(array, window, fill)
+    prefix = ufunc.accumulate(blocks, axis=1).reshape(-1, columns)[:rows]
+    suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(-1, columns)[:rows]
+    return prefix, suffix
+
+
+def _empty_result(array, window):
+    result = np.full(array.shape, np.nan)
+    return result, window <= len(array)
+
+
+def _max_kernel(array, window):
+    result, enough = _empty_result(array, window)
+    if enough:
+        prefix, suffix = _prefix_suffix(array, window, np.maximum, -np.inf)
+        # np.maximum 会传播 NaN，窗口内有缺失值时结果为 NaN
+        result[window - 1:] = np.maximum(suffix[:len(array) - window + 1], prefix[window - 1:])
+    return result
+
+
+def _sum_kernel(array, window):
+    result, enough = _empty_result(array, window)
+    if enough:
+        prefix, suffix = _prefix_suffix(array, window, np.add, 0.)
+        result[window - 1:] = suffix[:len(array) - window + 1] + prefix[window - 1:]
+        # 与分块对齐的窗口只包含一个完整分块，不能再加后缀
+        aligned = np.arange(window - 1, len(array), window)
+        result[aligned] = prefix[aligned]
+    return result
+
+
+def _var_kernel(array, window, ddof):
+    """
+    滑动方差：每个分块先减去块内基准值再累积一阶、二阶和，
+    跨块的窗口把后一块的累积量换算到前一块的基准上，避免在价格水平上做大数相减
+    """
+    rows, columns = array.shape
+    result, enough = _empty_result(array, window)
+    if not enough or window - ddof <= 0:
+        return result
+
+    # 基准取每块第一个有效值：不依赖窗口之后的数据，序列前缀上的结果与完整序列一致
+    blocks = _blocks(array, window, np.nan)
+    observed = ~np.isnan(blocks)
+    first = np.take_along_axis(blocks, np.argmax(observed, axis=1)[:, None, :], axis=1)[:, 0, :]
+    reference = np.where(observed.any(axis=1), first, 0.)
+    block_of_row = np.arange(rows) // window
+    deviation = array - reference[block_of_row]
+
+    prefix1, suffix1 = _prefix_suffix(deviation, window, np.add, 0.)
+    prefix2, suffix2 = _prefix_suffix(deviation * deviation, window, np.add, 0.)
+
+    # 窗口 [start, end]：start 在前一块取后缀，end 在后一块取前缀
+    head = slice(0, rows - window + 1)
+    tail = slice(window - 1, rows)
+    ends = np.arange(window - 1, rows)
+    shift = (reference[block_of_row[tail]] - reference[block_of_row[head]])
+    count = (ends % window + 1)[:, None]
+
+    tail1, tail2 = prefix1[tail], prefix2[tail]
+    sum1 = suffix1[head] + tail1 + count * shift
+    sum2 = suffix2[head] + tail2 + 2 * shift * tail1 + count * shift * shift
+
+    aligned = ends % window == window - 1
+    sum1[aligned] = tail1[aligned]
+    sum2[aligned] = tail2[aligned]
+
+    variance = (sum2 - sum1 * sum1 / window) / (window - ddof)
+    np.maximum(variance, 0., out=variance)
+
+    # 窗口内全部相等时方差严格为 0（与 pandas 一致），不受舍入误差影响：
+    # 按相邻值变化次数的累积和判断窗口内是否有变化
+    changes = np.zeros(array.shape, dtype=np.int64)
+    np.cumsum(array[1:] != array[:-1], axis=0, out=changes[1:])
+    variance[changes[tail] == changes[head]] = 0.
+    result[tail] = variance
+    return result
+
+
+@_left_aligned
+def rolling_max(values, window):
+    """滑动最大值"""
+    return _max_kernel(values, window)
+
+
+@_left_aligned
+def rolling_min(values, window):
+    """滑动最小值"""
+    return -_max_kernel(-values, window)
+
+
+@_left_aligned
+def rolling_sum(values, window):
+    """滑动求和"""
+    return _sum_kernel(values, window)
+
+
+@_left_aligned
+def rolling_mean(values, window):
+    """滑动均值"""
+    return _sum_kernel(values, window) / window
+
+
+@_left_aligned
+def rolling_var(values, window, ddof=1):
+    """滑动方差（默认样本方差，与 pandas 一致）"""
+    return _var_kernel(values, window, ddof)
+
+
+def rolling_std(values, window, ddof=1):
+    """滑动标准差"""
+    return np.sqrt(rolling_var(values, window, ddof))
+
+
+ROLLING_KERNELS = {
+    'max': rolling_max,
+    'min': rolling_min,
+    'sum': rolling_sum,
+    'mean': rolling_mean,
+    'var': rolling_var,
+    'std': rolling_std,
+}
+
+
+def local_extrema(values, order, kind='max'):
+    """
+    局部极值的位置，结果与 scipy.signal.argrelextrema(values, np.greater/np.less, order=order)[0] 一致：
+    严格大于（小于）前后各 order 个点，靠近两端时只比较范围内的点，首尾两点不算极值
+    :param values: 一维数组
+    :param order: 两侧比较的点数
+    :param kind: 'max' 或 'min'
+    :return: 位置数组
+    """
+    array = np.asarray(values, dtype=np.float64)
+    if kind == 'min':
+        array = -array
+    rows = len(array)
+    if rows < 3:
+        return np.array([], dtype=np.intp)
+
+    padding = np.full(order, -np.inf)
+    # left[i] 为 i 之前 order 个点的最大值，right[i] 为 i 之后 order 个点的最大值
+    left = _max_kernel(np.concatenate([padding, array]).reshape(-1, 1), order)[order - 1:rows + order - 1, 0]
+    right = _max_kernel(np.concatenate([padding, array[::-1]]).reshape(-1, 1), order)[order - 1:rows + order - 1, 0][::-1]
+
+    is_extremum = (array > left) & (array > right)
+    is_extremum[[0, -1]] = False
+    return np.flatnonzero(is_extremum)
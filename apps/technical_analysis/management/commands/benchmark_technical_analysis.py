@@ -0,0 +1,106 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from apps.technical_analysis import benchmarks
+
+
+class Command(BaseCommand):
+    help = '技术分析基准测试（指标计算、形态识别、服务层端到端）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=str,
+            default=','.join(benchmarks.SIZES),
+            help=f"数据规模，逗号分隔（可选：{', '.join(benchmarks.SIZES)}，默认全部）"
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='每项重复次数，取中位数对比（默认：3）'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='合成数据的随机种子（默认：0）'
+        )
+        parser.add_argument(
+            '--db',
+            action='store_true',
+            help='同时测试服务层端到端调用（写入当前配置的数据库，结束后回滚）'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='结果保存为 JSON 文件'
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            help='与之前保存的 JSON 结果对比，有退化时以非零状态退出'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='中位数变慢超过该比例视为退化（默认：0.2）'
+        )
+
+    def handle(self, *args, **options):
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        unknown = [size for size in sizes if size not in benchmarks.SIZES]
+        if unknown:
+            raise CommandError(f"未知的数据规模: {', '.join(unknown)}")
+        if options['repeat'] < 1:
+            raise CommandError('--repeat 至少为 1')
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'无法读取对比结果: {e}')
+
+        results = []
+        for size in sizes:
+            self.stdout.write(f'规模 {size}：计算...')
+            results.extend(self._report(benchmarks.run_compute(size, options['repeat'], options['seed'])))
+            if options['db']:
+                self.stdout.write(f'规模 {size}：数据库...')
+                results.extend(self._report(benchmarks.run_database(size, options['repeat'], options['seed'])))
+
+        output = {'meta': benchmarks.environment(), 'results': results}
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(output, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"结果已保存到 {options['output']}"))
+
+        if baseline is not None:
+            self._compare(results, baseline, options['threshold'])
+
+    def _report(self, results):
+        for result in results:
+            self.stdout.write(
+                f"  {result['name']:<50} 中位数 {result['median'] * 1000:10.2f} ms"
+                f"  最小 {result['min'] * 1000:10.2f} ms"
+            )
+        return results
+
+    def _compare(self, results, baseline, threshold):
+        changes = benchmarks.compare(results, baseline, threshold)
+        regressions = [change for change in changes if change[5] == 'regressed']
+        styles = {'regressed': self.style.ERROR, 'improved': self.style.SUCCESS, 'unchanged': str}
+
+        self.stdout.write('')
+        self.stdout.write(f'与基准对比（阈值 {threshold:.0%}）：')
+        for name, size, old, new, ratio, status in changes:
+            style = styles[status]
+            self.stdout.write(style(
+                f'  [{size}] {name:<50} {old * 1000:10.2f} ms -> {new * 1000:10.2f} ms ({ratio:+.1%})'
+            ))
+
+        if regressions:
+            raise CommandError(f'{len(regressions)} 项性能退化超过 {threshold:.0%}')
+        self.stdout.write(self.style.SUCCESS('未发现性能退化'))
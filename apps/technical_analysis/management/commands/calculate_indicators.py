@@ -1,5 +1,9 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from apps.market_data.models import Instrument
+from apps.technical_analysis.indicators import normalize_indicator_types
 from apps.technical_analysis.services import TechnicalAnalysisService
 
 
@@ -26,7 +30,23 @@ class Command(BaseCommand):
         parser.add_argument(
             '--limit',
             type=int,
-            help='限制计算最近N条数据'
+            help='限制计算最近N条数据（只用于全量计算，不能与 --incremental 同时使用）'
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='增量更新，只计算上次计算之后的新K线'
+        )
+        parser.add_argument(
+            '--types',
+            type=str,
+            help='只计算指定的指标类型，逗号分隔（如：RSI,MACD），默认全部'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='并行进程数（配合 --all 使用，默认：1 串行）'
         )
         parser.add_argument(
             '--with-patterns',
@@ -44,8 +64,11 @@ class Command(BaseCommand):
         all_instruments = options.get('all')
         period = options.get('period')
         limit = options.get('limit')
+        incremental = options.get('incremental')
         with_patterns = options.get('with_patterns')
         with_sr = options.get('with_sr')
+        workers = options.get('workers') or 1
+        indicator_types = options.get('types')
 
         if not symbol and not all_instruments:
             raise CommandError('请指定 --symbol 或 --all')
@@ -53,6 +76,15 @@ class Command(BaseCommand):
         if symbol and all_instruments:
             raise CommandError('--symbol 和 --all 不能同时使用')
 
+        if limit and incremental:
+            raise CommandError('--limit 只用于全量计算，不能与 --incremental 同时使用')
+
+        if indicator_types:
+            try:
+                indicator_types = normalize_indicator_types(indicator_types.split(','))
+            except ValueError as e:
+                raise CommandError(str(e))
+
         # 获取要处理的标的
         if symbol:
             try:
@@ -65,44 +97,30 @@ class Command(BaseCommand):
         total_instruments = len(instruments)
         self.stdout.write(f'开始处理 {total_instruments} 个标的...')
 
+        task_options = {
+            'period': period,
+            'limit': limit,
+            'incremental': incremental,
+            'indicator_types': indicator_types,
+            'with_patterns': with_patterns,
+            'with_sr': with_sr,
+        }
+
+        if workers > 1:
+            outcomes = self._run_parallel([instrument.id for instrument in instruments], task_options, workers)
+        else:
+            outcomes = (process_instrument(instrument, task_options) for instrument in instruments)
+
         success_count = 0
         error_count = 0
 
-        for i, instrument in enumerate(instruments, 1):
-            try:
-                self.stdout.write(f'[{i}/{total_instruments}] 处理 {instrument.symbol} - {instrument.name}')
-
-                # 计算技术指标
-                indicator_count = TechnicalAnalysisService.calculate_and_save_indicators(
-                    instrument.id,
-                    period=period,
-                    limit=limit
-                )
-                self.stdout.write(self.style.SUCCESS(f'  ✓ 计算了 {indicator_count} 个指标'))
-
-                # 识别形态
-                if with_patterns:
-                    pattern_count = TechnicalAnalysisService.detect_and_save_patterns(
-                        instrument.id,
-                        period=period
-                    )
-                    self.stdout.write(self.style.SUCCESS(f'  ✓ 识别了 {pattern_count} 个形态'))
-
-                # 更新支撑阻力位
-                if with_sr:
-                    sr_count = TechnicalAnalysisService.update_support_resistance(
-                        instrument.id,
-                        period=period
-                    )
-                    self.stdout.write(self.style.SUCCESS(f'  ✓ 更新了 {sr_count} 个支撑阻力位'))
-
+        for i, outcome in enumerate(outcomes, 1):
+            self.stdout.write(f"[{i}/{total_instruments}] 处理 {outcome['symbol']} - {outcome['name']}")
+            for style, message in outcome['messages']:
+                self.stdout.write(getattr(self.style, style)(message))
+            if outcome['ok']:
                 success_count += 1
-
-            except ValueError as e:
-                self.stdout.write(self.style.WARNING(f'  ⚠ 跳过: {str(e)}'))
-                error_count += 1
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'  ✗ 错误: {str(e)}'))
+            else:
                 error_count += 1
 
         # 输出统计
@@ -111,3 +129,83 @@ class Command(BaseCommand):
         self.stdout.write(f'成功: {success_count}')
         if error_count > 0:
             self.stdout.write(self.style.WARNING(f'失败/跳过: {error_count}'))
+
+    def _run_parallel(self, instrument_ids, task_options, workers):
+        """按分片分发到进程池，按完成顺序返回每个标的的处理结果"""
+        size = max(1, min(TechnicalAnalysisService.PANEL_SIZE, len(instrument_ids) // workers or 1))
+        chunks = [instrument_ids[i:i + size] for i in range(0, len(instrument_ids), size)]
+        self.stdout.write(f'使用 {workers} 个进程并行处理 {len(chunks)} 个分片')
+        if connections['default'].vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite 不支持并发写入，并行处理建议使用 PostgreSQL'))
+
+        # 子进程通过 fork 继承已初始化的 Django，先关闭连接避免共享数据库套接字
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = {executor.submit(process_chunk, chunk, task_options): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                try:
+                    yield from future.result()
+                except Exception as e:
+                    # 整个分片失败（如子进程异常退出）时，分片内的标的单独串行重试
+                    self.stdout.write(self.style.WARNING(f'分片执行失败，串行重试: {e}'))
+                    yield from process_chunk(futures[future], task_options)
+
+
+def process_instrument(instrument, options):
+    """
+    处理单个标的：计算指标，按需识别形态、更新支撑阻力位
+    :return: {'symbol', 'name', 'ok', 'messages': [(样式, 文本), ...]}
+    """
+    period = options['period']
+    messages = []
+    ok = True
+    try:
+        # 计算技术指标
+        if options['incremental']:
+            stats = TechnicalAnalysisService.update_indicators(
+                instrument.id,
+                period=period,
+                indicator_types=options['indicator_types']
+            )
+        else:
+            stats = TechnicalAnalysisService.calculate_and_save_indicators(
+                instrument.id,
+                period=period,
+                limit=options['limit'],
+                indicator_types=options['indicator_types']
+            )
+        messages.append(('SUCCESS',
+            f"  ✓ 指标新增 {stats['inserted']} 行，更新 {stats['updated']} 行，未变 {stats['unchanged']} 行"
+        ))
+
+        # 识别形态
+        if options['with_patterns']:
+            pattern_count = TechnicalAnalysisService.detect_and_save_patterns(
+                instrument.id,
+                period=period
+            )
+            messages.append(('SUCCESS', f'  ✓ 识别了 {pattern_count} 个形态'))
+
+        # 更新支撑阻力位
+        if options['with_sr']:
+            sr_count = TechnicalAnalysisService.update_support_resistance(
+                instrument.id,
+                period=period
+            )
+            messages.append(('SUCCESS', f'  ✓ 更新了 {sr_count} 个支撑阻力位'))
+
+    except ValueError as e:
+        messages.append(('WARNING', f'  ⚠ 跳过: {str(e)}'))
+        ok = False
+    except Exception as e:
+        messages.append(('ERROR', f'  ✗ 错误: {str(e)}'))
+        ok = False
+
+    return {'symbol': instrument.symbol, 'name': instrument.name, 'ok': ok, 'messages': messages}
+
+
+def process_chunk(instrument_ids, options):
+    """进程池工作函数：处理一个分片内的所有标的"""
+    instruments = Instrument.objects.filter(id__in=instrument_ids).order_by('symbol')
+    return [process_instrument(instrument, options) for instrument in instruments]
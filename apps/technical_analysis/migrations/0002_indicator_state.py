@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_data', '0001_initial'),
+        ('technical_analysis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicatorState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=5)),
+                ('state', models.JSONField(default=dict, help_text='EMA、MACD信号线、KDJ的K/D、RSI均值等递推状态')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('instrument', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indicator_states', to='market_data.instrument')),
+                ('last_kline', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='market_data.kline')),
+            ],
+            options={
+                'db_table': 'technical_indicator_state',
+                'unique_together': {('instrument', 'period')},
+            },
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# 与当时内置指标注册的存储列一致（迁移中不能引用模型和指标注册表）
+COLUMNS = {
+    'MA': {'ma5': 'ma5', 'ma10': 'ma10', 'ma20': 'ma20', 'ma60': 'ma60'},
+    'EMA': {'ema12': 'ema12', 'ema26': 'ema26'},
+    'MACD': {'macd': 'macd', 'signal': 'macd_signal', 'histogram': 'macd_histogram'},
+    'RSI': {'rsi': 'rsi'},
+    'KDJ': {'k': 'kdj_k', 'd': 'kdj_d', 'j': 'kdj_j'},
+    'BOLL': {'upper': 'boll_upper', 'middle': 'boll_middle', 'lower': 'boll_lower'},
+}
+BATCH_SIZE = 5000
+
+
+def copy_json_indicators(apps, schema_editor):
+    """将 technical_indicator 中每根K线的多行 JSON 合并为宽表的一行"""
+    Indicator = apps.get_model('technical_analysis', 'Indicator')
+    IndicatorValue = apps.get_model('technical_analysis', 'IndicatorValue')
+
+    rows = Indicator.objects.order_by('kline_id').values_list(
+        'kline_id', 'kline__instrument_id', 'kline__period', 'kline__trade_date',
+        'indicator_type', 'indicator_data'
+    ).iterator(chunk_size=BATCH_SIZE)
+
+    batch = []
+    current = None
+    for kline_id, instrument_id, period, trade_date, indicator_type, data in rows:
+        if current is None or current.kline_id != kline_id:
+            current = IndicatorValue(
+                kline_id=kline_id, instrument_id=instrument_id, period=period, trade_date=trade_date
+            )
+            batch.append(current)
+            if len(batch) > BATCH_SIZE:
+                IndicatorValue.objects.bulk_create(batch[:-1], ignore_conflicts=True)
+                batch = batch[-1:]
+        columns = COLUMNS.get(indicator_type, {})
+        for key, value in (data or {}).items():
+            if key in columns and value is not None and value == value:
+                setattr(current, columns[key], value)
+
+    IndicatorValue.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_data', '0001_initial'),
+        ('technical_analysis', '0002_indicator_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicatorValue',
+            fields=[
+                ('kline', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='indicator_value', serialize=False, to='market_data.kline')),
+                ('period', models.CharField(max_length=5)),
+                ('trade_date', models.DateField()),
+                ('ma5', models.FloatField(blank=True, null=True)),
+                ('ma10', models.FloatField(blank=True, null=True)),
+                ('ma20', models.FloatField(blank=True, null=True)),
+                ('ma60', models.FloatField(blank=True, null=True)),
+                ('ema12', models.FloatField(blank=True, null=True)),
+                ('ema26', models.FloatField(blank=True, null=True)),
+                ('macd', models.FloatField(blank=True, null=True)),
+                ('macd_signal', models.FloatField(blank=True, null=True)),
+                ('macd_histogram', models.FloatField(blank=True, null=True)),
+                ('rsi', models.FloatField(blank=True, null=True)),
+                ('kdj_k', models.FloatField(blank=True, null=True)),
+                ('kdj_d', models.FloatField(blank=True, null=True)),
+                ('kdj_j', models.FloatField(blank=True, null=True)),
+                ('boll_upper', models.FloatField(blank=True, null=True)),
+                ('boll_middle', models.FloatField(blank=True, null=True)),
+                ('boll_lower', models.FloatField(blank=True, null=True)),
+                ('calculated_at', models.DateTimeField(auto_now=True)),
+                ('instrument', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indicator_values', to='market_data.instrument')),
+            ],
+            options={
+                'db_table': 'technical_indicator_value',
+                'ordering': ['-trade_date'],
+                'indexes': [models.Index(fields=['instrument', 'period', 'trade_date'], name='technical_i_instrum_b0c7b6_idx')],
+            },
+        ),
+        migrations.RunPython(copy_json_indicators, migrations.RunPython.noop),
+    ]
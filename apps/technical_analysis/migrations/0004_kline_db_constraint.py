@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_data', '0002_backfill_checkpoint'),
+        ('technical_analysis', '0003_indicator_value'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='indicator',
+            name='kline',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='indicators', to='market_data.kline'),
+        ),
+        migrations.AlterField(
+            model_name='indicatorstate',
+            name='last_kline',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='market_data.kline'),
+        ),
+        migrations.AlterField(
+            model_name='indicatorvalue',
+            name='kline',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='indicator_value', serialize=False, to='market_data.kline'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+# 迁移时已注册并持久化的指标（迁移中不能引用指标注册表）
+INDICATOR_TYPES = ['ma', 'ema', 'macd', 'rsi', 'kdj', 'boll']
+
+
+def split_states(apps, schema_editor):
+    """把每个标的每个周期的一条合并状态拆分为每类指标一条"""
+    IndicatorState = apps.get_model('technical_analysis', 'IndicatorState')
+    merged = list(IndicatorState.objects.filter(indicator_type=''))
+    IndicatorState.objects.bulk_create([
+        IndicatorState(
+            instrument_id=state.instrument_id,
+            period=state.period,
+            indicator_type=indicator_type,
+            last_kline_id=state.last_kline_id,
+            state=state.state.get(indicator_type, {}),
+        )
+        for state in merged
+        for indicator_type in INDICATOR_TYPES
+    ], batch_size=1000)
+    IndicatorState.objects.filter(indicator_type='').delete()
+
+
+def drop_states(apps, schema_editor):
+    """回滚时删除按指标拆分的状态，下次计算自动退化为全量计算"""
+    apps.get_model('technical_analysis', 'IndicatorState').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('technical_analysis', '0004_kline_db_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indicatorstate',
+            name='indicator_type',
+            field=models.CharField(default='', help_text='指标类型（小写，与指标注册表一致）', max_length=10),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='indicatorstate',
+            name='state',
+            field=models.JSONField(default=dict, help_text='EMA、MACD信号线、KDJ的K/D、RSI均值等递推状态，窗口类指标为空'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='indicatorstate',
+            unique_together={('instrument', 'period', 'indicator_type')},
+        ),
+        migrations.RunPython(split_states, drop_states),
+    ]
@@ -1,8 +1,10 @@
 from django.db import models
 from apps.market_data.models import Instrument, KLine
+from .indicators import INDICATORS, stored_indicator_types
 
 
 class Indicator(models.Model):
+    """旧版指标存储：每根K线每类指标一行 JSON，计算结果现写入 IndicatorValue 宽表"""
     INDICATOR_TYPES = [
         ('MA', '移动平均线'),
         ('EMA', '指数移动平均'),
@@ -12,7 +14,8 @@ class Indicator(models.Model):
         ('BOLL', '布林带'),
     ]
 
-    kline = models.ForeignKey(KLine, on_delete=models.CASCADE, related_name='indicators')
+    # market_kline 在 PostgreSQL 上是分区表，不能建数据库外键，级联删除由 ORM 完成
+    kline = models.ForeignKey(KLine, on_delete=models.CASCADE, related_name='indicators', db_constraint=False)
     indicator_type = models.CharField(max_length=10, choices=INDICATOR_TYPES, db_index=True)
     indicator_data = models.JSONField(default=dict)
     calculated_at = models.DateTimeField(auto_now_add=True)
@@ -28,6 +31,113 @@ class Indicator(models.Model):
         return f"{self.kline.instrument.symbol} {self.indicator_type} {self.kline.trade_date}"
 
 
+class IndicatorValue(models.Model):
+    """
+    技术指标宽表：每根K线一行，每个指标值一列
+    指标与列的对应关系由指标注册表中的 columns 声明（见 indicators.register_indicator），
+    新增需要持久化的指标时在注册时声明 columns，并在本表增加对应的列
+    """
+
+    # market_kline 在 PostgreSQL 上是分区表，不能建数据库外键，级联删除由 ORM 完成
+    kline = models.OneToOneField(
+        KLine, on_delete=models.CASCADE, primary_key=True, related_name='indicator_value', db_constraint=False
+    )
+    # 冗余标的、周期、日期，区间读取只需一次索引扫描
+    instrument = models.ForeignKey(Instrument, on_delete=models.CASCADE, related_name='indicator_values')
+    period = models.CharField(max_length=5)
+    trade_date = models.DateField()
+    ma5 = models.FloatField(null=True, blank=True)
+    ma10 = models.FloatField(null=True, blank=True)
+    ma20 = models.FloatField(null=True, blank=True)
+    ma60 = models.FloatField(null=True, blank=True)
+    ema12 = models.FloatField(null=True, blank=True)
+    ema26 = models.FloatField(null=True, blank=True)
+    macd = models.FloatField(null=True, blank=True)
+    macd_signal = models.FloatField(null=True, blank=True)
+    macd_histogram = models.FloatField(null=True, blank=True)
+    rsi = models.FloatField(null=True, blank=True)
+    kdj_k = models.FloatField(null=True, blank=True)
+    kdj_d = models.FloatField(null=True, blank=True)
+    kdj_j = models.FloatField(null=True, blank=True)
+    boll_upper = models.FloatField(null=True, blank=True)
+    boll_middle = models.FloatField(null=True, blank=True)
+    boll_lower = models.FloatField(null=True, blank=True)
+    calculated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'technical_indicator_value'
+        ordering = ['-trade_date']
+        indexes = [
+            models.Index(fields=['instrument', 'period', 'trade_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.instrument.symbol} {self.period} {self.trade_date}"
+
+    @staticmethod
+    def columns_of(indicator_type):
+        """
+        某类指标的 {指标数据键: 列名}
+        :raises ValueError: 指标没有声明存储列
+        """
+        columns = INDICATORS[indicator_type.lower()].columns
+        if not columns:
+            raise ValueError(f"指标 {indicator_type} 没有声明存储列")
+        return columns
+
+    @classmethod
+    def value_fields(cls):
+        """全部指标列"""
+        return cls.fields_for(stored_indicator_types())
+
+    @classmethod
+    def column_values(cls, record):
+        """
+        将 {指标类型: 指标数据} 转换为 {列名: 值}，NaN 存为空
+        """
+        values = {}
+        for indicator_type, data in record.items():
+            columns = cls.columns_of(indicator_type)
+            for key, value in data.items():
+                values[columns[key]] = None if value != value else value
+        return values
+
+    @classmethod
+    def fields_for(cls, indicator_types):
+        """指定指标类型对应的列名"""
+        return [
+            column
+            for indicator_type in indicator_types
+            for column in cls.columns_of(indicator_type).values()
+        ]
+
+    def get_indicator_data(self, indicator_type):
+        """按旧的 JSON 结构返回某类指标的数据"""
+        return {
+            key: getattr(self, column)
+            for key, column in self.columns_of(indicator_type).items()
+            if getattr(self, column) is not None
+        }
+
+
+class IndicatorState(models.Model):
+    """指标增量计算状态：每类指标一条，记录该指标最后计算到的K线及其递推状态"""
+    instrument = models.ForeignKey(Instrument, on_delete=models.CASCADE, related_name='indicator_states')
+    period = models.CharField(max_length=5)
+    indicator_type = models.CharField(max_length=10, help_text='指标类型（小写，与指标注册表一致）')
+    # K线被删除（如重新导入）时状态随之失效，下次自动退化为全量计算
+    last_kline = models.ForeignKey(KLine, on_delete=models.CASCADE, related_name='+', db_constraint=False)
+    state = models.JSONField(default=dict, help_text='EMA、MACD信号线、KDJ的K/D、RSI均值等递推状态，窗口类指标为空')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'technical_indicator_state'
+        unique_together = [['instrument', 'period', 'indicator_type']]
+
+    def __str__(self):
+        return f"{self.instrument.symbol} {self.period} {self.indicator_type} @ {self.last_kline.trade_date}"
+
+
 class Pattern(models.Model):
     PATTERN_TYPES = [
         ('HEAD_SHOULDER', '头肩顶'),
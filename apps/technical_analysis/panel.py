@@ -0,0 +1,88 @@
+import pandas as pd
+import numpy as np
+from .indicators import IndicatorCalculator
+
+
+class PanelIndicatorCalculator(IndicatorCalculator):
+    """
+    多标的面板指标计算器：把多个标的的K线排成 (K线序号 × 标的) 的二维面板，
+    每个指标对所有列做一次向量化计算，摊薄逐个标的计算的开销
+
+    各标的按自身K线序列右对齐（最新一根在最后一行），历史较短的在前面补缺失值，
+    停牌等缺口不会在面板中插入空行，因此结果与逐个标的使用 IndicatorCalculator 计算一致
+    """
+
+    FIELDS = ['open', 'high', 'low', 'close']
+
+    def __init__(self, df):
+        """
+        初始化面板指标计算器
+        :param df: 长表 DataFrame，包含 instrument 列和 OHLC 数据，每个标的内部按日期升序排列
+        """
+        instruments, codes, lengths = np.unique(
+            df['instrument'].to_numpy(), return_inverse=True, return_counts=True
+        )
+        rows = int(lengths.max()) if len(lengths) else 0
+
+        # 每根K线在面板中的行号：标的内序号 + 前面补齐的空行数
+        position = df.groupby('instrument', sort=False).cumcount().to_numpy()
+        row_index = rows - lengths[codes] + position
+
+        panel = {}
+        for field in self.FIELDS:
+            values = np.full((rows, len(instruments)), np.nan)
+            values[row_index, codes] = df[field].to_numpy(dtype=float)
+            panel[field] = pd.DataFrame(values, columns=instruments)
+
+        super().__init__(pd.concat(panel, axis=1))
+        self.instruments = list(instruments)
+        self.lengths = dict(zip(self.instruments, lengths.tolist()))
+
+    def _series_frame(self, columns):
+        """组装面板序列结果，列为 (指标列名, 标的)"""
+        frame = pd.concat({name: values for name, (values, _) in columns.items()}, axis=1)
+        for name, (_, min_length) in columns.items():
+            self.min_lengths[name] = min_length
+        return frame
+
+    def to_records_by_instrument(self, series, start=0):
+        """
+        按标的拆分为逐根K线的指标数据
+        :param series: calculate_all_series 的返回值
+        :param start: 标的自身K线序号的起始位置
+        :return: {标的: 与 IndicatorCalculator.to_records 结构相同的列表}
+        """
+        rows = len(self.df)
+        blocks = {}
+        for name, frame in series.items():
+            cols = list(frame.columns.get_level_values(0).unique())
+            values = frame.to_numpy(dtype=float).reshape(rows, len(cols), len(self.instruments))
+            blocks[name] = (cols, values, [self.min_lengths[col] for col in cols])
+
+        result = {}
+        for column, instrument in enumerate(self.instruments):
+            length = self.lengths[instrument]
+            offset = rows - length
+            records = [{} for _ in range(max(length - start, 0))]
+            for name, (cols, values, min_lengths) in blocks.items():
+                bars = values[offset + start:, :, column].tolist()
+                for i, bar in enumerate(bars, start):
+                    records[i - start][name] = {
+                        col: bar[j]
+                        for j, col in enumerate(cols)
+                        if i + 1 >= min_lengths[j]
+                    }
+            result[instrument] = records
+        return result
+
+    def export_states(self, indicator_types=None):
+        """
+        导出每个标的最后一根K线处的递推状态
+        :param indicator_types: 只导出指定的指标类型，默认全部已注册的指标
+        :return: {标的: 与 export_state 结构相同的 dict}
+        """
+        arrays = self._state_arrays(indicator_types)
+        return {
+            instrument: self._pick_state(arrays, column)
+            for column, instrument in enumerate(self.instruments)
+        }
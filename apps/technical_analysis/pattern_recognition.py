@@ -1,17 +1,19 @@
 import pandas as pd
 import numpy as np
-from scipy.signal import argrelextrema
 from sklearn.cluster import DBSCAN
+from .indicators import IndicatorCalculator
 
 
 class PatternRecognizer:
-    def __init__(self, df):
+    def __init__(self, df, calculator=None):
         """
         初始化形态识别器
         :param df: pandas DataFrame，包含 OHLC 数据
+        :param calculator: 同一份K线上的 IndicatorCalculator，传入时复用其已计算的均线等中间量
         """
         self.df = df.copy()
         self.df = self.df.sort_index()
+        self.calculator = calculator or IndicatorCalculator(self.df)
 
     def detect_support_resistance(self, window=20, tolerance=0.02):
         """
@@ -23,8 +25,8 @@ class PatternRecognizer:
             return []
 
         # 找局部最高点和最低点
-        local_max_idx = argrelextrema(self.df['high'].values, np.greater, order=window)[0]
-        local_min_idx = argrelextrema(self.df['low'].values, np.less, order=window)[0]
+        local_max_idx = self.calculator.extrema('high', window, 'max')
+        local_min_idx = self.calculator.extrema('low', window, 'min')
 
         resistance_levels = self.df['high'].iloc[local_max_idx].values
         support_levels = self.df['low'].iloc[local_min_idx].values
@@ -78,8 +80,8 @@ class PatternRecognizer:
         if len(self.df) < ma_long:
             return None
 
-        ma_short_values = self.df['close'].rolling(window=ma_short).mean()
-        ma_long_values = self.df['close'].rolling(window=ma_long).mean()
+        ma_short_values = self.calculator.rolling('close', ma_short)
+        ma_long_values = self.calculator.rolling('close', ma_long)
 
         current_price = self.df['close'].iloc[-1]
         current_ma_short = ma_short_values.iloc[-1]
@@ -120,7 +122,7 @@ class PatternRecognizer:
         patterns = []
 
         # 检测双顶
-        local_max_idx = argrelextrema(self.df['high'].values, np.greater, order=window)[0]
+        local_max_idx = self.calculator.extrema('high', window, 'max')
         if len(local_max_idx) >= 2:
             for i in range(len(local_max_idx) - 1):
                 peak1_price = self.df['high'].iloc[local_max_idx[i]]
@@ -139,7 +141,7 @@ class PatternRecognizer:
                     })
 
         # 检测双底
-        local_min_idx = argrelextrema(self.df['low'].values, np.less, order=window)[0]
+        local_min_idx = self.calculator.extrema('low', window, 'min')
         if len(local_min_idx) >= 2:
             for i in range(len(local_min_idx) - 1):
                 bottom1_price = self.df['low'].iloc[local_min_idx[i]]
@@ -171,7 +173,7 @@ class PatternRecognizer:
         patterns = []
 
         # 检测头肩顶
-        local_max_idx = argrelextrema(self.df['high'].values, np.greater, order=window)[0]
+        local_max_idx = self.calculator.extrema('high', window, 'max')
         if len(local_max_idx) >= 3:
             for i in range(len(local_max_idx) - 2):
                 left_shoulder = self.df['high'].iloc[local_max_idx[i]]
@@ -194,7 +196,7 @@ class PatternRecognizer:
                     })
 
         # 检测头肩底
-        local_min_idx = argrelextrema(self.df['low'].values, np.less, order=window)[0]
+        local_min_idx = self.calculator.extrema('low', window, 'min')
         if len(local_min_idx) >= 3:
             for i in range(len(local_min_idx) - 2):
                 left_shoulder = self.df['low'].iloc[local_min_idx[i]]
@@ -1,13 +1,23 @@
 from rest_framework import serializers
-from .models import Indicator, Pattern, SupportResistance
+from .models import IndicatorValue, Pattern, SupportResistance
 
 
-class IndicatorSerializer(serializers.ModelSerializer):
-    instrument_symbol = serializers.CharField(source='kline.instrument.symbol', read_only=True)
-    trade_date = serializers.DateField(source='kline.trade_date', read_only=True)
+class IndicatorSerializer(serializers.Serializer):
+    """旧版指标结构：一根K线的一类指标，由 IndicatorValue 宽表展开"""
+    id = serializers.CharField(read_only=True)
+    kline = serializers.IntegerField(read_only=True)
+    instrument = serializers.IntegerField(read_only=True)
+    instrument_symbol = serializers.CharField(read_only=True)
+    period = serializers.CharField(read_only=True)
+    trade_date = serializers.DateField(read_only=True)
+    indicator_type = serializers.CharField(read_only=True)
+    indicator_data = serializers.JSONField(read_only=True)
+    calculated_at = serializers.DateTimeField(read_only=True)
 
+
+class IndicatorValueSerializer(serializers.ModelSerializer):
     class Meta:
-        model = Indicator
+        model = IndicatorValue
         fields = '__all__'
         read_only_fields = ('calculated_at',)
 
@@ -1,106 +1,344 @@
+import math
 import pandas as pd
 from datetime import datetime, timedelta
 from django.db import transaction
+from django.db.models import Q
 from apps.market_data.models import Instrument, KLine
-from .models import Indicator, Pattern, SupportResistance
-from .indicators import IndicatorCalculator
+from .models import IndicatorValue, IndicatorState, Pattern, SupportResistance
+from .indicators import INDICATORS, IndicatorCalculator, normalize_indicator_types, stored_indicator_types
+from .panel import PanelIndicatorCalculator
 from .pattern_recognition import PatternRecognizer
 
 
 class TechnicalAnalysisService:
     MIN_DATA_POINTS = 60  # 最少需要的K线数据点
+    PANEL_SIZE = 50  # 面板模式每批计算的标的数
+    KLINE_FIELDS = ('id', 'trade_date', 'open_price', 'high_price', 'low_price', 'close_price', 'volume')
+
+    @staticmethod
+    def _indicator_dataframe(rows):
+        """将K线 values() 结果转换为指标计算所需的 DataFrame"""
+        df = pd.DataFrame(rows)
+        df = df.rename(columns={
+            'trade_date': 'date', 'open_price': 'open', 'high_price': 'high',
+            'low_price': 'low', 'close_price': 'close'
+        })
+        df['date'] = pd.to_datetime(df['date'])
+        df.set_index('date', inplace=True)
+
+        # 转换为float
+        for col in ['open', 'high', 'low', 'close']:
+            df[col] = df[col].astype(float)
+        return df
+
+    @staticmethod
+    def _indicator_values(instrument_id, period, kline_ids, trade_dates, records):
+        """按K线组装指标宽表行"""
+        return [
+            IndicatorValue(
+                kline_id=kline_id,
+                instrument_id=instrument_id,
+                period=period,
+                trade_date=trade_date,
+                **IndicatorValue.column_values(record)
+            )
+            for kline_id, trade_date, record in zip(kline_ids, trade_dates, records)
+        ]
+
+    @staticmethod
+    def _values_changed(old, new):
+        """
+        指标值是否有变化
+        浮点数按相对误差比较：增量计算与全量计算的结果只在最后几位不同，不视为变化
+        """
+        for old_value, new_value in zip(old, new):
+            if old_value is None or new_value is None:
+                if old_value is not new_value:
+                    return True
+            elif not math.isclose(old_value, new_value, rel_tol=1e-9, abs_tol=1e-12):
+                return True
+        return False
+
+    @classmethod
+    def _save_indicator_values(cls, instrument_ids, period, values, prune=False, fields=None):
+        """
+        按K线 upsert 指标宽表，只写入新增或数值有变化的行
+        :param instrument_ids: 本次计算涉及的标的ID
+        :param values: IndicatorValue 列表
+        :param prune: 是否删除这些标的本次未产生的旧行（全量计算时使用）
+        :param fields: 只比较和更新这些列（只计算部分指标时使用），默认全部指标列
+        :return: {'inserted': 新增行数, 'updated': 更新行数, 'unchanged': 未变行数, 'deleted': 删除行数}
+        """
+        fields = fields or IndicatorValue.value_fields()
+        existing = IndicatorValue.objects.filter(instrument_id__in=instrument_ids, period=period)
+        if not prune:
+            existing = existing.filter(kline_id__in=[value.kline_id for value in values])
+        existing = {row[0]: row[1:] for row in existing.values_list('kline_id', *fields)}
+
+        stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+        to_write = []
+        for value in values:
+            old = existing.pop(value.kline_id, None)
+            if old is None:
+                stats['inserted'] += 1
+            elif not cls._values_changed(old, [getattr(value, field) for field in fields]):
+                stats['unchanged'] += 1
+                continue
+            else:
+                stats['updated'] += 1
+            to_write.append(value)
+
+        with transaction.atomic():
+            IndicatorValue.objects.bulk_create(
+                to_write,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['kline'],
+                update_fields=fields + ['calculated_at'],
+            )
+            if prune and existing:
+                stale = list(existing)
+                for i in range(0, len(stale), 1000):
+                    IndicatorValue.objects.filter(kline_id__in=stale[i:i + 1000]).delete()
+                stats['deleted'] = len(stale)
+
+        return stats
+
+    @staticmethod
+    def _stored_types(indicator_types=None):
+        """
+        规范化要计算并保存的指标类型，默认全部声明了存储列的指标
+        :raises ValueError: 包含未知或没有声明存储列的指标类型
+        """
+        stored = stored_indicator_types()
+        indicator_types = normalize_indicator_types(indicator_types or stored)
+        unsupported = [name for name in indicator_types if name not in stored]
+        if unsupported:
+            raise ValueError(f"以下指标没有声明存储列: {', '.join(unsupported)}")
+        return indicator_types
+
+    @staticmethod
+    def _indicator_states(instrument_id, period, last_kline_id, state, indicator_types):
+        """按指标类型组装增量状态行，没有状态钩子的指标状态为空"""
+        return [
+            IndicatorState(
+                instrument_id=instrument_id,
+                period=period,
+                indicator_type=name,
+                last_kline_id=last_kline_id,
+                state=state.get(name, {}),
+            )
+            for name in indicator_types
+        ]
+
+    @staticmethod
+    def _save_indicator_states(states):
+        """按 (标的, 周期, 指标类型) upsert 增量状态"""
+        IndicatorState.objects.bulk_create(
+            states,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['instrument', 'period', 'indicator_type'],
+            update_fields=['last_kline', 'state', 'updated_at'],
+        )
 
     @classmethod
-    def calculate_and_save_indicators(cls, instrument_id, period='1d', limit=None):
+    def calculate_and_save_indicators(cls, instrument_id, period='1d', limit=None, indicator_types=None):
         """
-        计算并保存技术指标
+        计算并保存技术指标，同时保存所计算指标的增量状态
         :param instrument_id: 标的ID
         :param period: K线周期
         :param limit: 限制计算最近N条数据
+        :param indicator_types: 只计算并保存指定的指标类型（如 ['RSI']），默认全部；
+                                只计算部分指标时只写入这些指标的列，不删除旧行
+        :return: {'inserted', 'updated', 'unchanged', 'deleted'} 行数统计
         """
+        indicator_types = cls._stored_types(indicator_types)
+        partial = len(indicator_types) < len(stored_indicator_types())
+
         instrument = Instrument.objects.get(id=instrument_id)
         klines = KLine.objects.filter(
             instrument=instrument,
             period=period
-        ).order_by('trade_date')
+        ).order_by('trade_date', 'trade_time')
 
         if limit:
             klines = klines[:limit]
 
-        if klines.count() < cls.MIN_DATA_POINTS:
+        rows = list(klines.values(*cls.KLINE_FIELDS))
+        if len(rows) < cls.MIN_DATA_POINTS:
             raise ValueError(f"数据不足，至少需要 {cls.MIN_DATA_POINTS} 个数据点")
 
-        # 转换为DataFrame
-        df = pd.DataFrame(list(klines.values(
-            'trade_date', 'open_price', 'high_price', 'low_price', 'close_price', 'volume'
-        )))
-        df.columns = ['date', 'open', 'high', 'low', 'close', 'volume']
-        df['date'] = pd.to_datetime(df['date'])
-        df.set_index('date', inplace=True)
-
-        # 转换为float
-        for col in ['open', 'high', 'low', 'close']:
-            df[col] = df[col].astype(float)
+        calculator = IndicatorCalculator(cls._indicator_dataframe(rows))
 
-        calculator = IndicatorCalculator(df)
+        # 一次向量化计算完整序列，再按K线拆分（与逐窗口计算结果一致）
+        series = calculator.calculate_all_series(indicator_types)
+        records = calculator.to_records(series, start=cls.MIN_DATA_POINTS - 1)
 
-        # 批量创建指标
-        indicators_to_create = []
+        # 每根K线一行
+        rows = rows[cls.MIN_DATA_POINTS - 1:]
+        values_to_create = cls._indicator_values(
+            instrument.id, period, [row['id'] for row in rows], [row['trade_date'] for row in rows], records
+        )
 
-        # 为每个K线计算指标（滚动窗口）
-        for i, kline in enumerate(klines):
-            if i < cls.MIN_DATA_POINTS - 1:
-                continue  # 跳过数据不足的部分
+        # 只写入有变化的行，不再整体删除重建
+        with transaction.atomic():
+            if partial:
+                stats = cls._save_indicator_values(
+                    [instrument.id], period, values_to_create,
+                    fields=IndicatorValue.fields_for(indicator_types)
+                )
+            else:
+                stats = cls._save_indicator_values([instrument.id], period, values_to_create, prune=True)
+            # 保存递推状态，供增量更新继续计算
+            cls._save_indicator_states(cls._indicator_states(
+                instrument.id, period, rows[-1]['id'], calculator.export_state(indicator_types), indicator_types
+            ))
 
-            # 使用到当前K线为止的所有数据
-            window_df = df.iloc[:i+1]
-            window_calculator = IndicatorCalculator(window_df)
+        return stats
 
-            # 计算各类指标
-            ma_data = window_calculator.calculate_ma()
-            if ma_data:
-                indicators_to_create.append(
-                    Indicator(kline=kline, indicator_type='MA', indicator_data=ma_data)
-                )
+    @classmethod
+    def update_indicators(cls, instrument_id, period='1d', indicator_types=None):
+        """
+        增量更新技术指标：从保存的递推状态继续，只计算各指标最后一次计算之后的新K线
+        没有状态（从未计算过、K线被重新导入或新注册）的指标退化为全量计算
+        :param instrument_id: 标的ID
+        :param period: K线周期
+        :param indicator_types: 只更新指定的指标类型，默认全部
+        :return: {'inserted', 'updated', 'unchanged', 'deleted'} 行数统计（各指标分组累加）
+        """
+        indicator_types = cls._stored_types(indicator_types)
+        instrument = Instrument.objects.get(id=instrument_id)
+        states = {
+            state.indicator_type: state
+            for state in IndicatorState.objects.filter(
+                instrument=instrument, period=period, indicator_type__in=indicator_types
+            ).select_related('last_kline')
+            if state.state or INDICATORS[state.indicator_type].resume is None
+        }
+
+        stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+        missing = [name for name in indicator_types if name not in states]
+        if missing:
+            for key, value in cls.calculate_and_save_indicators(instrument_id, period, indicator_types=missing).items():
+                stats[key] += value
+
+        # 其余指标按最后计算到的K线分组（通常只有一组）
+        groups = {}
+        for name in indicator_types:
+            if name in states:
+                groups.setdefault(states[name].last_kline_id, []).append(states[name])
+        for group in groups.values():
+            for key, value in cls._update_from_states(instrument, period, group).items():
+                stats[key] += value
+        return stats
 
-            ema_data = window_calculator.calculate_ema()
-            if ema_data:
-                indicators_to_create.append(
-                    Indicator(kline=kline, indicator_type='EMA', indicator_data=ema_data)
-                )
+    @classmethod
+    def _update_from_states(cls, instrument, period, states):
+        """从最后计算到同一根K线的一组指标状态继续计算新增K线"""
+        indicator_types = [state.indicator_type for state in states]
+        last_kline = states[0].last_kline
+        klines = KLine.objects.filter(instrument=instrument, period=period)
+        # 分钟K线同一天有多根，按 (日期, 时间) 区分已计算和新增的部分
+        after_last = Q(trade_date__gt=last_kline.trade_date)
+        if last_kline.trade_time is not None:
+            after_last |= Q(trade_date=last_kline.trade_date, trade_time__gt=last_kline.trade_time)
+
+        new_rows = list(klines.filter(after_last).order_by('trade_date', 'trade_time').values(*cls.KLINE_FIELDS))
+        if not new_rows:
+            return {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+
+        # 已计算部分只需取覆盖最长窗口的尾部
+        history_rows = list(
+            klines.exclude(after_last).order_by('-trade_date', '-trade_time')
+            .values(*cls.KLINE_FIELDS)[:cls.MIN_DATA_POINTS]
+        )[::-1]
+
+        calculator = IndicatorCalculator(cls._indicator_dataframe(history_rows + new_rows))
+        series, state = calculator.calculate_incremental(
+            {item.indicator_type: item.state for item in states},
+            start=len(history_rows),
+            indicator_types=indicator_types
+        )
+        records = calculator.to_records(series, start=len(history_rows))
+
+        values_to_create = cls._indicator_values(
+            instrument.id, period, [row['id'] for row in new_rows], [row['trade_date'] for row in new_rows], records
+        )
 
-            macd_data = window_calculator.calculate_macd()
-            if macd_data:
-                indicators_to_create.append(
-                    Indicator(kline=kline, indicator_type='MACD', indicator_data=macd_data)
-                )
+        with transaction.atomic():
+            stats = cls._save_indicator_values(
+                [instrument.id], period, values_to_create, fields=IndicatorValue.fields_for(indicator_types)
+            )
+            cls._save_indicator_states(cls._indicator_states(
+                instrument.id, period, new_rows[-1]['id'], state, indicator_types
+            ))
 
-            rsi_data = window_calculator.calculate_rsi()
-            if rsi_data:
-                indicators_to_create.append(
-                    Indicator(kline=kline, indicator_type='RSI', indicator_data=rsi_data)
-                )
+        return stats
 
-            kdj_data = window_calculator.calculate_kdj()
-            if kdj_data:
-                indicators_to_create.append(
-                    Indicator(kline=kline, indicator_type='KDJ', indicator_data=kdj_data)
-                )
+    @classmethod
+    def calculate_indicators_panel(cls, instrument_ids, period='1d', indicator_types=None):
+        """
+        面板模式批量计算技术指标：一次查询读取多个标的的K线，
+        组成 (K线序号 × 标的) 面板向量化计算，再批量写入
+        :param instrument_ids: 标的ID列表（建议每批 PANEL_SIZE 个，控制内存）
+        :param period: K线周期
+        :param indicator_types: 只计算并保存指定的指标类型，默认全部
+        :return: {'calculated': 计算的标的数, 'skipped': 数据不足跳过的标的ID, 以及行数统计}
+        """
+        indicator_types = cls._stored_types(indicator_types)
+        partial = len(indicator_types) < len(stored_indicator_types())
 
-            boll_data = window_calculator.calculate_bollinger_bands()
-            if boll_data:
-                indicators_to_create.append(
-                    Indicator(kline=kline, indicator_type='BOLL', indicator_data=boll_data)
-                )
+        rows = KLine.objects.filter(
+            instrument_id__in=instrument_ids,
+            period=period
+        ).order_by('instrument_id', 'trade_date', 'trade_time').values_list(
+            'instrument_id', 'id', 'trade_date', 'open_price', 'high_price', 'low_price', 'close_price'
+        )
+        df = pd.DataFrame(
+            list(rows), columns=['instrument', 'id', 'trade_date', 'open', 'high', 'low', 'close']
+        )
+
+        # 跳过数据不足的标的
+        counts = df.groupby('instrument').size()
+        enough = [int(instrument_id) for instrument_id in counts[counts >= cls.MIN_DATA_POINTS].index]
+        skipped = sorted(set(instrument_ids) - set(enough))
+        df = df[df['instrument'].isin(enough)]
+
+        summary = {'calculated': len(enough), 'skipped': skipped,
+                   'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+        if df.empty:
+            return summary
+
+        calculator = PanelIndicatorCalculator(df)
+        series = calculator.calculate_all_series(indicator_types)
+        records = calculator.to_records_by_instrument(series, start=cls.MIN_DATA_POINTS - 1)
+        states = calculator.export_states(indicator_types)
+
+        values_to_create = []
+        states_to_save = []
+        for instrument_id, group in df.groupby('instrument'):
+            instrument_id = int(instrument_id)
+            kline_ids = group['id'].tolist()
+            values_to_create.extend(cls._indicator_values(
+                instrument_id, period, kline_ids[cls.MIN_DATA_POINTS - 1:],
+                group['trade_date'].tolist()[cls.MIN_DATA_POINTS - 1:], records[instrument_id]
+            ))
+            states_to_save.extend(cls._indicator_states(
+                instrument_id, period, kline_ids[-1], states[instrument_id], indicator_types
+            ))
 
-        # 批量保存
         with transaction.atomic():
-            # 删除旧指标
-            Indicator.objects.filter(kline__instrument=instrument, kline__period=period).delete()
-            # 批量创建新指标
-            Indicator.objects.bulk_create(indicators_to_create, ignore_conflicts=True)
+            if partial:
+                stats = cls._save_indicator_values(
+                    enough, period, values_to_create, fields=IndicatorValue.fields_for(indicator_types)
+                )
+            else:
+                stats = cls._save_indicator_values(enough, period, values_to_create, prune=True)
+            cls._save_indicator_states(states_to_save)
 
-        return len(indicators_to_create)
+        summary.update(stats)
+        return summary
 
     @classmethod
     def detect_and_save_patterns(cls, instrument_id, period='1d', lookback_days=120):
@@ -117,7 +355,7 @@ class TechnicalAnalysisService:
             instrument=instrument,
             period=period,
             trade_date__gte=start_date
-        ).order_by('trade_date')
+        ).order_by('trade_date', 'trade_time')
 
         if klines.count() < cls.MIN_DATA_POINTS:
             raise ValueError(f"数据不足，至少需要 {cls.MIN_DATA_POINTS} 个数据点")
@@ -203,7 +441,7 @@ class TechnicalAnalysisService:
             instrument=instrument,
             period=period,
             trade_date__gte=start_date
-        ).order_by('trade_date')
+        ).order_by('trade_date', 'trade_time')
 
         if klines.count() < cls.MIN_DATA_POINTS:
             raise ValueError(f"数据不足，至少需要 {cls.MIN_DATA_POINTS} 个数据点")
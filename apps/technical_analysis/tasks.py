@@ -1,4 +1,4 @@
-from celery import shared_task
+from celery import shared_task, chord, group
 import logging
 from apps.market_data.models import Instrument
 from .services import TechnicalAnalysisService
@@ -7,15 +7,25 @@ logger = logging.getLogger(__name__)
 
 
 @shared_task(bind=True, max_retries=3)
-def calculate_indicators_task(self, instrument_id, period='1d'):
-    """计算技术指标"""
+def calculate_indicators_task(self, instrument_id, period='1d', incremental=False, indicator_types=None):
+    """
+    计算技术指标
+    incremental=True 时只计算上次计算之后的新K线；
+    指定 indicator_types 时只计算并保存这些指标（及其增量状态）
+    """
     try:
         instrument = Instrument.objects.get(id=instrument_id)
-        count = TechnicalAnalysisService.calculate_and_save_indicators(
-            instrument_id, period
+        if incremental:
+            stats = TechnicalAnalysisService.update_indicators(instrument_id, period, indicator_types=indicator_types)
+        else:
+            stats = TechnicalAnalysisService.calculate_and_save_indicators(
+                instrument_id, period, indicator_types=indicator_types
+            )
+        logger.info(
+            f"计算 {instrument.symbol} 技术指标成功，新增 {stats['inserted']}，"
+            f"更新 {stats['updated']}，未变 {stats['unchanged']}"
         )
-        logger.info(f"计算 {instrument.symbol} 技术指标成功，共 {count} 个指标")
-        return {'instrument_id': instrument_id, 'count': count}
+        return {'instrument_id': instrument_id, **stats}
     except Exception as e:
         logger.error(f"计算标的 {instrument_id} 技术指标失败: {e}")
         raise self.retry(exc=e, countdown=60)
@@ -34,45 +44,131 @@ def detect_patterns_task(self, instrument_id):
         raise self.retry(exc=e, countdown=60)
 
 
-@shared_task(bind=True)
-def batch_calculate_indicators(self):
-    """批量计算指标（定时任务）"""
-    logger.info("开始批量计算技术指标")
-    instruments = Instrument.objects.filter(is_active=True)
-    success_count = 0
-    fail_count = 0
+def _chunks(instrument_ids, size):
+    """按固定大小切分标的ID"""
+    return [instrument_ids[i:i + size] for i in range(0, len(instrument_ids), size)]
+
 
-    for instrument in instruments:
+def _merge_summary(summary, result):
+    """累加分片结果"""
+    summary = dict(summary or {'success': 0, 'fail': 0, 'failed_ids': []})
+    summary['success'] += result['success']
+    summary['fail'] += result['fail']
+    summary['failed_ids'] = summary['failed_ids'] + result['failed_ids']
+    return summary
+
+
+def _run_chunk(task, instrument_ids, run, summary, **kwargs):
+    """
+    执行一个分片：逐个标的调用 run，数据不足的直接计为失败，
+    其他异常的标的单独重试（不影响分片内已成功的标的），重试耗尽后计为失败
+    """
+    result = {'success': 0, 'fail': 0, 'failed_ids': []}
+    retry_ids = []
+    for instrument_id in instrument_ids:
         try:
-            count = TechnicalAnalysisService.calculate_and_save_indicators(
-                instrument.id, period='1d'
-            )
-            logger.info(f"计算 {instrument.symbol} 技术指标成功，共 {count} 个指标")
-            success_count += 1
+            run(instrument_id)
+            result['success'] += 1
+        except ValueError as e:
+            logger.warning(f"标的 {instrument_id} 跳过: {e}")
+            result['fail'] += 1
+            result['failed_ids'].append(instrument_id)
         except Exception as e:
-            logger.error(f"计算 {instrument.symbol} 技术指标失败: {e}")
-            fail_count += 1
+            logger.error(f"标的 {instrument_id} 处理失败: {e}")
+            retry_ids.append(instrument_id)
 
-    logger.info(f"批量计算技术指标完成，成功: {success_count}, 失败: {fail_count}")
-    return {'success': success_count, 'fail': fail_count}
+    summary = _merge_summary(summary, result)
+    if retry_ids:
+        if task.request.retries < task.max_retries:
+            raise task.retry(
+                args=[retry_ids], kwargs={**kwargs, 'summary': summary}, countdown=60
+            )
+        summary = _merge_summary(summary, {'success': 0, 'fail': len(retry_ids), 'failed_ids': retry_ids})
+    return summary
+
+
+@shared_task(bind=True, max_retries=3)
+def calculate_indicators_chunk(self, instrument_ids, period='1d', incremental=True, indicator_types=None, summary=None):
+    """
+    计算一个分片的技术指标
+    增量模式逐个标的更新；全量模式整个分片按面板模式计算，失败时整片重试
+    指定 indicator_types 时只计算并保存这些指标
+    """
+    if incremental:
+        return _run_chunk(
+            self, instrument_ids,
+            lambda instrument_id: TechnicalAnalysisService.update_indicators(
+                instrument_id, period, indicator_types=indicator_types
+            ),
+            summary, period=period, incremental=incremental, indicator_types=indicator_types
+        )
+
+    try:
+        result = TechnicalAnalysisService.calculate_indicators_panel(
+            instrument_ids, period, indicator_types=indicator_types
+        )
+    except Exception as e:
+        logger.error(f"面板计算标的 {instrument_ids[0]}~{instrument_ids[-1]} 技术指标失败: {e}")
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=60)
+        return _merge_summary(summary, {'success': 0, 'fail': len(instrument_ids), 'failed_ids': instrument_ids})
+
+    return _merge_summary(summary, {
+        'success': result['calculated'],
+        'fail': len(result['skipped']),
+        'failed_ids': result['skipped'],
+    })
+
+
+@shared_task(bind=True, max_retries=3)
+def detect_patterns_chunk(self, instrument_ids, summary=None):
+    """识别一个分片的形态"""
+    return _run_chunk(self, instrument_ids, TechnicalAnalysisService.detect_and_save_patterns, summary)
+
+
+@shared_task
+def summarize_batch(results, job):
+    """汇总各分片结果（chord 回调）"""
+    summary = None
+    for result in results:
+        summary = _merge_summary(summary, result)
+    summary = summary or {'success': 0, 'fail': 0, 'failed_ids': []}
+    logger.info(f"{job}完成，成功: {summary['success']}, 失败: {summary['fail']}")
+    return summary
+
+
+def _dispatch(chunk_signatures, job):
+    """以 chord 并行执行各分片并汇总结果"""
+    if not chunk_signatures:
+        logger.info(f"{job}：没有需要处理的标的")
+        return {'chunks': 0}
+    result = chord(group(chunk_signatures))(summarize_batch.s(job))
+    logger.info(f"{job}已分发 {len(chunk_signatures)} 个分片")
+    return {'chunks': len(chunk_signatures), 'summary_task_id': result.id}
 
 
 @shared_task(bind=True)
-def batch_detect_patterns(self):
-    """批量识别形态（定时任务）"""
-    logger.info("开始批量识别形态")
-    instruments = Instrument.objects.filter(is_active=True)
-    success_count = 0
-    fail_count = 0
+def batch_calculate_indicators(self, incremental=True, indicator_types=None):
+    """
+    批量计算指标（定时任务）
+    活跃标的按 PANEL_SIZE 分片，以 Celery chord 并行执行后汇总；
+    默认增量更新，incremental=False 时各分片按面板模式全量重算；
+    指定 indicator_types（如 ['RSI']）时只计算并保存这些指标
+    """
+    logger.info("开始批量计算技术指标")
+    instrument_ids = list(Instrument.objects.filter(is_active=True).values_list('id', flat=True))
+    return _dispatch([
+        calculate_indicators_chunk.s(chunk, period='1d', incremental=incremental, indicator_types=indicator_types)
+        for chunk in _chunks(instrument_ids, TechnicalAnalysisService.PANEL_SIZE)
+    ], '批量计算技术指标')
 
-    for instrument in instruments:
-        try:
-            count = TechnicalAnalysisService.detect_and_save_patterns(instrument.id)
-            logger.info(f"识别 {instrument.symbol} 形态成功，共 {count} 个形态")
-            success_count += 1
-        except Exception as e:
-            logger.error(f"识别 {instrument.symbol} 形态失败: {e}")
-            fail_count += 1
 
-    logger.info(f"批量识别形态完成，成功: {success_count}, 失败: {fail_count}")
-    return {'success': success_count, 'fail': fail_count}
+@shared_task(bind=True)
+def batch_detect_patterns(self):
+    """批量识别形态（定时任务），按分片并行执行后汇总"""
+    logger.info("开始批量识别形态")
+    instrument_ids = list(Instrument.objects.filter(is_active=True).values_list('id', flat=True))
+    return _dispatch([
+        detect_patterns_chunk.s(chunk)
+        for chunk in _chunks(instrument_ids, TechnicalAnalysisService.PANEL_SIZE)
+    ], '批量识别形态')
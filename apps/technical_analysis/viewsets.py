@@ -1,19 +1,67 @@
-from rest_framework import viewsets, filters, status
+from rest_framework import filters, mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Indicator, Pattern, SupportResistance
-from .serializers import IndicatorSerializer, PatternSerializer, SupportResistanceSerializer
+from .indicators import normalize_indicator_types, stored_indicator_types
+from .models import IndicatorValue, Pattern, SupportResistance
+from .serializers import (
+    IndicatorSerializer, IndicatorValueSerializer, PatternSerializer, SupportResistanceSerializer
+)
 
 
-class IndicatorViewSet(viewsets.ModelViewSet):
-    queryset = Indicator.objects.select_related('kline__instrument').all()
+class IndicatorViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    按旧的 JSON 结构读取指标：数据来自 IndicatorValue 宽表，每根K线按指标类型展开为多条
+    （technical_indicator 表只保留用于迁移，不再写入，也不再提供读写接口）
+    """
+    queryset = IndicatorValue.objects.select_related('instrument').all()
     serializer_class = IndicatorSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['kline', 'indicator_type']
-    search_fields = ['kline__instrument__symbol', 'kline__instrument__name']
-    ordering_fields = ['calculated_at']
-    ordering = ['-calculated_at']
+    filterset_fields = {
+        'kline': ['exact'],
+        'instrument': ['exact'],
+        'period': ['exact'],
+        'trade_date': ['exact', 'gte', 'lte'],
+    }
+    search_fields = ['instrument__symbol', 'instrument__name']
+    ordering_fields = ['trade_date', 'calculated_at']
+    ordering = ['-trade_date']
+
+    def list(self, request, *args, **kwargs):
+        """分页按K线计算，每根K线展开为所请求的各类指标（没有数据或不持久化的指标省略）"""
+        indicator_type = request.query_params.get('indicator_type')
+        stored = stored_indicator_types()
+        try:
+            indicator_types = [
+                name.upper() for name in normalize_indicator_types(indicator_type.split(',') if indicator_type else None)
+                if name in stored
+            ]
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rows = []
+        for value in (queryset if page is None else page):
+            for name in indicator_types:
+                data = value.get_indicator_data(name)
+                if not data:
+                    continue
+                rows.append({
+                    'id': f'{value.kline_id}:{name}',
+                    'kline': value.kline_id,
+                    'instrument': value.instrument_id,
+                    'instrument_symbol': value.instrument.symbol,
+                    'period': value.period,
+                    'trade_date': value.trade_date,
+                    'indicator_type': name,
+                    'indicator_data': data,
+                    'calculated_at': value.calculated_at,
+                })
+        serializer = self.get_serializer(rows, many=True)
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['post'], url_path='batch-calculate')
     def batch_calculate(self, request):
@@ -36,6 +84,11 @@ class IndicatorViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        try:
+            indicator_types = [name.upper() for name in normalize_indicator_types(indicator_types)]
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         # 调用 Celery 任务异步计算指标
         try:
             from .tasks import calculate_indicators_task
@@ -60,6 +113,20 @@ class IndicatorViewSet(viewsets.ModelViewSet):
             )
 
 
+class IndicatorValueViewSet(viewsets.ReadOnlyModelViewSet):
+    """指标宽表：按标的、周期、日期区间读取，每根K线一行"""
+    queryset = IndicatorValue.objects.all()
+    serializer_class = IndicatorValueSerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {
+        'instrument': ['exact'],
+        'period': ['exact'],
+        'trade_date': ['exact', 'gte', 'lte'],
+    }
+    ordering_fields = ['trade_date']
+    ordering = ['-trade_date']
+
+
 class PatternViewSet(viewsets.ModelViewSet):
     queryset = Pattern.objects.select_related('instrument').all()
     serializer_class = PatternSerializer
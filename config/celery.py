@@ -15,6 +15,15 @@ app.conf.beat_schedule = {
         'task': 'apps.market_data.tasks.sync_daily_data',
         'schedule': crontab(hour=15, minute=30, day_of_week='1-5'),
     },
+    'sync-intraday-data': {
+        'task': 'apps.market_data.tasks.sync_intraday_data',
+        # 日盘收盘后和期货夜盘收盘后
+        'schedule': crontab(hour='15,23', minute=10, day_of_week='1-5'),
+    },
+    'repair-kline-gaps': {
+        'task': 'apps.market_data.tasks.repair_kline_gaps',
+        'schedule': crontab(hour=10, minute=0, day_of_week=6),
+    },
     'batch-calculate-indicators': {
         'task': 'apps.technical_analysis.tasks.batch_calculate_indicators',
         'schedule': crontab(hour=16, minute=0, day_of_week='1-5'),
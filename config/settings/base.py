@@ -1,4 +1,5 @@
 from pathlib import Path
+import json
 import os
 from dotenv import load_dotenv
 from django.urls import reverse_lazy
@@ -104,6 +105,22 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_RESULT_EXPIRES = 3600
 CELERY_TASK_TIME_LIMIT = 600
 
+# Market Data Fetching
+MARKET_DATA_SOURCE = os.getenv('MARKET_DATA_SOURCE', 'akshare')  # akshare / local 或数据源类的导入路径
+MARKET_DATA_SOURCE_OPTIONS = json.loads(os.getenv('MARKET_DATA_SOURCE_OPTIONS', '{}'))  # 数据源构造参数（JSON）
+MARKET_DATA_RATE_LIMIT = float(os.getenv('MARKET_DATA_RATE_LIMIT', '2'))  # 每秒请求数（所有线程共享）
+MARKET_DATA_RATE_BURST = int(os.getenv('MARKET_DATA_RATE_BURST', '2'))  # 允许的突发请求数
+MARKET_DATA_FETCH_WORKERS = int(os.getenv('MARKET_DATA_FETCH_WORKERS', '8'))  # 并发获取的线程数
+MARKET_DATA_PIPELINE_QUEUE_SIZE = int(os.getenv('MARKET_DATA_PIPELINE_QUEUE_SIZE', '64'))  # 导入管道各阶段之间的队列长度（区间数）
+MARKET_DATA_WRITE_BATCH_ROWS = int(os.getenv('MARKET_DATA_WRITE_BATCH_ROWS', '20000'))  # 导入管道每个写入事务合并的最大行数
+MARKET_DATA_BACKFILL_CHUNK_DAYS = int(os.getenv('MARKET_DATA_BACKFILL_CHUNK_DAYS', '3650'))  # 历史回补每次请求的最大天数
+MARKET_DATA_RESAMPLE_PERIODS = ['1w', '1M', '5m', '15m', '30m', '1h']  # 本地合成的周期（周线/月线来自日线，分钟周期来自 1m）
+MARKET_DATA_CACHE_MODE = os.getenv('MARKET_DATA_CACHE_MODE', 'readwrite')  # readwrite / replay（只读缓存，不访问网络）/ off
+MARKET_DATA_CACHE_DIR = os.getenv('MARKET_DATA_CACHE_DIR', str(BASE_DIR / 'cache' / 'market_data'))
+MARKET_DATA_CACHE_HISTORY_TTL = int(os.getenv('MARKET_DATA_CACHE_HISTORY_TTL', str(7 * 86400)))  # 历史K线缓存有效期（秒）
+MARKET_DATA_CACHE_LIVE_TTL = int(os.getenv('MARKET_DATA_CACHE_LIVE_TTL', '3600'))  # 最近一周K线缓存有效期（秒）
+MARKET_DATA_SERIES_MAX_BARS = int(os.getenv('MARKET_DATA_SERIES_MAX_BARS', '50000'))  # K线序列接口单次返回的最大K线数
+
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -1,34 +1,40 @@
 import { useEffect, useRef } from 'react';
 import * as echarts from 'echarts';
-import type { KLine } from '../../types';
+import type { KLineSeries } from '../../types';
 
 interface KLineChartProps {
-  data: KLine[];
-  indicators?: Record<string, any>;
+  data: KLineSeries;
 }
 
-export default function KLineChart({ data, indicators = {} }: KLineChartProps) {
+// Indicator columns drawn on the price chart; all other columns go to the sub-chart
+const OVERLAY_COLORS: Record<string, string> = {
+  ma5: '#FF9800',
+  ma10: '#2196F3',
+  ma20: '#9C27B0',
+  ma60: '#795548',
+  boll_upper: '#607D8B',
+  boll_middle: '#9E9E9E',
+  boll_lower: '#607D8B',
+};
+
+export default function KLineChart({ data }: KLineChartProps) {
   const chartRef = useRef<HTMLDivElement>(null);
 
   useEffect(() => {
-    if (!chartRef.current || data.length === 0) return;
+    if (!chartRef.current || data.count === 0) return;
 
     const chart = echarts.init(chartRef.current);
 
-    const chartData = data.map((item) => [
-      item.trade_date,
-      parseFloat(item.open_price),
-      parseFloat(item.close_price),
-      parseFloat(item.low_price),
-      parseFloat(item.high_price),
-      parseFloat(item.volume),
-    ]);
+    const categories = data.times
+      ? data.dates.map((date, i) => `${date} ${data.times![i]}`)
+      : data.dates;
+    const indicators = data.indicators || {};
 
     const series: any[] = [
       {
         name: 'K线',
         type: 'candlestick',
-        data: chartData.map((item) => item.slice(1, 5)),
+        data: data.o.map((open, i) => [open, data.c[i], data.l[i], data.h[i]]),
         itemStyle: {
           color: '#ef5350',
           color0: '#26a69a',
@@ -40,21 +46,16 @@ export default function KLineChart({ data, indicators = {} }: KLineChartProps) {
       },
     ];
 
-    // Add MA indicators to main chart
-    const maColors: Record<string, string> = {
-      MA5: '#FF9800',
-      MA10: '#2196F3',
-      MA20: '#9C27B0',
-    };
-
+    // Add MA / BOLL indicators to main chart
     Object.keys(indicators).forEach((key) => {
-      if (key.startsWith('MA') && indicators[key]?.length > 0) {
+      if (key in OVERLAY_COLORS) {
         series.push({
-          name: key,
+          name: key.toUpperCase(),
           type: 'line',
-          data: indicators[key].map((item: any) => item.value),
+          data: indicators[key],
           smooth: true,
-          lineStyle: { width: 2, color: maColors[key] },
+          showSymbol: false,
+          lineStyle: { width: 2, color: OVERLAY_COLORS[key] },
           xAxisIndex: 0,
           yAxisIndex: 0,
         });
@@ -65,39 +66,40 @@ export default function KLineChart({ data, indicators = {} }: KLineChartProps) {
     series.push({
       name: '成交量',
       type: 'bar',
-      data: chartData.map((item) => item[5]),
+      data: data.v,
       xAxisIndex: 1,
       yAxisIndex: 1,
     });
 
     // Add sub-chart indicators (MACD, RSI, KDJ)
-    let gridIndex = 2;
     const grids: any[] = [
       { left: '10%', right: '10%', height: '50%' },
       { left: '10%', right: '10%', top: '65%', height: '10%' },
     ];
     const xAxis: any[] = [
-      { type: 'category', data: chartData.map((item) => item[0]), gridIndex: 0 },
-      { type: 'category', data: chartData.map((item) => item[0]), gridIndex: 1 },
+      { type: 'category', data: categories, gridIndex: 0 },
+      { type: 'category', data: categories, gridIndex: 1 },
     ];
     const yAxis: any[] = [
       { scale: true, gridIndex: 0 },
       { scale: true, gridIndex: 1 },
     ];
 
-    if (indicators.RSI?.length > 0) {
+    const subKeys = Object.keys(indicators).filter((key) => !(key in OVERLAY_COLORS));
+    if (subKeys.length > 0) {
       grids.push({ left: '10%', right: '10%', top: '78%', height: '10%' });
-      xAxis.push({ type: 'category', data: chartData.map((item) => item[0]), gridIndex });
-      yAxis.push({ scale: true, gridIndex });
-      series.push({
-        name: 'RSI',
-        type: 'line',
-        data: indicators.RSI.map((item: any) => item.value),
-        lineStyle: { color: '#FFC107' },
-        xAxisIndex: gridIndex,
-        yAxisIndex: gridIndex,
+      xAxis.push({ type: 'category', data: categories, gridIndex: 2 });
+      yAxis.push({ scale: true, gridIndex: 2 });
+      subKeys.forEach((key) => {
+        series.push({
+          name: key.toUpperCase(),
+          type: key === 'macd_histogram' ? 'bar' : 'line',
+          data: indicators[key],
+          showSymbol: false,
+          xAxisIndex: 2,
+          yAxisIndex: 2,
+        });
       });
-      gridIndex++;
     }
 
     const option = {
@@ -124,7 +126,7 @@ export default function KLineChart({ data, indicators = {} }: KLineChartProps) {
       window.removeEventListener('resize', handleResize);
       chart.dispose();
     };
-  }, [data, indicators]);
+  }, [data]);
 
   return <div ref={chartRef} style={{ width: '100%', height: '600px' }} />;
 }
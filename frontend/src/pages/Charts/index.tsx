@@ -18,18 +18,31 @@ import {
 } from '@mui/material';
 import { ShowChart } from '@mui/icons-material';
 import apiClient from '../../services/api';
-import type { Instrument, KLine } from '../../types';
+import type { Instrument, KLineSeries } from '../../types';
 import KLineChart from '../../components/Charts/KLineChart';
 
+// 图表显示最近的K线根数
+const SERIES_LIMIT = 500;
+
+// 指标选项 -> 指标宽表的列
+const INDICATOR_COLUMNS: Record<string, string[]> = {
+  MA5: ['ma5'],
+  MA10: ['ma10'],
+  MA20: ['ma20'],
+  MACD: ['macd', 'macd_signal', 'macd_histogram'],
+  RSI: ['rsi'],
+  KDJ: ['kdj_k', 'kdj_d', 'kdj_j'],
+  BOLL: ['boll_upper', 'boll_middle', 'boll_lower'],
+};
+
 export default function Charts() {
   const [instruments, setInstruments] = useState<Instrument[]>([]);
   const [selectedInstrument, setSelectedInstrument] = useState<number | null>(null);
-  const [klines, setKlines] = useState<KLine[]>([]);
+  const [series, setSeries] = useState<KLineSeries | null>(null);
   const [loading, setLoading] = useState(false);
   const [instrumentsLoading, setInstrumentsLoading] = useState(true);
   const [anchorEl, setAnchorEl] = useState<HTMLButtonElement | null>(null);
   const [selectedIndicators, setSelectedIndicators] = useState<string[]>([]);
-  const [indicatorData, setIndicatorData] = useState<Record<string, any>>({});
   const theme = useTheme();
   const isMobile = useMediaQuery(theme.breakpoints.down('md'));
 
@@ -54,21 +67,21 @@ export default function Charts() {
 
   useEffect(() => {
     if (selectedInstrument) {
-      fetchKlines(selectedInstrument);
-    }
-  }, [selectedInstrument]);
-
-  useEffect(() => {
-    if (selectedInstrument && selectedIndicators.length > 0) {
-      fetchIndicators(selectedInstrument, selectedIndicators);
+      fetchSeries(selectedInstrument, selectedIndicators);
     }
   }, [selectedInstrument, selectedIndicators]);
 
-  const fetchKlines = async (instrumentId: number) => {
+  // K线和所选指标列一次读取（列式序列接口），不逐页读取列表接口
+  const fetchSeries = async (instrumentId: number, indicators: string[]) => {
     setLoading(true);
     try {
-      const response = await apiClient.get(`/klines/?instrument=${instrumentId}&page_size=100`);
-      setKlines(response.data.results || response.data);
+      const columns = indicators.flatMap((indicator) => INDICATOR_COLUMNS[indicator] || []);
+      const params = new URLSearchParams({ instrument: String(instrumentId), limit: String(SERIES_LIMIT) });
+      if (columns.length > 0) {
+        params.set('indicators', columns.join(','));
+      }
+      const response = await apiClient.get<KLineSeries>(`/klines/series/?${params}`);
+      setSeries(response.data);
     } catch (error) {
       console.error('Failed to fetch klines:', error);
     } finally {
@@ -76,21 +89,6 @@ export default function Charts() {
     }
   };
 
-  const fetchIndicators = async (instrumentId: number, indicators: string[]) => {
-    try {
-      const data: Record<string, any> = {};
-      for (const indicator of indicators) {
-        const response = await apiClient.get(
-          `/indicators/?instrument=${instrumentId}&indicator_type=${indicator}`
-        );
-        data[indicator] = response.data;
-      }
-      setIndicatorData(data);
-    } catch (error) {
-      console.error('Failed to fetch indicators:', error);
-    }
-  };
-
   const handleIndicatorToggle = (indicator: string) => {
     setSelectedIndicators((prev) =>
       prev.includes(indicator) ? prev.filter((i) => i !== indicator) : [...prev, indicator]
@@ -153,8 +151,8 @@ export default function Charts() {
             <Box sx={{ height: 600 }}>
               <Skeleton variant="rectangular" height="100%" />
             </Box>
-          ) : klines.length > 0 ? (
-            <KLineChart data={klines} indicators={indicatorData} />
+          ) : series && series.count > 0 ? (
+            <KLineChart data={series} />
           ) : (
             <Box sx={{ display: 'flex', justifyContent: 'center', alignItems: 'center', height: 600 }}>
               <Typography>暂无数据</Typography>
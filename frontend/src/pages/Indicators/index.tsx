@@ -24,10 +24,14 @@ import apiClient from '../../services/api';
 import type { Instrument } from '../../types';
 
 interface IndicatorRecord {
-  id: number;
+  id: string;
+  kline: number;
   instrument: number;
   instrument_name?: string;
+  instrument_symbol?: string;
+  period: string;
   indicator_type: string;
+  indicator_data: Record<string, number>;
   trade_date: string;
   calculated_at: string;
 }
@@ -39,6 +39,22 @@ export interface KLine {
   period: '1m' | '5m' | '15m' | '30m' | '1h' | '1d' | '1w' | '1M';
 }
 
+// /klines/series/ 返回的列式K线序列，各数组等长、按时间升序
+export interface KLineSeries {
+  instrument: number;
+  period: KLine['period'];
+  count: number;
+  truncated: boolean;
+  dates: string[];
+  times?: string[];
+  o: number[];
+  h: number[];
+  l: number[];
+  c: number[];
+  v: number[];
+  indicators?: Record<string, (number | null)[]>;
+}
+
 export interface Indicator {
   id: number;
   name: string;